@@ -1,21 +1,37 @@
-import io, os, csv, requests, zipfile, subprocess, sys, time, platform
+import io, os, csv, json, hashlib, requests, zipfile, subprocess, sys, time, platform
 python_executable = sys.executable
 if not python_executable:
     python_executable = "unknown"
 print(f"Current Python executable: {python_executable}")
 
-import shutil, argparse, urllib, validators, re, winreg, ctypes, typing
-import traceback
-import msvcrt
+import shutil, tempfile, argparse, urllib, validators, re, ctypes, typing
+import traceback, contextlib, heapq, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import logging
+if platform.system() == "Windows":
+    import winreg, msvcrt
 from sys import version_info
-from git import Repo
+from git import Repo, GitCommandError
 from pathlib import Path
 from huggingface_hub import hf_hub_download
 from huggingface_hub import snapshot_download
-from huggingface_hub.utils import are_progress_bars_disabled, disable_progress_bars, enable_progress_bars
+from huggingface_hub.utils import are_progress_bars_disabled, disable_progress_bars, enable_progress_bars, filter_repo_objects
 from huggingface_hub import list_repo_files
 from huggingface_hub import whoami
+from huggingface_hub import get_hf_file_metadata, hf_hub_url, HfApi, try_to_load_from_cache
+from huggingface_hub.constants import HF_HUB_CACHE, ENDPOINT
+from huggingface_hub.errors import GatedRepoError, RepositoryNotFoundError, HfHubHTTPError
+
+# Helper modules shipped with the blueprint live next to the manifest scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'package', 'python_files'))
+from artifact_cache import ArtifactCache, DEFAULT_MAX_GB, link_or_copy, default_cache_dir, validators_match
+from install_lock import InstallLock, LOCKFILE_NAME
+from bandwidth import LIMIT_FILE_NAME
+from offline_bundle import Bundle, BundleWriter
+import transport
+import requirements_batch
+import progress
+import bandwidth
 
 # Set up logging for get_conda_python_path and general use
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
@@ -87,11 +103,15 @@ def is_admin():
         
 
 class ManifestItem:
-    def __init__(self, url, location, overwrite, basefolder):
+    def __init__(self, url, location, overwrite, basefolder, options=None):
         self.url = url
         self.location = location
         self.overwrite = overwrite
         self.basefolder = basefolder
+        self.options = options or {}
+        # Optional integrity pins from the manifest (sha256=<hex>, size=<bytes>)
+        self.sha256 = self.options.get('sha256', '').lower() or None
+        self.size = int(self.options['size']) if self.options.get('size', '').isdigit() else None
         self.valid_url = validators.url(url)
         
         #Get the overwrite value and convert it to an actual boolean
@@ -109,6 +129,16 @@ class ManifestItem:
         self.item_type = self.interrogate_url()
         print(f'The manifest item type is: {self.item_type}')
 
+    def matches_pins(self):
+        """True if location is an existing file matching the pinned sha256/size (False when nothing is pinned)."""
+        if not (self.sha256 or self.size is not None) or not os.path.isfile(self.location):
+            return False
+        if self.size is not None and os.path.getsize(self.location) != self.size:
+            return False
+        if self.sha256:
+            return _hash_file(self.location).hexdigest() == self.sha256
+        return True
+
     def interrogate_url(self):
 
         if not self.valid_url:
@@ -180,73 +210,684 @@ class ManifestItem:
 
 def is_package_installed(package_name):
     """Check if the Python package is installed."""
+    return requirements_batch.is_installed(package_name)
+
+# git clone options per clone mode, picked per manifest row with clone=<mode>
+CLONE_MODES = {
+    'full': {},
+    # Full history, file contents are fetched lazily for the checked out commit only
+    'partial': {'filter': 'blob:none'},
+    'shallow': {'depth': 1, 'single_branch': True},
+}
+# Mode for GH_REPO rows without a clone option, set from --clone-mode; partial and shallow clones are opt-in
+default_clone_mode = 'full'
+# Seconds a recorded git remote check stays valid, set from --git-check-interval
+git_check_interval = 0
+
+def clone_options(options):
+    """
+    git clone keyword arguments for a manifest row.
+
+    Reads clone=full|partial|shallow (default: default_clone_mode), and the
+    optional depth=<n>, single_branch=TRUE and branch=<name> row options.
+    """
+    mode = options.get('clone', default_clone_mode).lower()
+    if mode not in CLONE_MODES:
+        print(f"Unknown clone mode '{mode}', using a full clone")
+        mode = 'full'
+    kwargs = dict(CLONE_MODES[mode])
+    if options.get('depth', '').isdigit():
+        kwargs['depth'] = int(options['depth'])
+    if options.get('single_branch', '').lower() == 'true':
+        kwargs['single_branch'] = True
+    if options.get('branch'):
+        kwargs['branch'] = options['branch']
+    return kwargs
+
+def resolve_local_ref(repo, ref):
+    """Commit sha of a commit/tag/branch name in the local repo, or None if it is not known locally."""
     try:
-        subprocess.check_call([f'pip show {package_name}'], shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return True
-    except subprocess.CalledProcessError:
+        return repo.git.rev_parse(f'{ref}^{{commit}}')
+    except GitCommandError:
+        return None
+
+def checkout_pin(repo, pin):
+    """
+    Check out a pinned commit or tag (detached HEAD), fetching it only when it is not available locally.
+
+    Returns:
+        bool: True if HEAD moved.
+    """
+    target = resolve_local_ref(repo, pin)
+    if target is None:
+        print(f"Fetching pinned ref {pin}")
+        repo.remotes.origin.fetch(tags=True)
+        target = resolve_local_ref(repo, pin)
+        if target is None:
+            repo.git.fetch('origin', pin)
+            target = resolve_local_ref(repo, pin) or resolve_local_ref(repo, 'FETCH_HEAD')
+    if repo.head.commit.hexsha == target:
+        return False
+    repo.git.checkout(target)
+    return True
+
+def remote_head_unchanged(repo):
+    """
+    Compare the local HEAD with the remote tip of the tracked branch using git ls-remote.
+
+    Returns:
+        bool: True if they match, False if they differ or there is no tracked branch.
+    """
+    try:
+        tracking = repo.active_branch.tracking_branch()
+    except TypeError:
+        # Detached HEAD
+        return False
+    if tracking is None:
         return False
+    out = repo.git.ls_remote(tracking.remote_name, f'refs/heads/{tracking.remote_head}')
+    remote_sha = out.split()[0] if out else None
+    return remote_sha == repo.head.commit.hexsha
 
-def clone_or_update_repo(repo_url, local_path):
-    """Clone the repo if it doesn't exist, or update it if it does."""
+def clone_or_update_repo(repo_url, local_path, clone_kwargs=None, pin=None):
+    """
+    Clone the repo if it doesn't exist, or update it if it does.
+
+    An existing repo is only pulled when git ls-remote shows the tracked branch
+    moved. With pin (a commit or tag) the repo is checked out at that ref
+    instead, without any network access when it is already there.
+
+    Returns:
+        str: 'cloned', 'updated' or 'unchanged'.
+    """
     if not os.path.exists(local_path):
         # Clone the repository
-        print(f"Cloning repository from {repo_url} to {local_path}")
-        repo = Repo.clone_from(repo_url, local_path)
-    else:
-        # Update the repository
-        print(f"Repository already exists at {local_path}. Pulling latest changes.")
-        repo = Repo(local_path)
-        origin = repo.remotes.origin
-        origin.pull()
+        print(f"Cloning repository from {repo_url} to {local_path} {clone_kwargs or ''}")
+        repo = Repo.clone_from(repo_url, local_path, **(clone_kwargs or {}))
+        if pin:
+            checkout_pin(repo, pin)
+        return 'cloned'
+
+    repo = Repo(local_path)
+    if pin:
+        if checkout_pin(repo, pin):
+            print(f"Repository at {local_path} checked out at {pin}.")
+            return 'updated'
+        print(f"Repository at {local_path} is already at {pin}.")
+        return 'unchanged'
+
+    if remote_head_unchanged(repo):
+        print(f"Repository at {local_path} is up to date with its remote.")
+        return 'unchanged'
+
+    # Update the repository
+    print(f"Repository already exists at {local_path}. Pulling latest changes.")
+    origin = repo.remotes.origin
+    origin.pull()
+    return 'updated'
 
 def install_package_from_local_path(local_path):
     """Install the package from the local repository."""
     print(f"Installing package from {local_path}")
-    subprocess.check_call([f'pip install {local_path}'], shell=True)
+    with progress.console():
+        returncode = requirements_batch.pip_install([local_path])
+    if returncode != 0:
+        raise subprocess.CalledProcessError(1, f'pip install {local_path}')
 
-def manage_package(package_name, repo_url, local_path):
+def manage_package(package_name, repo_url, local_path, clone_kwargs=None, pin=None):
     """Check if the package is installed, clone/update the repo, and install the package."""
     if is_package_installed(package_name):
         print(f"{package_name} is already installed. Updating the package.")
-        clone_or_update_repo(repo_url, local_path)
+        return clone_or_update_repo(repo_url, local_path, clone_kwargs, pin)
         
     else:
         print(f"{package_name} is not installed. Cloning the repository and installing the package.")
-        clone_or_update_repo(repo_url, local_path)
+        return clone_or_update_repo(repo_url, local_path, clone_kwargs, pin)
        
         
 # Function to Clone github Repos
-def clone_repo(repo_url, dest_folder):
+def clone_repo(repo_url, dest_folder, clone_kwargs=None):
     try:
         print(f"Cloning repository from {repo_url} into {dest_folder}")
-        Repo.clone_from(repo_url, dest_folder)
+        Repo.clone_from(repo_url, dest_folder, **(clone_kwargs or {}))
         print("Repository cloned successfully.")
     except Exception as e:
         print(f"An error occurred while cloning the repository: {e}")
 
 
+def _read_part_meta(meta_file):
+    try:
+        with open(meta_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_part_meta(meta_file, meta):
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f)
+
+def _hash_file(path, chunk_size=1024*1024):
+    """Return a sha256 hasher fed with the current contents of path."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h
+
+def check_integrity(file_name, digest, file_size, sha256=None, size=None):
+    """Raise ValueError when a download does not match its pinned sha256 or size."""
+    if size is not None and file_size != size:
+        raise ValueError(f'{file_name} is {file_size} bytes, the manifest expects {size}')
+    if sha256 and digest != sha256.lower():
+        raise ValueError(f'{file_name} has sha256 {digest}, the manifest expects {sha256.lower()}')
+
 # Function to stream the download of larger files
-def stream_dl(url,file_name):
-    # Open the stream to the URL
-    r = requests.get(url, stream=True)
+def _part_complete(url, meta):
+    """
+    True if a .part file of meta['length'] bytes is still the whole remote file.
+
+    A HEAD request has to report the Content-Length and the ETag (or
+    Last-Modified) recorded when the .part was started.
+    """
+    r = transport.head(url, headers={'Accept-Encoding': 'identity'}, allow_redirects=True)
+    if not r.ok:
+        return False
+    current = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+    return r.headers.get('Content-Length') == str(meta['length']) and validators_match(meta, current)
+
+def stream_dl(url, file_name, retries=5, backoff=2, sha256=None, size=None):
+    """
+    Stream a URL to file_name, resuming interrupted downloads.
+
+    Data is written to file_name + '.part'. If a previous attempt left a partial
+    file for the same URL, the download continues from its end with a Range
+    request. The server's ETag (or Last-Modified) is sent as If-Range, so a
+    changed file is fetched again from the start, and the total length has to
+    match Content-Length. A complete .part (the server answers 416) is only
+    taken after a HEAD request shows the same length and validators. Dropped connections are retried up to 'retries' times
+    with exponential backoff. The finished file is renamed into place.
+
+    The sha256 is computed while the chunks are written. When a pinned sha256
+    or size does not match, the download is restarted from scratch once and
+    then ValueError is raised, nothing is put in place.
+
+    Returns:
+        str: The sha256 hex digest of the downloaded file.
+    """
+    part_file = file_name + '.part'
+    meta_file = part_file + '.json'
 
     print('Saving to: ', file_name)
 
     # Create the directory/file 
-    os.makedirs(os.path.dirname(file_name), exist_ok=True)
-    with open(file_name, 'wb') as f:
-        for chunk in r.iter_content(chunk_size=1024*1024):
-            if chunk:
-                print('#',end="",flush=True)
-                f.write(chunk)
-    print('\nSave Complete.\n')
+    if os.path.dirname(file_name):
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+
+    attempt = 0
+    restarted = False
+    h, hashed = hashlib.sha256(), 0
+    task = progress.task(file_name, url=url)
+    # Finished on every way out, a Task left open would stay on the live display
+    with task:
+        while True:
+            meta = _read_part_meta(meta_file)
+            if meta.get('url') != url or not os.path.isfile(part_file):
+                meta = {'url': url}
+            offset = os.path.getsize(part_file) if 'length' in meta else 0
+            if offset != hashed:
+                # Resuming a .part file left by an earlier run, hash what is already on disk
+                h, hashed = _hash_file(part_file), offset
+
+            # Ask for the raw bytes so offsets line up with Content-Length
+            headers = {'Accept-Encoding': 'identity'}
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+                validator = meta.get('etag') or meta.get('last_modified')
+                if validator:
+                    headers['If-Range'] = validator
+            try:
+                # Open the stream to the URL
+                with transport.get(url, stream=True, headers=headers) as r:
+                    if r.status_code == 416 and offset:
+                        # Nothing left past offset: complete only if it is still the file the .part was started from
+                        if offset != meta.get('length') or not _part_complete(url, meta):
+                            _discard(part_file, meta_file)
+                            h, hashed = hashlib.sha256(), 0
+                            raise requests.exceptions.ConnectionError('Remote file changed, restarting the download')
+                        print('Download already complete.')
+                    else:
+                        r.raise_for_status()
+                        content_range = r.headers.get('Content-Range', '')
+                        resumed = r.status_code == 206 and content_range.startswith(f'bytes {offset}-')
+                        if resumed and content_range.rsplit('/', 1)[-1] not in ('*', str(meta.get('length'))):
+                            # The remote file changed size since the .part file was started
+                            resumed = False
+                        if r.status_code == 206 and not resumed:
+                            os.remove(part_file)
+                            os.remove(meta_file)
+                            h, hashed = hashlib.sha256(), 0
+                            raise requests.exceptions.ConnectionError('Remote file changed, restarting the download')
+                        if resumed:
+                            print(f'Resuming download at byte {offset}')
+                            mode = 'ab'
+                        else:
+                            offset = 0
+                            mode = 'wb'
+                            h, hashed = hashlib.sha256(), 0
+                            length = r.headers.get('Content-Length')
+                            meta = {'url': url,
+                                    'etag': r.headers.get('ETag'),
+                                    'last_modified': r.headers.get('Last-Modified'),
+                                    'length': int(length) if length and r.status_code == 200 else None}
+                            _write_part_meta(meta_file, meta)
+
+                        task.reset(hashed, meta.get('length'))
+                        with open(part_file, mode) as f:
+                            for chunk in r.iter_content(chunk_size=1024*1024):
+                                if chunk:
+                                    f.write(chunk)
+                                    h.update(chunk)
+                                    hashed += len(chunk)
+                                    task.advance(len(chunk))
+
+                if meta.get('length') is not None and hashed != meta['length']:
+                    raise requests.exceptions.ConnectionError(f'Incomplete download: {hashed} of {meta["length"]} bytes')
+                try:
+                    check_integrity(file_name, h.hexdigest(), hashed, sha256, size)
+                except ValueError as e:
+                    for stale in (part_file, meta_file):
+                        if os.path.exists(stale):
+                            os.remove(stale)
+                    if restarted:
+                        raise
+                    print(f'{e}, restarting the download')
+                    progress.emit('retry', name=file_name, error=str(e))
+                    restarted = True
+                    h, hashed = hashlib.sha256(), 0
+                    continue
+                break
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, requests.exceptions.HTTPError) as e:
+                # Client errors (404, 403, ...) will not get better by retrying
+                if isinstance(e, requests.exceptions.HTTPError) and e.response is not None and e.response.status_code < 500:
+                    raise
+                attempt += 1
+                if attempt > retries:
+                    print(f'Download failed after {retries} retries: {e}')
+                    raise
+                delay = backoff * 2 ** (attempt - 1)
+                print(f'Download interrupted ({e}), retrying in {delay}s [{attempt}/{retries}]')
+                progress.emit('retry', name=file_name, attempt=attempt, delay=delay, error=str(e))
+                time.sleep(delay)
+
+        os.replace(part_file, file_name)
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+    print(f'Save Complete ({hashed / 1024**2:.1f} MiB at {task.rate() / 1024**2:.1f} MiB/s).\n')
+    return h.hexdigest()
+
+# Files at least this large are fetched over several connections when the server supports ranges
+SEGMENT_MIN_SIZE = 64*1024*1024
+SEGMENT_MAX_COUNT = 8
+# Seconds between saves of the segment progress sidecar while segments are downloading
+SEGMENT_SAVE_INTERVAL = 1.0
+
+def probe_ranges(url):
+    """
+    Ask the server for the first byte of url to learn its size and range support.
+
+    Returns:
+        tuple: (length, etag, last_modified) when byte ranges are supported, otherwise (None, None, None).
+    """
+    headers = {'Range': 'bytes=0-0', 'Accept-Encoding': 'identity'}
+    with transport.get(url, stream=True, headers=headers) as r:
+        r.raise_for_status()
+        content_range = r.headers.get('Content-Range', '')
+        if r.status_code != 206 or not content_range.startswith('bytes 0-0/'):
+            return None, None, None
+        total = content_range.rsplit('/', 1)[-1]
+        if not total.isdigit():
+            return None, None, None
+        return int(total), r.headers.get('ETag'), r.headers.get('Last-Modified')
+
+class _SegmentState:
+    """
+    How far every segment of a segmented download got, kept in a sidecar file.
 
-def check_hf_token_validity(token):
+    The sidecar records the URL, length and validator (ETag or Last-Modified)
+    of the remote file and [start, end, done] per segment. A count is only
+    raised once its bytes were handed to the OS, and the sidecar is rewritten
+    at most every SEGMENT_SAVE_INTERVAL seconds and when a segment ends, so it
+    never claims bytes the part file does not hold.
+    """
+
+    def __init__(self, meta_file, meta):
+        self.meta_file = meta_file
+        self.meta = meta
+        self._lock = threading.Lock()
+        self._saved = time.monotonic()
+
+    @classmethod
+    def resume(cls, meta_file, part_file, url, length, validator):
+        """The saved state when it is for the same remote file and the part file is still there, otherwise None."""
+        meta = _read_part_meta(meta_file)
+        if not validator or not os.path.isfile(part_file) or os.path.getsize(part_file) != length:
+            return None
+        if (meta.get('url'), meta.get('length'), meta.get('validator')) != (url, length, validator) or not meta.get('segments'):
+            return None
+        return cls(meta_file, meta)
+
+    @classmethod
+    def create(cls, meta_file, url, length, validator, segments):
+        step = -(-length // segments)
+        meta = {'url': url, 'length': length, 'validator': validator,
+                'segments': [[start, min(start + step, length) - 1, 0] for start in range(0, length, step)]}
+        state = cls(meta_file, meta)
+        state.save()
+        return state
+
+    def segment(self, index):
+        """(start, end, done) of a segment, end inclusive."""
+        with self._lock:
+            return tuple(self.meta['segments'][index])
+
+    def advance(self, index, n):
+        with self._lock:
+            self.meta['segments'][index][2] += n
+            if time.monotonic() - self._saved >= SEGMENT_SAVE_INTERVAL:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        tmp = self.meta_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_file)
+        self._saved = time.monotonic()
+
+    def pending(self):
+        """Indexes of the segments still missing bytes."""
+        with self._lock:
+            return [i for i, (start, end, done) in enumerate(self.meta['segments']) if start + done <= end]
+
+    def done_bytes(self):
+        with self._lock:
+            return sum(done for _, _, done in self.meta['segments'])
+
+    def prefix(self):
+        """Number of bytes in place from the start of the file on, up to the first gap."""
+        with self._lock:
+            prefix = 0
+            for start, end, done in self.meta['segments']:
+                prefix = start + done
+                if prefix <= end:
+                    break
+            return prefix
+
+def _fetch_segment(url, part_file, state, index, validator, retries, backoff, task):
+    """Fetch the missing bytes of segment index of url into the same offsets of part_file."""
+    attempt = 0
+    with open(part_file, 'r+b') as f:
+        while True:
+            start, end, done = state.segment(index)
+            if start + done > end:
+                break
+            headers = {'Range': f'bytes={start + done}-{end}', 'Accept-Encoding': 'identity'}
+            if validator:
+                headers['If-Range'] = validator
+            try:
+                with transport.get(url, stream=True, headers=headers) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206 or not r.headers.get('Content-Range', '').startswith(f'bytes {start + done}-{end}/'):
+                        raise ValueError(f'Server did not honour the range request for bytes {start + done}-{end}')
+                    f.seek(start + done)
+                    for chunk in r.iter_content(chunk_size=1024*1024):
+                        if chunk:
+                            f.write(chunk)
+                            # Flushed before it is counted, the sidecar must not run ahead of the file
+                            f.flush()
+                            state.advance(index, len(chunk))
+                            task.advance(len(chunk))
+                start, end, done = state.segment(index)
+                if start + done <= end:
+                    raise requests.exceptions.ConnectionError(f'Segment ended early at byte {start + done}')
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, requests.exceptions.HTTPError) as e:
+                if isinstance(e, requests.exceptions.HTTPError) and e.response is not None and e.response.status_code < 500:
+                    raise
+                attempt += 1
+                if attempt > retries:
+                    raise
+                delay = backoff * 2 ** (attempt - 1)
+                print(f'Segment {index} interrupted ({e}), retrying in {delay}s [{attempt}/{retries}]')
+                time.sleep(delay)
+    state.save()
+
+def _discard(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def segmented_dl(url, file_name, max_segments=SEGMENT_MAX_COUNT, min_segment_size=SEGMENT_MIN_SIZE, retries=5, backoff=2, sha256=None, size=None):
+    """
+    Download url over several parallel connections, one per byte range.
+
+    The number of segments follows from the file size, at most max_segments and
+    none smaller than min_segment_size. Each segment is written straight to its
+    offset in a preallocated file_name + '.seg.part', and a sidecar .json next
+    to it records how far every segment got. A later call (or run) resumes
+    every segment where it stopped, as long as the server still reports the
+    same length and ETag/Last-Modified.
+
+    A dropped segment is retried on its own. One that still fails ends the
+    segmented download: the bytes in place from the start of the file on become
+    the .part file of stream_dl, which fetches the rest over one connection.
+    Falls back to stream_dl from the start when the server does not support
+    ranges, the file is too small to split or it changed during the download.
+
+    Segments arrive out of order, so unlike stream_dl the sha256 is computed in
+    one pass over the assembled file (still in the OS page cache) before the
+    rename. When a pinned sha256 or size does not match, the download is
+    restarted from scratch once and then ValueError is raised.
+
+    Returns:
+        str: The sha256 hex digest of the downloaded file.
+    """
+    # An interrupted single-stream download is cheaper to resume than to restart
+    if os.path.exists(file_name + '.part'):
+        return stream_dl(url, file_name, retries, backoff, sha256, size)
+
+    try:
+        length, etag, last_modified = probe_ranges(url)
+    except requests.exceptions.RequestException as e:
+        print(f'Range probe failed ({e}), using a single stream')
+        length, etag, last_modified = None, None, None
+
+    segments = min(max_segments, length // min_segment_size) if length else 0
+    if segments < 2:
+        return stream_dl(url, file_name, retries, backoff, sha256, size)
+
+    part_file = file_name + '.seg.part'
+    meta_file = part_file + '.json'
+    validator = etag or last_modified
+    if os.path.dirname(file_name):
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+
+    restarted = False
+    while True:
+        state = _SegmentState.resume(meta_file, part_file, url, length, validator)
+        if state is None:
+            # Preallocate the file so every segment can write at its own offset
+            with open(part_file, 'wb') as f:
+                f.truncate(length)
+            state = _SegmentState.create(meta_file, url, length, validator, segments)
+            print(f'Saving to: {file_name} ({segments} segments)')
+        else:
+            print(f'Resuming {file_name} at {state.done_bytes() / 1024**2:.1f} of {length / 1024**2:.1f} MiB '
+                  f'({len(state.pending())} of {len(state.meta["segments"])} segments left)')
+
+        # Segment threads do not inherit the row of this thread, the task carries it
+        task = progress.task(file_name, total=length, url=url, segments=len(state.meta['segments']))
+        task.reset(state.done_bytes(), length)
+        try:
+            pending = state.pending()
+            if pending:
+                with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                    futures = [pool.submit(bandwidth.inherit(_fetch_segment), url, part_file, state, index, validator, retries, backoff, task)
+                               for index in pending]
+                    for future in futures:
+                        future.result()
+            if state.pending() or os.path.getsize(part_file) != length:
+                raise ValueError(f'Downloaded file is incomplete, {state.done_bytes()} of {length} bytes')
+            digest = _hash_file(part_file).hexdigest()
+        except requests.exceptions.RequestException as e:
+            # The other segments have finished by now, keep what lines up from byte 0
+            state.save()
+            task.done(error=str(e))
+            prefix = state.prefix()
+            print(f'Segmented download failed ({e}), continuing at byte {prefix} over a single stream')
+            if prefix:
+                with open(part_file, 'r+b') as f:
+                    f.truncate(prefix)
+                os.replace(part_file, file_name + '.part')
+                _write_part_meta(file_name + '.part.json', {'url': url, 'etag': etag, 'last_modified': last_modified, 'length': length})
+            _discard(part_file, meta_file)
+            return stream_dl(url, file_name, retries, backoff, sha256, size)
+        except ValueError as e:
+            # The remote file changed or the server stopped honouring ranges
+            task.done(error=str(e))
+            print(f'Segmented download failed ({e}), falling back to a single stream')
+            _discard(part_file, meta_file)
+            return stream_dl(url, file_name, retries, backoff, sha256, size)
+        except BaseException as e:
+            state.save()
+            task.done(error=str(e) or type(e).__name__)
+            raise
+
+        try:
+            check_integrity(file_name, digest, length, sha256, size)
+        except ValueError as e:
+            _discard(part_file, meta_file)
+            task.done(error=str(e))
+            if restarted:
+                raise
+            print(f'{e}, restarting the download')
+            progress.emit('retry', name=file_name, error=str(e))
+            restarted = True
+            continue
+        break
+
+    os.replace(part_file, file_name)
+    _discard(meta_file)
+    task.done()
+    print(f'Save Complete ({length / 1024**2:.1f} MiB at {task.rate() / 1024**2:.1f} MiB/s).\n')
+    return digest
+
+# Shared artifact cache, set up from the command line options (None when disabled)
+artifact_cache = None
+# Lockfile of the current install folder (None when incremental re-runs are disabled)
+install_lock = None
+# Bundle rows are installed from with --from-bundle (None when installing from the network)
+offline_bundle = None
+
+def current_validators(url, known=None):
+    """
+    The ETag and Last-Modified url has now, to tell whether its artifact cache entry is stale.
+
+    known are validators check_lock already got from the server during this
+    run. Otherwise a conditional HEAD is sent with the validators the cache
+    holds for url, and a 304 confirms them.
+
+    Returns:
+        dict: etag and last_modified, or None when the server could not be asked.
+    """
+    if known and (known.get('etag') or known.get('last_modified')):
+        return known
+    try:
+        _unchanged, validators = remote_unchanged(url, artifact_cache.url_validators(url))
+    except requests.exceptions.RequestException as e:
+        print(f'Could not check {url} for changes ({e}), the artifact cache is not used for it')
+        return None
+    return validators
+
+def cached_dl(url, file_name, sha256=None, size=None, validators=None):
+    """
+    Place url at file_name from the artifact cache, downloading and caching it on a miss.
+
+    With a pinned sha256 the cache is looked up by digest only. Otherwise the
+    cached copy of the URL is revalidated (see current_validators, validators
+    are the ones check_lock saw) and only served while the server still
+    reports the ETag/Last-Modified it was downloaded with, so a URL whose
+    content changed upstream is never served stale.
+
+    Returns:
+        str: The sha256 of the placed file.
+    """
+    if artifact_cache:
+        if not sha256:
+            validators = current_validators(url, validators)
+        cached = artifact_cache.fetch(url, file_name, sha256, validators)
+        if cached:
+            return cached.name
+    digest = segmented_dl(url, file_name, sha256=sha256, size=size)
+    if artifact_cache:
+        try:
+            artifact_cache.add(url, file_name, sha256=digest, validators=validators)
+        except OSError as e:
+            print(f'Could not add {file_name} to the artifact cache: {e}')
+    return digest
+
+def extract_remote_zip(url, location, delete_archive=False, sha256=None, size=None, validators=None):
+    """
+    Download a zip archive to disk and extract it into location.
+
+    The archive is streamed to a file, in the artifact cache when it is enabled
+    and otherwise in a temporary folder next to location, so peak memory does not
+    grow with the archive size. A cached archive is looked up and revalidated
+    like in cached_dl. The temporary copy is always removed after extraction;
+    with delete_archive the cached copy is dropped as well.
+    """
+    tmp_dir = None
+    if artifact_cache:
+        if sha256:
+            archive = artifact_cache.lookup_digest(sha256)
+        else:
+            validators = current_validators(url, validators)
+            archive = artifact_cache.lookup_url(url, validators)
+        if archive is None:
+            staged = str(artifact_cache.staging_path(url))
+            digest = segmented_dl(url, staged, sha256=sha256, size=size)
+            archive = artifact_cache.blob_path(artifact_cache.add(url, staged, sha256=digest, move=True, validators=validators))
+        else:
+            print('Using cached archive: ', archive)
+    else:
+        parent = os.path.dirname(os.path.abspath(location))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix='.installmill-', dir=parent)
+        archive = os.path.join(tmp_dir, os.path.basename(urllib.parse.urlsplit(url).path) or 'archive.zip')
+        segmented_dl(url, archive, sha256=sha256, size=size)
+
+    print('Extracting to: ', location)
+    try:
+        with zipfile.ZipFile(archive, mode='r') as z:
+            z.extractall(location)
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        elif delete_archive:
+            artifact_cache.discard(Path(archive).name)
+
+def check_hf_token_validity(token, endpoint=None):
     """
     Check if a Hugging Face token is valid using the whoami endpoint.
 
     Args:
         token (str): The Hugging Face API token to validate.
+        endpoint (str): Hub endpoint, defaults to HF_ENDPOINT / https://huggingface.co.
 
     Returns:
         tuple: A tuple containing:
@@ -258,12 +899,12 @@ def check_hf_token_validity(token):
         return False, "Token is empty or not provided"
 
     # Define the API endpoint and headers
-    endpoint = "https://huggingface.co/api/whoami-v2"
+    whoami_url = f"{endpoint or ENDPOINT}/api/whoami-v2"
     headers = {"Authorization": f"Bearer {token}"}
 
     try:
         # Make the GET request to the whoami endpoint
-        response = requests.get(endpoint, headers=headers)
+        response = transport.get(whoami_url, headers=headers)
 
         # Check the response status code
         if response.status_code == 200:
@@ -284,12 +925,16 @@ def check_hf_token_validity(token):
         # Handle cases where the response is not valid JSON
         return False, "Invalid response format: not JSON"
 
-def check_model_access(model):
+def check_model_access(model, endpoint=None):
     """
     Check if the user has access to a specified Hugging Face model using the HF_TOKEN environment variable.
 
+    Only the file metadata is requested (a HEAD on the resolve URL), nothing is
+    downloaded or written to the hub cache.
+
     Args:
-        model_name (str): The name of the model repository (e.g., "meta-llama/Llama-2-7b").
+        model (dict): model_name (e.g. "meta-llama/Llama-2-7b"), filename and token.
+        endpoint (str): Hub endpoint, defaults to HF_ENDPOINT / https://huggingface.co.
 
     Returns:
         tuple: (bool, str) where the first element indicates success (True if access is granted, False otherwise),
@@ -297,15 +942,22 @@ def check_model_access(model):
     """
 
     try:
-        # Attempt to list files in the model repository with the provided token
-        g = hf_hub_download(repo_id=model["model_name"], filename=model["filename"], token=model["token"])
+        url = hf_hub_url(model["model_name"], model["filename"], endpoint=endpoint)
+        get_hf_file_metadata(url, token=model["token"], endpoint=endpoint)
         return True, "User has access to the model"
 
-    except requests.exceptions.HTTPError as e:
+    except GatedRepoError:
+        return False, "User does not have access to the gated model"
+
+    except RepositoryNotFoundError:
+        return False, "The model repository does not exist"
+
+    except (HfHubHTTPError, requests.exceptions.HTTPError) as e:
         # Handle HTTP errors, specifically 401 (Unauthorized) or 403 (Forbidden)
-        if e.response.status_code == 404:
+        status_code = e.response.status_code if e.response is not None else None
+        if status_code == 404:
             return False, "The model repository does not exist"
-        elif e.response.status_code in [401, 403]:
+        elif status_code in [401, 403]:
             return False, "User does not have access to the gated model"
         else:
             return False, f"An HTTP error occurred: {e}"
@@ -314,16 +966,255 @@ def check_model_access(model):
         # Catch any other unexpected errors
         return False, f"An unexpected error occurred: {e}"
 
+def check_models_access(model_list, cache_file=None, ttl=24*3600, endpoint=None):
+    """
+    Check access to every model in model_list concurrently.
+
+    Granted access is remembered in cache_file per token (only a sha256 of the
+    token is stored) for ttl seconds, so repeated runs skip those checks.
+    Denials are never cached, access accepted on the website shows up at once.
+
+    Returns:
+        list: One (model, bool, str) tuple per model, in model_list order.
+    """
+    try:
+        with open(cache_file, 'r') as f:
+            access_cache = json.load(f)
+    except (TypeError, OSError, ValueError):
+        access_cache = {}
+
+    now = time.time()
+    results = {}
+    pending = []
+    for model in model_list:
+        token_key = hashlib.sha256((model["token"] or '').encode()).hexdigest()
+        checked_at = access_cache.get(token_key, {}).get(model["model_name"], 0)
+        if ttl and now - checked_at < ttl:
+            results[model["model_name"]] = (True, "User has access to the model (cached)")
+        else:
+            pending.append(model)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            checks = pool.map(lambda model: check_model_access(model, endpoint), pending)
+            for model, result in zip(pending, checks):
+                results[model["model_name"]] = result
+                if result[0]:
+                    token_key = hashlib.sha256((model["token"] or '').encode()).hexdigest()
+                    access_cache.setdefault(token_key, {})[model["model_name"]] = now
+
+        if cache_file and ttl:
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                with open(cache_file + '.tmp', 'w') as f:
+                    json.dump(access_cache, f)
+                os.replace(cache_file + '.tmp', cache_file)
+            except OSError as e:
+                print(f"Could not save the model access cache: {e}")
+
+    return [(model, *results[model["model_name"]]) for model in model_list]
+
+def _same_volume(path_a, path_b):
+    try:
+        return os.stat(path_a).st_dev == os.stat(path_b).st_dev
+    except OSError:
+        return False
+
+def place_hf_file(repo_id, filename, location):
+    """
+    Materialize a file of a HF repo at location in one step.
+
+    When the hub cache is on the same volume as location, the file is downloaded
+    into (or found in) the hub cache and hardlinked into place, so it is kept for
+    other installs without a second copy. Otherwise it is downloaded with
+    local_dir into a staging folder next to location and renamed into place.
+    Only the copy fallback, for filesystems without hardlinks, moves any bytes.
+
+    Returns:
+        int: Number of bytes copied to place the file (0 on the fast paths).
+    """
+    target_dir = os.path.dirname(os.path.abspath(location))
+    os.makedirs(target_dir, exist_ok=True)
+    os.makedirs(HF_HUB_CACHE, exist_ok=True)
+
+    with progress.task(location, repo=repo_id) as task:
+        tqdm_class = progress.tqdm_class(task)
+        if _same_volume(HF_HUB_CACHE, target_dir):
+            cached = os.path.realpath(hf_hub_download(repo_id=repo_id, filename=filename, tqdm_class=tqdm_class))
+            method = link_or_copy(cached, location, hardlink=True)
+            copied = os.path.getsize(location) if method == 'copy' else 0
+        else:
+            staging = tempfile.mkdtemp(prefix='.installmill-', dir=target_dir)
+            try:
+                downloaded = hf_hub_download(repo_id=repo_id, filename=filename, local_dir=staging, tqdm_class=tqdm_class)
+                os.replace(downloaded, location)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+            method, copied = 'rename', 0
+    print(f'Placed {location} ({method}, {copied} bytes copied)')
+    return copied
+
+def remote_unchanged(url, entry):
+    """
+    Conditional HEAD request for url against the validators recorded in entry.
+
+    Returns:
+        tuple: (unchanged, validators) where validators holds the current ETag and Last-Modified.
+    """
+    headers = {'Accept-Encoding': 'identity'}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    r = transport.head(url, headers=headers, allow_redirects=True)
+    if r.status_code == 304:
+        return True, {'etag': entry.get('etag'), 'last_modified': entry.get('last_modified')}
+    r.raise_for_status()
+    validators = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified')}
+    # Some servers ignore conditional headers on HEAD, compare the validators ourselves
+    if validators['etag']:
+        unchanged = validators['etag'] == entry.get('etag')
+    else:
+        unchanged = bool(validators['last_modified']) and validators['last_modified'] == entry.get('last_modified')
+    return unchanged, validators
+
+def _source_fingerprint(path):
+    stat = os.stat(path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+def check_lock(element, entry):
+    """
+    Decide whether a manifest row is unchanged since the install recorded in entry.
+
+    Remote downloads are checked with a conditional HEAD request, HF files and
+    repos by their current revision, winget/ComfyUI-Manager rows by their
+    command and local files by a fingerprint of the source. Local .py scripts
+    are never unchanged: what they install lives outside the install folder
+    (Blender files and add-ons, the NIM container) and can go missing or need
+    a new target whatever the script's own fingerprint says, and they skip
+    their own work when it is already done. Git repos count as
+    unchanged without network access when they sit at their pinned ref, or when
+    the recorded commit is still checked out and the remote was checked less
+    than git_check_interval seconds ago; otherwise clone_or_update_repo asks
+    the remote.
+
+    Returns:
+        tuple: (unchanged, state) where state holds the freshly learned validators to record.
+    """
+    output_ok = os.path.exists(element.location)
+    if output_ok and os.path.isfile(element.location) and 'size' in entry:
+        output_ok = os.path.getsize(element.location) == entry['size']
+
+    match element.item_type:
+        case 'HF_FILE':
+            f_name = element.url_parts.path.split('/blob/main/')[1]
+            meta = get_hf_file_metadata(hf_hub_url(element.repo_id, f_name))
+            state = {'revision': meta.commit_hash, 'etag': meta.etag}
+            unchanged = bool(entry) and (entry.get('etag') == meta.etag or entry.get('revision') == meta.commit_hash)
+            return output_ok and unchanged, state
+        case 'HF_REPO':
+            state = {'revision': HfApi().model_info(element.repo_id).sha}
+            return output_ok and bool(entry) and entry.get('revision') == state['revision'], state
+        case 'GH_REPO':
+            if not output_ok or not entry:
+                return False, {}
+            repo = Repo(element.location)
+            head = repo.head.commit.hexsha
+            if element.options.get('pin'):
+                return resolve_local_ref(repo, element.options['pin']) == head, {}
+            recent = time.time() - entry.get('checked_at', 0) < git_check_interval
+            return recent and entry.get('commit') == head, {}
+        case 'WINGET_INSTALL' | 'CM_MANAGER_INSTALL':
+            state = {'fingerprint': element.url}
+            return entry.get('fingerprint') == state['fingerprint'], state
+        case 'LOCAL_FILE':
+            state = {'fingerprint': _source_fingerprint(element.url)}
+            if os.path.splitext(element.url)[1] == '.py':
+                return False, state
+            return output_ok and entry.get('fingerprint') == state['fingerprint'], state
+        case 'GH_FILE' | 'UNDEFINED':
+            unchanged, state = remote_unchanged(element.url, entry)
+            return output_ok and bool(entry) and unchanged, state
+    return False, {}
+
 # Function to Download and extract files
-def get_and_extract(url, location, overwrite, basefolder=os.getcwd()):
-    print('URL: ', url)
-    element = ManifestItem(url,location,overwrite, basefolder)
-    # this will return a tuple of root and extension
-    split_tup = os.path.splitext(element.url)
+def hf_repo_patterns(element):
+    """
+    Include/exclude file patterns of an HF_REPO row from its url querystring.
 
-    # extract the file name and extension
-    url_base = split_tup[0]
-    file_extension = split_tup[1]
+    Returns:
+        tuple: (include_list, exclude_list)
+    """
+    include_list = ['*.*']
+    exclude_list = ['*.md']
+    #check url querystring for inclusion/exclusions
+    if len(element.url_parts.query): #If the query portion is not empty
+        query_args=element.url_parts.query.split('&')
+        for arg in query_args:
+            filter_key, filter_mask = arg.split('=')
+            filter_key = filter_key.lower().replace(' ','') #convert to lower and remove any whitespace
+            filter_mask = filter_mask.replace(' ','') #remove any whitespace
+
+            match filter_key:
+                case 'exclude':
+                    exclude_list = exclude_list+filter_mask.split(',')
+
+                case 'include':
+                    include_list = filter_mask.split(',')
+    return include_list, exclude_list
+
+def run_python_script(script):
+    """
+    Run a Python script with the installer's interpreter, streaming its output.
+
+    Returns:
+        bool: True if the script exited with code 0.
+    """
+    print(f"Executing local Python script: {script}")
+    try:
+        # Run the script as a subprocess with Popen for real-time output
+        process = subprocess.Popen(
+            [sys.executable, script],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,  # Combine stderr with stdout
+            text=True,
+            bufsize=1,
+            universal_newlines=True
+        )
+        # Stream output in real-time
+        while True:
+            line = process.stdout.readline().strip()
+            if not line and process.poll() is not None:
+                break
+            if line:
+                print(line)  # Print output to console
+        # Wait for the process to complete and get the return code
+        return_code = process.wait()
+        print(f"Script {script} exited with code {return_code}")
+        if return_code != 0:
+            print(f"Warning: Script {script} failed with exit code {return_code}")
+            return False
+        # Continue processing CSV regardless of exit code
+        return True
+    except subprocess.SubprocessError as e:
+        print(f"Error executing {script}: {e}")
+        return False
+
+def precheck(url, element, force=False):
+    """
+    Decide whether a manifest row has to run at all, without changing anything.
+
+    Applies the integrity pins, the overwrite flag and the install lockfile in
+    the order get_and_extract does.
+
+    Returns:
+        tuple: (outcome, lock_state) where outcome is 'skipped', 'unchanged' or
+        None when the row has to run.
+    """
+    location = element.location
+    if element.matches_pins():
+        print(f"Existing file matches the pinned checksum, skipping: {location}")
+        return 'skipped', {}
 
     if os.path.exists(location):
         print("File exists...")
@@ -331,37 +1222,50 @@ def get_and_extract(url, location, overwrite, basefolder=os.getcwd()):
         if not element.overwrite:
             print("Overwrite flag set to FALSE")
             print("Existing file(s) will not be updated.")
-            return
+            return 'skipped', {}
         else:
             print("Overwrite flag set to TRUE")
             print("Existing file(s) will be updated/overwritten")
+
+    lock_state = {}
+    if install_lock and element.item_type != 'INVALID_URL':
+        try:
+            unchanged, lock_state = check_lock(element, install_lock.get(url, location))
+        except Exception as e:
+            print(f"Could not check {url} against the install lock: {e}")
+            unchanged = False
+        if unchanged and not force:
+            print(f"Unchanged since the last install, skipping: {location}")
+            return 'unchanged', {}
+    return None, lock_state
+
+def get_and_extract(url, location, overwrite, basefolder=os.getcwd(), options=None, force=False):
+    print('URL: ', url)
+    if offline_bundle is not None:
+        return install_from_bundle(url, location, overwrite, basefolder, force)
+    element = ManifestItem(url,location,overwrite, basefolder, options)
+    # this will return a tuple of root and extension
+    split_tup = os.path.splitext(element.url)
+
+    # extract the file name and extension
+    url_base = split_tup[0]
+    file_extension = split_tup[1]
+
+    outcome, lock_state = precheck(url, element, force)
+    if outcome:
+        return outcome
+
+    result = None
+    digest = None
     match element.item_type:
         case 'HF_FILE':
-            if element.overwrite:
-                print("Deleting existing file: " + element.location)
-                if os.path.isfile(element.location):
-                    try:
-                        os.remove(element.location)
-                    except OSError as e:
-                        print("Error: %s - %s." % (e.filename, e.strerror))
-                        
-            repo_id = element.repo_id
             f_name = element.url_parts.path.split('/blob/main/')[1]
-            l_dir = element.local_path + '/' + f_name
-
             enable_progress_bars()
-            #hf_hub_download(repo_id=element.repo_id, filename=f_name) #download to the local cache first
-            hf_hub_download(repo_id=element.repo_id,filename=f_name,local_dir=l_dir) #download to local directory, will used cached files
-            #huggingface downloads download the directory, we'll need to fix this
-            dir_root = element.local_path + '/' + f_name.split('/')[0]
-            if os.path.exists(dir_root):
-                if not os.path.isfile(dir_root):    
-                    #os.rename(dir_root, element.local_path+"/delete")
-                    shutil.move(element.local_path +'/'+ f_name +'/'+ f_name, element.local_path + '/file.tmp')
-                    shutil.rmtree(element.local_path+'/'+f_name.split('/')[0])
-                    shutil.move(element.local_path + '/file.tmp', element.location)
+            place_hf_file(element.repo_id, f_name, element.location)
         case 'CM_MANAGER_INSTALL':
-            subprocess.call([sys.executable, './ComfyUI/custom_nodes/ComfyUI-Manager/cm-cli.py','install',element.url])
+            with progress.console():
+                if subprocess.call([sys.executable, './ComfyUI/custom_nodes/ComfyUI-Manager/cm-cli.py','install',element.url]) != 0:
+                    result = False
 
         case 'WINGET_INSTALL':
             print(f"Installing winget install using: 'winget install {element.url}'")
@@ -372,73 +1276,54 @@ def get_and_extract(url, location, overwrite, basefolder=os.getcwd()):
                 # Notify the user
                 print(f"Installing {element.url} using winget. Please respond to any prompts in the terminal.")
 
-                # Run the command, keeping the terminal interactive
-                result = subprocess.run(
-                    command,
-                    shell=True,  # Required for winget to run in the shell
-                    check=False,  # Don't raise an exception on non-zero exit codes
-                    text=True,    # Ensure output is treated as text
-                    stdout=sys.stdout,  # Direct output to terminal
-                    stderr=sys.stderr,  # Direct errors to terminal
-                    stdin=sys.stdin     # Allow user input for prompts
-                )
+                # Run the command, keeping the terminal interactive (and the live display out of the way)
+                with progress.console():
+                    result = subprocess.run(
+                        command,
+                        shell=True,  # Required for winget to run in the shell
+                        check=False,  # Don't raise an exception on non-zero exit codes
+                        text=True,    # Ensure output is treated as text
+                        stdout=sys.stdout,  # Direct output to terminal
+                        stderr=sys.stderr,  # Direct errors to terminal
+                        stdin=sys.stdin     # Allow user input for prompts
+                    )
 
                 # Check the result
                 if result.returncode == 0:
                     print(f"Successfully installed {element.url}.")
-                    return True
+                    result = True
                 else:
                     print(f"Failed to install {element.url}. Exit code: {result.returncode}")
-                    return False
+                    result = False
 
             except subprocess.SubprocessError as e:
                 print(f"An error occurred while running winget: {e}")
-                return False
+                result = False
 
 
         case 'HF_REPO':
-            include_list = ['*.*']
-            exclude_list = ['*.md']
+            include_list, exclude_list = hf_repo_patterns(element)
             enable_progress_bars()
-            #check url querystring for inclusion/exclusions
-            if len(element.url_parts.query): #If the query portion is not empty
-                query_args=element.url_parts.query.split('&')
-                for arg in query_args:
-                    filter_key, filter_mask = arg.split('=')
-                    filter_key = filter_key.lower().replace(' ','') #convert to lower and remove any whitespace
-                    filter_mask = filter_mask.replace(' ','') #remove any whitespace
-                    
-                    
-                    match filter_key:
-                        case 'exclude':
-                            exclude_list = exclude_list+filter_mask.split(',')
-
-                        case 'include':
-                            include_list = filter_mask.split(',')
-
-            snapshot_download(repo_id=element.repo_id, local_dir=element.location, allow_patterns=include_list, ignore_patterns=exclude_list)
+            with progress.task(element.location, repo=element.repo_id) as task:
+                snapshot_download(repo_id=element.repo_id, local_dir=element.location, allow_patterns=include_list,
+                                  ignore_patterns=exclude_list, tqdm_class=progress.tqdm_class(task))
 
         case 'GH_FILE':
-            stream_dl(element.url, element.location)
+            digest = cached_dl(element.url, element.location, element.sha256, element.size, lock_state)
 
         case 'GH_REPO':
-            manage_package(element.repo_id,element.url,element.location)
+            if manage_package(element.repo_id,element.url,element.location,clone_options(element.options),element.options.get('pin')) == 'unchanged':
+                result = 'unchanged'
 
         case 'UNDEFINED' | 'LOCAL_FILE':
             match file_extension:
                 case '.zip':
                     if element.item_type == 'LOCAL_FILE':
-                        z = zipfile.ZipFile(element.url, mode='r')
-                    else:
-                        # Get the URL
-                        r = requests.get(url)
-    
                         print('Extracting to: ', location)
-    
-                        # Stream the URL into the Zip Decompressor
-                        z= zipfile.ZipFile(io.BytesIO(r.content))
-                        
-                    z.extractall(location)
+                        with zipfile.ZipFile(element.url, mode='r') as z:
+                            z.extractall(location)
+                    else:
+                        extract_remote_zip(url, location, element.options.get('delete_archive', '').lower() == 'true', element.sha256, element.size, lock_state)
                     print('Extraction complete.\n')
 
                 # case '.7z':
@@ -453,133 +1338,751 @@ def get_and_extract(url, location, overwrite, basefolder=os.getcwd()):
                     # archive.close()
                 case '.py':
                     if element.item_type == 'LOCAL_FILE':
-                        print(f"Executing local Python script: {element.url}")
-                        try:
-                            # Run the script as a subprocess with Popen for real-time output
-                            process = subprocess.Popen(
-                                [sys.executable, element.url],
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT,  # Combine stderr with stdout
-                                text=True,
-                                bufsize=1,
-                                universal_newlines=True
-                            )
-                            # Stream output in real-time
-                            while True:
-                                line = process.stdout.readline().strip()
-                                if not line and process.poll() is not None:
-                                    break
-                                if line:
-                                    print(line)  # Print output to console
-                            # Wait for the process to complete and get the return code
-                            return_code = process.wait()
-                            print(f"Script {element.url} exited with code {return_code}")
-                            if return_code != 0:
-                                print(f"Warning: Script {element.url} failed with exit code {return_code}")
-                            # Continue processing CSV regardless of exit code
-                        except subprocess.SubprocessError as e:
-                            print(f"Error executing {element.url}: {e}")
+                        if not run_python_script(element.url):
+                            result = False
                     else:
-                        stream_dl(url, location)
+                        digest = stream_dl(url, location, sha256=element.sha256, size=element.size)
 
                 # Not an archive
                 case _:
                     if element.item_type == 'LOCAL_FILE':
                         shutil.copyfile(element.url,element.location)
                     else:
-                        stream_dl(url,location)
+                        digest = cached_dl(url,location,element.sha256,element.size,lock_state)
 
+    if install_lock and result is not False and element.item_type != 'INVALID_URL':
+        entry = dict(lock_state, item_type=element.item_type, sha256=digest)
+        if element.item_type == 'GH_REPO':
+            entry['commit'] = Repo(element.location).head.commit.hexsha
+            entry['pin'] = element.options.get('pin')
+            entry['checked_at'] = time.time()
+        if os.path.isfile(element.location):
+            entry['size'] = os.path.getsize(element.location)
+        install_lock.record(url, location, entry)
+    return result
 
-#If the custom CSV file is a relative filepath, convert it to absolute.
-#This file pathpath must be set BEFORE changing the working directory.
-manifestFile = './install_files.csv'
-if not os.path.isabs(manifestFile):
-    manifestFile=os.path.abspath(manifestFile)
 
-#Change the working directory to the install folder directory
-installFolder = os.path.normpath(os.path.join(os.getcwd(),'ComfyUI_windows_portable'))
-print('Change the working folder to: '+installFolder)
-set_persistent_env_var('COMFYUI_BASE',installFolder)
-os.chdir(installFolder)
+def bundle_row(row, basefolder, writer, staging):
+    """
+    Fetch everything a manifest row installs and add it to the bundle.
+
+    Files are stored as they are downloaded, zip archives unextracted, HF
+    snapshots file by file, git repos as a git bundle of all refs and local
+    scripts together with the folder tree they live in (they use their sibling
+    files and folders). winget and ComfyUI-Manager installs need the network
+    and are recorded as unbundled.
+
+    Returns:
+        dict: The bundle index entry of the row.
+    """
+    element = ManifestItem(row["url"], row["location"], row["overwrite"], basefolder, row["options"])
+    file_extension = os.path.splitext(element.url)[1]
+    entry = {'item_type': element.item_type}
+    match element.item_type:
+        case 'HF_FILE':
+            f_name = element.url_parts.path.split('/blob/main/')[1]
+            with progress.task(f_name, repo=element.repo_id) as task:
+                path = hf_hub_download(repo_id=element.repo_id, filename=f_name, tqdm_class=progress.tqdm_class(task))
+            entry.update(kind='file', members=[writer.add_file(path)])
+
+        case 'HF_REPO':
+            include_list, exclude_list = hf_repo_patterns(element)
+            with progress.task(element.repo_id, repo=element.repo_id) as task:
+                snapshot = snapshot_download(repo_id=element.repo_id, allow_patterns=include_list, ignore_patterns=exclude_list,
+                                             tqdm_class=progress.tqdm_class(task))
+            members = []
+            for root, _, files in os.walk(snapshot):
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    members.append(writer.add_file(full, os.path.relpath(full, snapshot).replace(os.sep, '/')))
+            entry.update(kind='tree', members=members)
+
+        case 'GH_REPO':
+            clone = os.path.join(staging, element.repo_id)
+            repo = Repo.clone_from(element.url, clone)
+            if element.options.get('pin'):
+                checkout_pin(repo, element.options['pin'])
+            bundle_file = clone + '.bundle'
+            repo.git.bundle('create', bundle_file, 'HEAD', '--all')
+            entry.update(kind='git', commit=repo.head.commit.hexsha, pinned=bool(element.options.get('pin')), members=[writer.add_file(bundle_file)])
+            repo.close()
+            os.remove(bundle_file)
+            shutil.rmtree(clone, ignore_errors=True)
+
+        case 'GH_FILE' | 'UNDEFINED':
+            download = os.path.join(staging, os.path.basename(element.url_parts.path) or 'download')
+            cached_dl(element.url, download, element.sha256, element.size)
+            kind = 'zip' if file_extension == '.zip' and element.item_type == 'UNDEFINED' else 'file'
+            entry.update(kind=kind, members=[writer.add_file(download)])
+            os.remove(download)
+
+        case 'LOCAL_FILE':
+            if file_extension == '.py':
+                script = os.path.abspath(element.url)
+                relative = os.path.relpath(script, basefolder)
+                if relative.startswith('..') or os.sep not in relative:
+                    top = os.path.dirname(script)
+                    relative = os.path.basename(script)
+                else:
+                    top = os.path.join(basefolder, relative.split(os.sep)[0])
+                members = []
+                for root, dirs, files in os.walk(top):
+                    dirs[:] = [d for d in dirs if d != '__pycache__']
+                    for name in sorted(files):
+                        full = os.path.join(root, name)
+                        members.append(writer.add_file(full, os.path.relpath(full, os.path.dirname(top)).replace(os.sep, '/')))
+                entry.update(kind='script', entry=relative.replace(os.sep, '/'), members=members)
+            else:
+                entry.update(kind='zip' if file_extension == '.zip' else 'file', members=[writer.add_file(element.url)])
+
+        case 'WINGET_INSTALL' | 'CM_MANAGER_INSTALL':
+            entry.update(kind='unbundled')
+
+        case _:
+            raise ValueError(f"{row['url']} cannot be bundled ({element.item_type})")
+    return entry
+
+def export_bundle(rows, basefolder, bundle_path):
+    """
+    Resolve every manifest row and pack its artifacts into one bundle file for --from-bundle.
+
+    Returns:
+        bool: True if every row was bundled.
+    """
+    print(f"Exporting the manifest to the bundle {bundle_path}")
+    os.makedirs(os.path.dirname(bundle_path) or '.', exist_ok=True)
+    writer = BundleWriter(bundle_path)
+    staging = tempfile.mkdtemp(prefix='.installmill-bundle-', dir=os.path.dirname(bundle_path) or '.')
+    failed = []
+    try:
+        for row in rows:
+            print(f"Bundling {row['url']}")
+            try:
+                writer.add_row(row["url"], row["location"], bundle_row(row, basefolder, writer, staging))
+            except Exception as e:
+                print(f"Could not bundle {row['url']}: {e}")
+                failed.append(row["url"])
+        writer.close([{key: row[key] for key in ('url', 'location', 'overwrite', 'options')} for row in rows])
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    print(f"Bundle written: {bundle_path} ({os.path.getsize(bundle_path) / 1024**3:.2f} GiB, {len(rows) - len(failed)} of {len(rows)} rows)")
+    for url in failed:
+        print(f"\tNot bundled: {url}")
+    return not failed
+
+def _extract_if_changed(member, dest):
+    """Extract a bundle member unless dest already holds the same content."""
+    if os.path.isfile(dest) and os.path.getsize(dest) == member['size'] and _hash_file(dest).hexdigest() == member['sha256']:
+        return 0
+    return offline_bundle.extract(member, dest)
+
+def install_from_bundle(url, location, overwrite, basefolder, force=False):
+    """
+    Install a manifest row from the offline bundle without touching the network.
+
+    Follows the overwrite flag and the install lockfile like get_and_extract,
+    with the bundle's content digest standing in for the remote checks.
+    Scripts are extracted with their folder tree under basefolder and run.
+    """
+    entry = offline_bundle.row(url, location)
+    if entry is None:
+        print(f"{url} is not in the bundle {offline_bundle.path}")
+        return False
+    kind = entry['kind']
+    if kind == 'unbundled':
+        print(f"{url} ({entry['item_type']}) needs the network and is not in the bundle, skipping.")
+        return 'skipped'
+    if kind != 'script':
+        if os.path.exists(location) and overwrite.lower() != 'true':
+            print("Overwrite flag set to FALSE")
+            print("Existing file(s) will not be updated.")
+            return 'skipped'
+        if install_lock and not force and os.path.exists(location) and install_lock.get(url, location).get('bundle_digest') == entry['digest']:
+            print(f"Unchanged since the last install, skipping: {location}")
+            return 'unchanged'
+
+    result = None
+    members = entry.get('members', [])
+    match kind:
+        case 'file':
+            _extract_if_changed(members[0], location)
+        case 'tree':
+            for member in members:
+                _extract_if_changed(member, os.path.join(location, member['path']))
+        case 'zip':
+            print('Extracting to: ', location)
+            with zipfile.ZipFile(offline_bundle.open_member(members[0])) as z:
+                z.extractall(location)
+        case 'git':
+            tmp_dir = tempfile.mkdtemp(prefix='.installmill-')
+            try:
+                bundle_file = os.path.join(tmp_dir, 'repo.bundle')
+                offline_bundle.extract(members[0], bundle_file)
+                if os.path.exists(location):
+                    repo = Repo(location)
+                    repo.git.fetch(bundle_file, 'HEAD')
+                    if entry.get('pinned'):
+                        repo.git.checkout(entry['commit'])
+                    else:
+                        repo.git.merge('--ff-only', entry['commit'])
+                else:
+                    repo = Repo.clone_from(bundle_file, location)
+                    # Point origin back at the real remote for later online updates
+                    repo.remotes.origin.set_url(url)
+                repo.close()
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        case 'script':
+            for member in members:
+                _extract_if_changed(member, os.path.join(basefolder, member['path']))
+            if not run_python_script(os.path.join(basefolder, entry['entry'])):
+                result = False
+
+    if install_lock and result is not False and kind != 'script':
+        install_lock.record(url, location, {'item_type': entry['item_type'], 'bundle_digest': entry['digest'], 'commit': entry.get('commit')})
+    return result
+
+def read_manifest(manifest_file):
+    """
+    Read the install manifest into a list of rows.
+
+    Each CSV line is url, location, overwrite followed by optional key=value
+    option columns, e.g. after=./ComfyUI/custom_nodes/NIMnodes to order a row
+    after the row installing that location.
+
+    Returns:
+        list: One dict per row with index, url, location, overwrite and options.
+    """
+    rows = []
+    with open(manifest_file, mode='r') as file:
+        csvFile = csv.reader(file)
+        for lines in csvFile:
+            if len(lines) < 3:
+                continue
+            options = {}
+            for column in lines[3:]:
+                if '=' in column:
+                    key, value = column.split('=', 1)
+                    options[key.strip().lower()] = value.strip()
+            rows.append({"index": len(rows), "url": lines[0], "location": lines[1],
+                         "overwrite": lines[2], "options": options})
+    return rows
+
+def _row_key(value):
+    return os.path.normcase(os.path.normpath(value.strip()))
+
+def resolve_dependencies(rows):
+    """
+    Work out which rows each manifest row has to wait for.
+
+    Dependencies (row["deps"]) come from the 'after' option (';' separated
+    locations or URLs of other rows) and have to succeed. winget rows install
+    system prerequisites (build tools, runtimes, Blender) and may prompt on the
+    console, so they run first and one at a time: every winget row waits for
+    the winget row before it, and every other row for all winget rows
+    (row["prereqs"]). Prerequisites only have to finish, a failed winget
+    install does not block the rest, just like the serial installer.
+    """
+    by_key = {}
+    for row in rows:
+        by_key.setdefault(_row_key(row["location"]), row["index"])
+        by_key.setdefault(_row_key(row["url"]), row["index"])
+
+    winget_rows = [row["index"] for row in rows if row["location"].lower() == 'winget_install']
+    last_winget = None
+    for row in rows:
+        deps = set()
+        for ref in filter(None, row["options"].get("after", "").split(';')):
+            dep = by_key.get(_row_key(ref))
+            if dep is None or dep == row["index"]:
+                print(f"Warning: dependency '{ref}' for {row['location']} does not match another manifest row and will be ignored.")
+            else:
+                deps.add(dep)
+        if row["location"].lower() == 'winget_install':
+            prereqs = {last_winget} if last_winget is not None else set()
+            last_winget = row["index"]
+        else:
+            prereqs = set(winget_rows)
+        row["deps"] = deps
+        row["prereqs"] = prereqs - deps
+    return rows
+
+# Default priority per item type: scripts, installers and custom node repos are small and
+# unblock other rows, model weights are bulk. Rows override it with priority=<n>
+ROW_PRIORITIES = {
+    'LOCAL_FILE': bandwidth.PRIORITY_BLOCKING,
+    'GH_REPO': bandwidth.PRIORITY_BLOCKING,
+    'WINGET_INSTALL': bandwidth.PRIORITY_BLOCKING,
+    'CM_MANAGER_INSTALL': bandwidth.PRIORITY_BLOCKING,
+    'HF_FILE': bandwidth.PRIORITY_BULK,
+    'HF_REPO': bandwidth.PRIORITY_BULK,
+}
+
+def row_priority(row, basefolder):
+    """Priority of a manifest row for scheduling and bandwidth, lower goes first."""
+    value = row["options"].get('priority', '')
+    if value.lstrip('-').isdigit():
+        return int(value)
+    with contextlib.redirect_stdout(io.StringIO()):
+        element = ManifestItem(row["url"], row["location"], row["overwrite"], basefolder, row["options"])
+    return ROW_PRIORITIES.get(element.item_type, bandwidth.PRIORITY_NORMAL)
+
+def _run_row(row, basefolder, force=False):
+    start = time.perf_counter()
+    progress.set_row(row["index"])
+    bandwidth.set_priority(row.get("priority", bandwidth.PRIORITY_NORMAL))
+    progress.emit('row_start', url=row["url"], location=row["location"])
+    error = None
+    try:
+        result = get_and_extract(row["url"], row["location"], row["overwrite"], basefolder, row["options"], force)
+        if result is False:
+            outcome = 'failed'
+        elif result in ('skipped', 'unchanged'):
+            outcome = result
+        else:
+            outcome = 'ok'
+    except Exception as e:
+        print(f"Error installing {row['url']}: {e}")
+        traceback.print_exc()
+        outcome = 'failed'
+        error = str(e)
+    row["seconds"] = time.perf_counter() - start
+    row["outcome"] = outcome
+    row["bytes"] = progress.row_bytes(row["index"])
+    progress.emit('row_end', outcome=outcome, seconds=round(row["seconds"], 3), bytes=row["bytes"], error=error)
+    progress.set_row(None)
+    return row
+
+def run_manifest(rows, basefolder, workers=4, force=False):
+    """
+    Install the manifest rows on a bounded worker pool.
+
+    A row is ready once every row it depends on has finished successfully and
+    every prerequisite row has finished (see resolve_dependencies), and ready
+    rows are started in priority order (see row_priority) as workers free up.
+    winget rows therefore run alone before anything else, with the console to
+    themselves for their license prompts. Rows whose dependencies failed, or
+    that sit in a dependency cycle, are reported as blocked and not run. A
+    row whose dependency was (re)installed during this run, or every row with
+    force, is redone even if the install lock says it is unchanged.
+    """
+    resolve_dependencies(rows)
+    for row in rows:
+        row["priority"] = row_priority(row, basefolder)
+    by_index = {row["index"]: row for row in rows}
+    pending = dict(by_index)
+    ready = []
+    done = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or ready or running:
+            blocked = False
+            for index, row in list(pending.items()):
+                if any(done.get(dep) in ('failed', 'blocked') for dep in row["deps"]):
+                    row["outcome"], row["seconds"] = 'blocked', 0.0
+                    done[index] = 'blocked'
+                    del pending[index]
+                    blocked = True
+                elif all(dep in done for dep in row["deps"] | row["prereqs"]):
+                    heapq.heappush(ready, (row["priority"], index))
+                    del pending[index]
+
+            while ready and len(running) < max(1, workers):
+                _, index = heapq.heappop(ready)
+                row = by_index[index]
+                redo = force or any(done[dep] == 'ok' for dep in row["deps"])
+                running[pool.submit(_run_row, row, basefolder, redo)] = index
+
+            if blocked and not running:
+                continue
+            if not running:
+                # Nothing can make progress, the remaining rows form a cycle
+                for index, row in pending.items():
+                    print(f"Error: circular dependency for {row['location']}")
+                    row["outcome"], row["seconds"] = 'blocked', 0.0
+                    done[index] = 'blocked'
+                pending.clear()
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                row = future.result()
+                done[running.pop(future)] = row["outcome"]
+
+    return rows
+
+# Bandwidth assumed for time estimates when it cannot be measured (bytes/s)
+PLAN_FALLBACK_BANDWIDTH = 10 * 1024**2
+# Bytes downloaded from the largest planned artifact to measure bandwidth
+PLAN_PROBE_BYTES = 8 * 1024**2
+
+def remote_size(url):
+    """Content-Length of url from a HEAD request, or None if the server does not say."""
+    try:
+        response = transport.head(url, allow_redirects=True)
+        if response.ok and response.headers.get('Content-Length'):
+            return int(response.headers['Content-Length'])
+    except requests.RequestException as e:
+        print(f"Could not get the size of {url}: {e}")
+    return None
+
+def github_repo_size(url):
+    """Approximate size in bytes of a GitHub repo as reported by the GitHub API, or None."""
+    owner, name = urllib.parse.urlsplit(url).path.strip('/').removesuffix('.git').split('/')[:2]
+    try:
+        response = transport.get(f'https://api.github.com/repos/{owner}/{name}')
+        if response.ok:
+            return response.json().get('size', 0) * 1024
+    except (requests.RequestException, ValueError) as e:
+        print(f"Could not get the size of {url}: {e}")
+    return None
+
+def measure_bandwidth(url, sample_bytes=PLAN_PROBE_BYTES):
+    """
+    Measure download bandwidth by reading the first sample_bytes of url.
+
+    Returns:
+        float: Bytes per second, or None if the sample could not be downloaded.
+    """
+    try:
+        start = time.perf_counter()
+        with transport.get(url, headers={'Range': f'bytes=0-{sample_bytes - 1}', 'Accept-Encoding': 'identity'}, stream=True) as response:
+            response.raise_for_status()
+            received = 0
+            for chunk in response.iter_content(chunk_size=1024*1024):
+                received += len(chunk)
+                if received >= sample_bytes:
+                    break
+        elapsed = time.perf_counter() - start
+        return received / elapsed if received and elapsed > 0 else None
+    except requests.RequestException as e:
+        print(f"Could not measure bandwidth with {url}: {e}")
+        return None
+
+def plan_row(row, basefolder):
+    """
+    Work out what get_and_extract would do for a manifest row without changing anything.
+
+    Returns:
+        dict: item_type, action (skip, download, extract, clone, update, copy,
+        execute or invalid), download and disk in bytes (None when unknown),
+        probe_url usable for measuring bandwidth and a short note.
+    """
+    url, location = row['url'], row['location']
+    with contextlib.redirect_stdout(io.StringIO()):
+        element = ManifestItem(url, location, row['overwrite'], basefolder, row['options'])
+        outcome, lock_state = precheck(url, element)
+    plan = {'item_type': element.item_type, 'action': 'skip', 'download': 0, 'disk': 0, 'probe_url': None, 'note': outcome or ''}
+    if outcome:
+        return plan
+
+    file_extension = os.path.splitext(element.url)[1]
+    match element.item_type:
+        case 'INVALID_URL':
+            plan.update(action='invalid', note='source not found')
+
+        case 'WINGET_INSTALL' | 'CM_MANAGER_INSTALL':
+            plan.update(action='execute', download=None, disk=None)
+
+        case 'HF_FILE':
+            f_name = element.url_parts.path.split('/blob/main/')[1]
+            metadata = get_hf_file_metadata(hf_hub_url(element.repo_id, f_name))
+            in_hub_cache = isinstance(try_to_load_from_cache(element.repo_id, f_name), str)
+            plan.update(action='download', download=0 if in_hub_cache else metadata.size, disk=metadata.size,
+                        probe_url=metadata.location, note='in HF cache' if in_hub_cache else '')
+
+        case 'HF_REPO':
+            include_list, exclude_list = hf_repo_patterns(element)
+            info = HfApi().model_info(element.repo_id, files_metadata=True)
+            files = list(filter_repo_objects(info.siblings, allow_patterns=include_list, ignore_patterns=exclude_list, key=lambda f: f.rfilename))
+            total = sum(f.size or 0 for f in files)
+            plan.update(action='download', download=total, disk=total, note=f'{len(files)} files')
+
+        case 'GH_REPO':
+            if os.path.exists(location):
+                repo = Repo(location)
+                pin = element.options.get('pin')
+                if pin:
+                    at_pin = resolve_local_ref(repo, pin) == repo.head.commit.hexsha
+                    plan.update(action='skip' if at_pin else 'update', download=0 if at_pin else None, note=f'pin {pin}')
+                elif remote_head_unchanged(repo):
+                    plan.update(note='up to date with remote')
+                else:
+                    plan.update(action='update', download=None, disk=None)
+            else:
+                size = github_repo_size(element.url)
+                plan.update(action='clone', download=size, disk=size, note=f'{element.options.get("clone", default_clone_mode)} clone, repo size')
+
+        case 'GH_FILE' | 'UNDEFINED':
+            size = element.size or remote_size(element.url)
+            cached = False
+            if file_extension != '.py' and artifact_cache is not None:
+                validators = None if element.sha256 else current_validators(element.url, lock_state)
+                cached = artifact_cache.contains(element.url, element.sha256, validators)
+            plan.update(action='extract' if file_extension == '.zip' and element.item_type == 'UNDEFINED' else 'download',
+                        download=0 if cached else size, disk=size, probe_url=element.url)
+            if cached:
+                plan['note'] = 'in artifact cache'
+            elif plan['action'] == 'extract':
+                plan['note'] = 'disk counts the archive'
+
+        case 'LOCAL_FILE':
+            match file_extension:
+                case '.py':
+                    plan.update(action='execute', disk=None)
+                case '.zip':
+                    with zipfile.ZipFile(element.url) as z:
+                        plan.update(action='extract', disk=sum(info.file_size for info in z.infolist()))
+                case _:
+                    plan.update(action='copy', disk=os.path.getsize(element.url))
+    return plan
+
+def plan_manifest(rows, basefolder):
+    """Attach a plan to every manifest row, then measure bandwidth on the largest planned download."""
+    for row in rows:
+        try:
+            row['plan'] = plan_row(row, basefolder)
+        except Exception as e:
+            row['plan'] = {'item_type': '?', 'action': 'unknown', 'download': None, 'disk': None, 'probe_url': None, 'note': str(e).splitlines()[0][:60]}
+    probes = [row['plan'] for row in rows if row['plan']['probe_url'] and row['plan']['download']]
+    bandwidth_estimate = None
+    if probes:
+        bandwidth_estimate = measure_bandwidth(max(probes, key=lambda plan: plan['download'])['probe_url'])
+    return rows, bandwidth_estimate
+
+def print_plan(rows, bandwidth_estimate):
+    """Print the plan table with download, disk and time estimates."""
+    measured = bandwidth_estimate is not None
+    bandwidth_estimate = bandwidth_estimate or PLAN_FALLBACK_BANDWIDTH
+    fmt = lambda value: '?' if value is None else f'{value / 1024**2:.1f}'
+    print('')
+    print('***********************************************************************')
+    print('Install plan (nothing was changed)')
+    print(f'{"#":>3}  {"Type":<18} {"Action":<8} {"Download MiB":>12} {"Disk MiB":>9} {"Est. s":>7}  Location')
+    download_total = disk_total = 0
+    unknown = 0
+    for row in rows:
+        plan = row['plan']
+        seconds = None if plan['download'] is None else plan['download'] / bandwidth_estimate
+        if plan['action'] != 'skip' and (plan['download'] is None or plan['disk'] is None):
+            unknown += 1
+        download_total += plan['download'] or 0
+        disk_total += plan['disk'] or 0
+        est = '?' if seconds is None else f'{seconds:.0f}'
+        note = f'  ({plan["note"]})' if plan['note'] else ''
+        print(f'{row["index"]:>3}  {plan["item_type"]:<18} {plan["action"]:<8} {fmt(plan["download"]):>12} {fmt(plan["disk"]):>9} {est:>7}  {row["location"]}{note}')
+    print('')
+    print(f'Bandwidth: {bandwidth_estimate / 1024**2:.1f} MiB/s ({"measured" if measured else "assumed, could not be measured"})')
+    print(f'Download: {download_total / 1024**3:.2f} GiB, estimated {download_total / bandwidth_estimate / 60:.1f} min')
+    print(f'Disk: {disk_total / 1024**3:.2f} GiB, {shutil.disk_usage(os.getcwd()).free / 1024**3:.1f} GiB free')
+    if unknown:
+        print(f'{unknown} row(s) run programs or updates whose size and time are not known in advance.')
+    print('***********************************************************************')
+
+def print_manifest_summary(rows):
+    print('')
+    print('***********************************************************************')
+    print('Manifest summary')
+    print(f'{"#":>3}  {"Outcome":<8} {"Time (s)":>9} {"MiB":>9} {"MiB/s":>7}  Location')
+    for row in rows:
+        seconds, mib = row.get("seconds", 0.0), row.get("bytes", 0) / 1024**2
+        rate = f'{mib / seconds:.1f}' if mib and seconds else ''
+        print(f'{row["index"]:>3}  {row.get("outcome", "n/a"):<8} {seconds:>9.1f} {mib:>9.1f} {rate:>7}  {row["location"]}')
+    print('***********************************************************************')
+
+
+def check_hf_access(access_cache_file, access_ttl):
+    """
+    Exit setup unless HF_TOKEN is valid and has access to the gated FLUX models.
+
+    Args:
+        access_cache_file (str): Where granted access is remembered per token, None to check every model.
+        access_ttl (float): Seconds granted access is remembered.
+    """
+    # Retrieve the token from the HF_TOKEN environment variable
+    token = os.environ.get('HF_TOKEN')
+    if not token:
+        print("HF_TOKEN is not set...set the HF_TOKEN environment variable with a valid token and restart Setup")
+        sys.exit("!!! SETUP FAILED:  Please set the HF_TOKEN environment variable and restart Setup")
 
-    
-baseFolder = os.path.normpath(os.path.dirname(os.path.abspath(__file__)))
-
-# Now get the ComfyManager from it's git repo
-# repository_url = "https://github.com/ltdrdata/ComfyUI-Manager.git"
-# Where ComfyManager will go
-# destination_folder = "./ComfyUI/custom_nodes/ComfyUI-Manager"
-# Create the target directory
-# os.makedirs(os.path.dirname(destination_folder), exist_ok=True)
-# Cloning the repository
-# manage_package('ComfyUI-Manager',repository_url, destination_folder)
-# subprocess.call([sys.executable, '-m', 'pip', 'install','-r','./ComfyUI/custom_nodes/ComfyUI-Manager/requirements.txt'])
-
-# Load the CSV file and iterate over each line
-print(manifestFile)
-
-user_profile = os.environ.get('USERPROFILE')
-
-# Retrieve the token from the HF_TOKEN environment variable
-token = os.environ.get('HF_TOKEN')
-if not token:
-    print("HF_TOKEN is not set...set the HF_TOKEN environment variable with a valid token and restart Setup")
-    sys.exit("!!! SETUP FAILED:  Please set the HF_TOKEN environment variable and restart Setup")
-
-else:
-    is_valid, result = check_hf_token_validity(token)
-    if is_valid:
-        print(f"Token is valid! User info: {result}")
     else:
-        print(f"Token is invalid or an error occurred: {result}")
-        print("HF_TOKEN value is not valid, please check the HF_TOKEN environment variable is a valid huggingface token and restart Setup")
-        sys.exit("!!! SETUP FAILED:  Please verify the HF_TOKEN environment variable is valid and restart Setup")
-
-#List of potentially gated models to verify if the user currently has access
-model_list = [{"model_name":"black-forest-labs/FLUX.1-dev","filename":".gitattributes","token":token},
-              {"model_name":"black-forest-labs/FLUX.1-Canny-dev","filename":".gitattributes","token":token},
-              {"model_name":"black-forest-labs/FLUX.1-Depth-dev","filename":".gitattributes","token":token},
-              {"model_name":"black-forest-labs/FLUX.1-dev-onnx","filename":".gitattributes","token":token},
-              {"model_name":"black-forest-labs/FLUX.1-Canny-dev-onnx","filename":".gitattributes","token":token},
-              {"model_name":"black-forest-labs/FLUX.1-Depth-dev-onnx","filename":".gitattributes","token":token},
-              ]
-non_accessible_models = []
-
-for model in model_list:
-    print(f"Checking model: {model['model_name']}")
-    result = check_model_access(model)
-    if result[0]:
-        print(f"Model access: {model['model_name']} is accessible")
+        is_valid, result = check_hf_token_validity(token)
+        if is_valid:
+            print(f"Token is valid! User info: {result}")
+        else:
+            print(f"Token is invalid or an error occurred: {result}")
+            print("HF_TOKEN value is not valid, please check the HF_TOKEN environment variable is a valid huggingface token and restart Setup")
+            sys.exit("!!! SETUP FAILED:  Please verify the HF_TOKEN environment variable is valid and restart Setup")
+
+    #List of potentially gated models to verify if the user currently has access
+    model_list = [{"model_name":"black-forest-labs/FLUX.1-dev","filename":".gitattributes","token":token},
+                  {"model_name":"black-forest-labs/FLUX.1-Canny-dev","filename":".gitattributes","token":token},
+                  {"model_name":"black-forest-labs/FLUX.1-Depth-dev","filename":".gitattributes","token":token},
+                  {"model_name":"black-forest-labs/FLUX.1-dev-onnx","filename":".gitattributes","token":token},
+                  {"model_name":"black-forest-labs/FLUX.1-Canny-dev-onnx","filename":".gitattributes","token":token},
+                  {"model_name":"black-forest-labs/FLUX.1-Depth-dev-onnx","filename":".gitattributes","token":token},
+                  ]
+    non_accessible_models = []
+
+    for model, accessible, message in check_models_access(model_list, access_cache_file, access_ttl):
+        print(f"Checking model: {model['model_name']}")
+        if accessible:
+            print(f"Model access: {model['model_name']} is accessible")
+        else:
+            print(f"Model access: {model['model_name']} is not accessible")
+            print(message)
+            non_accessible_models.append(model["model_name"])
+
+    if len(non_accessible_models) > 0:
+        print("The following models are not accessible:")
+        for model in non_accessible_models:
+            print(f"\t{model}: https://huggingface.co/{model}")
+        print("Please accept the use license for the listed models and restart Setup")
+        sys.exit("!!! SETUP FAILED:  Please accept the use license for ALL listed models and restart Setup")
+
+
+def main():
+    global artifact_cache, install_lock, default_clone_mode, git_check_interval, offline_bundle
+
+    parser = argparse.ArgumentParser(description='Install the blueprint components listed in the manifest.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of manifest rows to install concurrently (1 installs the rows one at a time).')
+    parser.add_argument('--cache-dir', default=None, help='Location of the shared artifact cache (default: %%LOCALAPPDATA%%\\3d-guided-genai-rtx\\cache).')
+    parser.add_argument('--cache-hardlinks', action='store_true', help='Hardlink cached artifacts into place instead of copying them (cached files are then hashed again before every use).')
+    parser.add_argument('--cache-size-gb', type=float, default=float(os.environ.get('INSTALLMILL_CACHE_MAX_GB', DEFAULT_MAX_GB)), help='Size cap of the artifact cache, least recently used artifacts are evicted beyond it.')
+    parser.add_argument('--no-cache', action='store_true', help='Always download artifacts instead of using the shared cache.')
+    parser.add_argument('--access-ttl-hours', type=float, default=24, help='How long granted access to the gated FLUX models is remembered per token (0 checks on every run).')
+    parser.add_argument('--connect-timeout', type=float, default=transport.CONNECT_TIMEOUT, help='Seconds to wait for an HTTP connection.')
+    parser.add_argument('--read-timeout', type=float, default=transport.READ_TIMEOUT, help='Seconds to wait for data on an open HTTP connection.')
+    parser.add_argument('--http-retries', type=int, default=transport.RETRIES, help='Retries for failed HTTP connections and 429/5xx responses.')
+    parser.add_argument('--clone-mode', choices=sorted(CLONE_MODES), default=default_clone_mode, help='How GH_REPO rows without a clone= option are cloned.')
+    parser.add_argument('--git-check-interval', type=float, default=0, help='Minutes during which an unchanged custom node repo is not checked against its remote again.')
+    parser.add_argument('--plan', action='store_true', help='Only report what each manifest row would do, with download size, disk use and time estimates, without changing anything.')
+    parser.add_argument('--events', default=None, help='Write progress events as JSON lines to this file or to a tcp://host:port socket.')
+    parser.add_argument('--no-live', action='store_true', help='Do not draw the live download display.')
+    parser.add_argument('--bandwidth-limit', type=float, default=None, help='Cap all downloads at this many MiB/s (default: no cap, or the value in the bandwidth file).')
+    parser.add_argument('--bandwidth-file', default=None, help=f'File holding the cap in MiB/s, re-read while the install runs (default: {LIMIT_FILE_NAME} in the install folder).')
+    parser.add_argument('--force', action='store_true', help='Redo every row with overwrite=TRUE even if the install lockfile shows it is unchanged.')
+    parser.add_argument('--export-bundle', default=None, metavar='PATH', help='Download everything the manifest installs into one bundle file for an offline install, then exit.')
+    parser.add_argument('--from-bundle', default=None, metavar='PATH', help='Install from a bundle made with --export-bundle, without network access.')
+    args, _unknown_args = parser.parse_known_args()
+    # Bundle paths are relative to where setup was started, not the install folder
+    for name in ('export_bundle', 'from_bundle'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    if args.export_bundle and args.from_bundle:
+        parser.error('--export-bundle and --from-bundle cannot be used together')
+    transport.configure(args.connect_timeout, args.read_timeout, args.http_retries)
+    default_clone_mode = args.clone_mode
+    git_check_interval = args.git_check_interval * 60
+
+    # Planning reads an existing cache but never creates one
+    if not args.no_cache and not (args.plan and not Path(args.cache_dir or default_cache_dir()).is_dir()):
+        try:
+            artifact_cache = ArtifactCache(args.cache_dir, int(args.cache_size_gb * 1024**3), args.cache_hardlinks)
+            print(f'Using artifact cache: {artifact_cache.root}')
+        except OSError as e:
+            print(f'Artifact cache is not available ({e}), artifacts will be downloaded.')
+
+    #If the custom CSV file is a relative filepath, convert it to absolute.
+    #This file pathpath must be set BEFORE changing the working directory.
+    manifestFile = './install_files.csv'
+    if not os.path.isabs(manifestFile):
+        manifestFile=os.path.abspath(manifestFile)
+
+    #Change the working directory to the install folder directory
+    installFolder = os.path.normpath(os.path.join(os.getcwd(),'ComfyUI_windows_portable'))
+    print('Change the working folder to: '+installFolder)
+    if not args.plan:
+        set_persistent_env_var('COMFYUI_BASE',installFolder)
+    os.chdir(installFolder)
+
+    # The lockfile records what this install folder got, so a re-run only redoes changed rows
+    install_lock = InstallLock(os.path.join(installFolder, LOCKFILE_NAME))
+    print(f'Using install lockfile: {install_lock.path}')
+
+
+    baseFolder = os.path.normpath(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.from_bundle:
+        offline_bundle = Bundle(args.from_bundle)
+
+    if args.plan:
+        print_plan(*plan_manifest(read_manifest(manifestFile), baseFolder))
+        return
+
+    # Now get the ComfyManager from it's git repo
+    # repository_url = "https://github.com/ltdrdata/ComfyUI-Manager.git"
+    # Where ComfyManager will go
+    # destination_folder = "./ComfyUI/custom_nodes/ComfyUI-Manager"
+    # Create the target directory
+    # os.makedirs(os.path.dirname(destination_folder), exist_ok=True)
+    # Cloning the repository
+    # manage_package('ComfyUI-Manager',repository_url, destination_folder)
+    # subprocess.call([sys.executable, '-m', 'pip', 'install','-r','./ComfyUI/custom_nodes/ComfyUI-Manager/requirements.txt'])
+
+    # Load the CSV file and iterate over each line
+    print(manifestFile)
+
+    if offline_bundle is not None:
+        # Everything the rows need is in the bundle, the token and model access were checked when it was exported
+        print(f"Installing from the bundle {offline_bundle.path}, Hugging Face access is not checked.")
     else:
-        print(f"Model access: {model['model_name']} is not accessible")
-        print(result[1])
-        non_accessible_models.append(model["model_name"])
-
-if len(non_accessible_models) > 0:
-    print("The following models are not accessible:")
-    for model in non_accessible_models:
-        print(f"\t{model}: https://huggingface.co/{model}")
-    print("Please accept the use license for the listed models and restart Setup")
-    sys.exit("!!! SETUP FAILED:  Please accept the use license for ALL listed models and restart Setup")
-
-
-with open(manifestFile, mode ='r')as file:
-    csvFile = csv.reader(file)
-    for lines in csvFile:
-        get_and_extract(lines[0], lines[1], lines[2], baseFolder)
-
-
-#Install Complete
-comfyui_path = Path('./ComfyUI')
-#print(f'ComfyUI_PATH = {comfyui_path}')
-comfyui_python_path = Path('./python_embeded')
-#print(f'ComfyUI_PYTHON = {comfyui_python_path}')
-print('Installation is complete....')
-print('***********************************************************************')
-print('The path information below can be used to setup the ComfyUI BlenderAI node Addon in Blender 3D')
-print('')
-print(f'ComfyUI Path =  {comfyui_path.resolve()}\\')
-print(f'Python Path =  {comfyui_python_path.resolve()}\\')
-print('***********************************************************************')
-print('Press any key to finish...')
-msvcrt.getch() # wait for a key press
\ No newline at end of file
+        # --no-cache leaves the shared cache folder alone, access is then checked on every run
+        access_cache_file = None if args.no_cache else os.path.join(args.cache_dir or default_cache_dir(), 'hf_access.json')
+        check_hf_access(access_cache_file, args.access_ttl_hours * 3600)
+
+    if args.export_bundle:
+        if not export_bundle(read_manifest(manifestFile), baseFolder, args.export_bundle):
+            sys.exit("!!! EXPORT FAILED:  Some rows could not be bundled, see the messages above")
+        return
+
+    # Cap the bandwidth, changes to the bandwidth file apply while rows are running
+    limit_file = args.bandwidth_file or os.path.join(installFolder, LIMIT_FILE_NAME)
+    bandwidth.set_limit(args.bandwidth_limit if args.bandwidth_limit is not None else bandwidth.read_limit_file(limit_file))
+    if args.bandwidth_limit is not None or os.path.exists(limit_file):
+        # Hooking huggingface_hub turns off Xet transfers, so it is only done when a cap is wanted
+        if not bandwidth.throttle_hf_hub():
+            print('This huggingface_hub version cannot be throttled, Hugging Face downloads are not capped.')
+    print(f'Bandwidth limit: {f"{bandwidth.limit():g} MiB/s" if bandwidth.limit() else "unlimited"} (change it in {limit_file})')
+    stop_watching = bandwidth.watch_limit_file(limit_file)
+
+    progress.configure(args.events, False if args.no_live else None)
+    try:
+        if offline_bundle is not None:
+            # The bundle carries the manifest it was exported from
+            rows = [{"index": i, **row} for i, row in enumerate(offline_bundle.manifest())]
+        else:
+            rows = read_manifest(manifestFile)
+        manifest_rows = run_manifest(rows, baseFolder, args.workers, args.force)
+    finally:
+        progress.close()
+        stop_watching.set()
+        if offline_bundle is not None:
+            offline_bundle.close()
+    print_manifest_summary(manifest_rows)
+    transport.print_stats()
+
+
+    #Install Complete
+    comfyui_path = Path('./ComfyUI')
+    #print(f'ComfyUI_PATH = {comfyui_path}')
+    comfyui_python_path = Path('./python_embeded')
+    #print(f'ComfyUI_PYTHON = {comfyui_python_path}')
+    print('Installation is complete....')
+    print('***********************************************************************')
+    print('The path information below can be used to setup the ComfyUI BlenderAI node Addon in Blender 3D')
+    print('')
+    print(f'ComfyUI Path =  {comfyui_path.resolve()}\\')
+    print(f'Python Path =  {comfyui_python_path.resolve()}\\')
+    print('***********************************************************************')
+    print('Press any key to finish...')
+    if platform.system() == "Windows":
+        msvcrt.getch() # wait for a key press
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os, re, sys, shutil, platform, threading, functools, subprocess, http.server
+
+# Repo root, so the benchmarks can import InstallMill and the helper modules it uses
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+
+def peak_rss():
+    """Peak resident set size of the current process in bytes."""
+    if platform.system() == "Windows":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def serve_directory(directory, ranges=False):
+    """
+    Serve directory over HTTP on a free localhost port from a background thread.
+
+    With ranges=True, Range requests are answered with 206 like a CDN would,
+    so resumed and segmented downloads take their real code path.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() when done.
+    """
+    handler = functools.partial(RangeHandler if ranges else QuietHandler, directory=directory)
+    server = QuietServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class RangeHandler(QuietHandler):
+    def send_head(self):
+        self.range_remaining = None
+        m = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        path = self.translate_path(self.path)
+        if not m or not os.path.isfile(path):
+            return super().send_head()
+        f = open(path, 'rb')
+        size = os.fstat(f.fileno()).st_size
+        start = int(m.group(1))
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+        if start >= size:
+            f.close()
+            self.send_error(416)
+            return None
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Last-Modified', self.date_time_string(int(os.fstat(f.fileno()).st_mtime)))
+        self.end_headers()
+        f.seek(start)
+        self.range_remaining = end - start + 1
+        return f
+
+    def end_headers(self):
+        self.send_header('Accept-Ranges', 'bytes')
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        if self.range_remaining is None:
+            return super().copyfile(source, outputfile)
+        while self.range_remaining > 0:
+            chunk = source.read(min(1024*1024, self.range_remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            self.range_remaining -= len(chunk)
+
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing a stream early (e.g. after a range probe) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def mib(n):
+    return f'{n / 1024**2:,.1f} MiB'
+
+
+def write_random(path, size_bytes, block=16*1024*1024):
+    """Write size_bytes of incompressible data to path without holding it in memory."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        left = size_bytes
+        while left:
+            n = min(block, left)
+            f.write(os.urandom(n))
+            left -= n
+
+
+def git(*args, cwd=None):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+
+def make_bare_repo(path, commits, blob_bytes):
+    """Create a bare repo whose commits each rewrite a blob_bytes binary file, with partial clone allowed."""
+    work = path + '.work'
+    git('init', '--bare', '--initial-branch=main', path)
+    git('config', 'uploadpack.allowFilter', 'true', cwd=path)
+    git('init', '--initial-branch=main', work)
+    for i in range(commits):
+        with open(os.path.join(work, 'weights.bin'), 'wb') as f:
+            f.write(os.urandom(blob_bytes))
+        with open(os.path.join(work, '__init__.py'), 'w') as f:
+            f.write(f'VERSION = {i}\n')
+        git('add', '-A', cwd=work)
+        git('-c', 'user.name=bench', '-c', 'user.email=bench@localhost', 'commit', '-q', '-m', f'commit {i}', cwd=work)
+    git('push', '-q', path, 'main', cwd=work)
+    shutil.rmtree(work)
+
+
+def tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
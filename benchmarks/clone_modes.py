@@ -0,0 +1,55 @@
+"""
+Wall time and size of GH_REPO clones per clone mode, serial vs. parallel.
+
+Creates --repos local bare repositories (git init --bare) with --commits commits
+that each rewrite a --blob-mb binary file, then clones all of them through
+InstallMill.clone_or_update_repo once per clone mode, one after another and on
+a thread pool. Repositories are cloned over file:// so git applies --depth and
+--filter the same way it does for a remote.
+
+Usage:
+    python benchmarks/clone_modes.py --repos 6 --commits 20 --blob-mb 4
+"""
+import os, time, shutil, argparse, tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_utils import mib, make_bare_repo, tree_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repos', type=int, default=6)
+    parser.add_argument('--commits', type=int, default=20)
+    parser.add_argument('--blob-mb', type=float, default=4)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    import InstallMill
+
+    workdir = tempfile.mkdtemp(prefix='clone-bench-')
+    try:
+        urls = []
+        for i in range(args.repos):
+            bare = os.path.join(workdir, 'remotes', f'node_{i}.git')
+            make_bare_repo(bare, args.commits, int(args.blob_mb * 1024**2))
+            urls.append('file:///' + bare.replace('\\', '/').lstrip('/'))
+
+        print(f'{"Mode":<8} {"Serial (s)":>11} {"Parallel (s)":>13} {"On disk":>12}')
+        for mode in InstallMill.CLONE_MODES:
+            kwargs = InstallMill.clone_options({'clone': mode})
+            timings = []
+            for workers in (1, args.workers):
+                dest = os.path.join(workdir, f'{mode}-{workers}')
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(lambda i: InstallMill.clone_or_update_repo(urls[i], os.path.join(dest, f'node_{i}'), kwargs),
+                                  range(len(urls))))
+                timings.append(time.perf_counter() - start)
+            size = tree_size(os.path.join(workdir, f'{mode}-1'))
+            print(f'{mode:<8} {timings[0]:>11.2f} {timings[1]:>13.2f} {mib(size):>12}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local stand-in for the parts of the Hugging Face Hub the installer talks to.
+
+Serves /api/whoami-v2, model info and tree listings under /api/models and file
+downloads under /<repo_id>/resolve/<revision>/<path> (HEAD and ranged GET) from
+repositories laid out on disk as <root>/<owner>/<name>/<files>. Point
+huggingface_hub at it with HF_ENDPOINT before huggingface_hub is imported.
+"""
+import os, re, json, hashlib, threading, http.server, urllib.parse
+
+from bench_utils import QuietServer
+
+CHUNK = 1024 * 1024
+
+
+def repo_commit(repo_id):
+    return hashlib.sha1(repo_id.encode()).hexdigest()
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FakeHub:
+    def __init__(self, root, token='hf_bench', gated=()):
+        self.root = root
+        self.token = token
+        self.gated = set(gated)
+        self._sha256 = {}
+        self.server = None
+        self.base_url = None
+
+    def add_repo(self, repo_id, files):
+        """Create a repo with files given as {path: size in bytes} filled with random data."""
+        for path, size in files.items():
+            full = os.path.join(self.root, repo_id, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, 'wb') as f:
+                remaining = size
+                while remaining > 0:
+                    f.write(os.urandom(min(CHUNK, remaining)))
+                    remaining -= CHUNK
+
+    def files(self, repo_id):
+        base = os.path.join(self.root, repo_id)
+        for dirpath, _, names in os.walk(base):
+            for name in sorted(names):
+                full = os.path.join(dirpath, name)
+                yield os.path.relpath(full, base).replace(os.sep, '/'), full
+
+    def sha256(self, full):
+        if full not in self._sha256:
+            self._sha256[full] = file_sha256(full)
+        return self._sha256[full]
+
+    def start(self):
+        hub = self
+
+        class Handler(HubHandler):
+            pass
+        Handler.hub = hub
+        self.server = QuietServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        return self.base_url
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+
+
+class HubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.route(head=False)
+
+    def do_HEAD(self):
+        self.route(head=True)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def route(self, head):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if path == '/api/whoami-v2':
+            if self.headers.get('Authorization') != f'Bearer {self.hub.token}':
+                return self.send_json(401, {'error': 'Invalid credentials in Authorization header'})
+            return self.send_json(200, {'type': 'user', 'name': 'bench', 'auth': {'accessToken': {'role': 'read'}}})
+
+        m = re.match(r'^/api/models/([^/]+/[^/]+)(?:/revision/[^/]+)?/?$', path)
+        if m:
+            return self.model_info(m.group(1))
+        m = re.match(r'^/api/models/([^/]+/[^/]+)/tree/[^/]+(?:/(.*))?$', path)
+        if m:
+            return self.tree(m.group(1), m.group(2) or '')
+        m = re.match(r'^/([^/]+/[^/]+)/resolve/[^/]+/(.+)$', path)
+        if m:
+            return self.resolve(m.group(1), m.group(2), head)
+        self.send_json(404, {'error': 'Not found'}, {'X-Error-Code': 'EntryNotFound'})
+
+    def check_repo(self, repo_id):
+        if not os.path.isdir(os.path.join(self.hub.root, repo_id)):
+            self.send_json(404, {'error': 'Repository not found'}, {'X-Error-Code': 'RepoNotFound'})
+            return False
+        if repo_id in self.hub.gated:
+            self.send_json(403, {'error': 'Access to this model is restricted'}, {'X-Error-Code': 'GatedRepo', 'X-Error-Message': 'gated'})
+            return False
+        return True
+
+    def model_info(self, repo_id):
+        if not self.check_repo(repo_id):
+            return
+        siblings = []
+        for rel, full in self.hub.files(repo_id):
+            size = os.path.getsize(full)
+            sha = self.hub.sha256(full)
+            siblings.append({'rfilename': rel, 'size': size, 'blobId': sha[:40], 'lfs': {'sha256': sha, 'size': size, 'pointerSize': 134}})
+        self.send_json(200, {'id': repo_id, 'modelId': repo_id, 'sha': repo_commit(repo_id), 'private': False, 'siblings': siblings})
+
+    def tree(self, repo_id, prefix):
+        if not self.check_repo(repo_id):
+            return
+        entries = []
+        for rel, full in self.hub.files(repo_id):
+            if prefix and not rel.startswith(prefix.rstrip('/') + '/'):
+                continue
+            size = os.path.getsize(full)
+            sha = self.hub.sha256(full)
+            entries.append({'type': 'file', 'path': rel, 'size': size, 'oid': sha[:40], 'lfs': {'oid': sha, 'size': size, 'pointerSize': 134}})
+        self.send_json(200, entries)
+
+    def resolve(self, repo_id, rel, head):
+        if not self.check_repo(repo_id):
+            return
+        full = os.path.join(self.hub.root, repo_id, rel)
+        if not os.path.isfile(full):
+            return self.send_json(404, {'error': 'Entry not found'}, {'X-Error-Code': 'EntryNotFound'})
+        size = os.path.getsize(full)
+        start, end, status = 0, size - 1, 200
+        m = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if m and not head:
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            status = 206
+        self.send_response(status)
+        self.send_header('ETag', f'"{self.hub.sha256(full)}"')
+        self.send_header('X-Repo-Commit', repo_commit(repo_id))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if head:
+            return
+        with open(full, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
@@ -0,0 +1,78 @@
+"""
+Images per minute of flux_client against a stand-in FLUX NIM, by requests in flight.
+
+The stand-in answers /v1/infer like the NIM. Generations hold one lock for
+--gpu-ms each (one GPU runs one generation at a time) and every request also
+spends --overhead-ms outside it (upload, decode, encode), which is the time
+the GPU sits idle between blocking one-at-a-time calls.
+
+Usage:
+    python benchmarks/flux_client_pipeline.py --images 24 --gpu-ms 200 --overhead-ms 80 --in-flight 1,2,4
+"""
+import os, sys, json, time, base64, shutil, argparse, tempfile, threading, http.server
+
+from bench_utils import REPO_ROOT, write_random
+
+sys.path.insert(0, os.path.join(REPO_ROOT, 'package', 'python_files'))
+import flux_client
+
+
+def serve_stand_in(gpu_seconds, overhead_seconds, image_bytes):
+    gpu = threading.Lock()
+    image = base64.b64encode(os.urandom(image_bytes)).decode()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(overhead_seconds)
+            with gpu:
+                time.sleep(gpu_seconds)
+            body = json.dumps({'artifacts': [{'base64': image, 'finishReason': 'SUCCESS', 'seed': 0}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--images', type=int, default=24)
+    parser.add_argument('--gpu-ms', type=float, default=200)
+    parser.add_argument('--overhead-ms', type=float, default=80)
+    parser.add_argument('--depth-kb', type=int, default=256, help='Size of every depth map.')
+    parser.add_argument('--image-kb', type=int, default=1024, help='Size of every generated image.')
+    parser.add_argument('--in-flight', default='1,2,4')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='flux-client-bench-')
+    server, url = serve_stand_in(args.gpu_ms / 1000, args.overhead_ms / 1000, args.image_kb * 1024)
+    try:
+        depth_dir = os.path.join(workdir, 'depth')
+        for i in range(args.images):
+            write_random(os.path.join(depth_dir, f'frame_{i:04d}.png'), args.depth_kb * 1024)
+        jobs = flux_client.jobs_from_depth_dir(depth_dir, 'benchmark')
+
+        print(f'{"In flight":>9} {"Time (s)":>9} {"Images/min":>11} {"Median latency (s)":>19}')
+        for in_flight in [int(n) for n in args.in_flight.split(',')]:
+            client = flux_client.FluxClient([url], in_flight=in_flight, retries=0)
+            summary = client.run(jobs, os.path.join(workdir, f'out_{in_flight}'))
+            latencies = sorted(r['latency'] for r in summary['results'] if not r.get('error'))
+            median = latencies[len(latencies) // 2] if latencies else 0
+            print(f'{in_flight:>9} {summary["seconds"]:>9.2f} {summary["images_per_minute"]:>11.1f} {median:>19.2f}')
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Offline end-to-end benchmark of manifest rows through InstallMill.get_and_extract.
+
+Starts a local HTTP file server with Range support, the fake Hugging Face hub
+from fake_hub.py and local bare git repositories, writes a synthetic manifest
+per phase and runs it through InstallMill.run_manifest in a child process, so
+peak RSS is measured per phase. huggingface_hub is pointed at the fake hub with
+HF_ENDPOINT and https://github.com/ is rewritten to the local repositories with
+git's url.insteadOf, so no network access is needed.
+
+Phases:
+    auth      HF token check and access checks for --hf-files models
+    http      --files downloads of --file-mb each from the local server
+    zip       --zips remote archives of --file-mb each, extracted
+    hf_file   --hf-files HF_FILE rows of --file-mb each
+    hf_repo   one HF_REPO row with --hf-repo-files files of --file-mb each
+    git       --repos GH_REPO clones
+    rerun     every row of the phases above again, against the install lockfile
+
+Usage:
+    python benchmarks/installer_offline.py --files 8 --file-mb 64 --json results.json
+"""
+import os, sys, csv, json, time, shutil, zipfile, argparse, tempfile, subprocess, contextlib
+from pathlib import Path
+
+from bench_utils import peak_rss, serve_directory, mib, write_random, make_bare_repo, tree_size
+from fake_hub import FakeHub
+
+PHASES = ['auth', 'http', 'zip', 'hf_file', 'hf_repo', 'git', 'rerun']
+HF_TOKEN = 'hf_bench'
+
+
+def build_fixtures(workdir, args):
+    """Create the served files, HF repos and bare git repos. Returns {phase: payload bytes}."""
+    size = int(args.file_mb * 1024**2)
+    www = os.path.join(workdir, 'www')
+    for i in range(args.files):
+        write_random(os.path.join(www, 'files', f'file_{i}.bin'), size)
+    for i in range(args.zips):
+        member = os.path.join(workdir, 'member.bin')
+        write_random(member, size)
+        os.makedirs(os.path.join(www, 'zips'), exist_ok=True)
+        with zipfile.ZipFile(os.path.join(www, 'zips', f'archive_{i}.zip'), 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as z:
+            z.write(member, f'archive_{i}/weights.bin')
+        os.remove(member)
+
+    hub = FakeHub(os.path.join(workdir, 'hub'), token=HF_TOKEN)
+    for i in range(args.hf_files):
+        hub.add_repo(f'bench/model_{i}', {'model.safetensors': size, 'README.md': 64})
+    hub.add_repo('bench/repo', {f'part_{i}.safetensors': size for i in range(args.hf_repo_files)})
+
+    for i in range(args.repos):
+        make_bare_repo(os.path.join(workdir, 'git', 'bench', f'node_{i}.git'), args.commits, int(args.blob_mb * 1024**2))
+
+    return hub, {
+        'http': size * args.files,
+        'zip': size * args.zips,
+        'hf_file': size * args.hf_files,
+        'hf_repo': size * args.hf_repo_files,
+        'git': tree_size(os.path.join(workdir, 'git')),
+    }
+
+
+def manifest_rows(phase, args, base_url):
+    match phase:
+        case 'http':
+            return [(f'{base_url}/files/file_{i}.bin', f'./ComfyUI/models/bench/file_{i}.bin') for i in range(args.files)]
+        case 'zip':
+            return [(f'{base_url}/zips/archive_{i}.zip', f'./ComfyUI/models/bench/zip_{i}') for i in range(args.zips)]
+        case 'hf_file':
+            return [(f'https://huggingface.co/bench/model_{i}/blob/main/model.safetensors', f'./ComfyUI/models/bench/hf_{i}.safetensors') for i in range(args.hf_files)]
+        case 'hf_repo':
+            return [('https://huggingface.co/bench/repo', './ComfyUI/models/bench/hf_repo')]
+        case 'git':
+            return [(f'https://github.com/bench/node_{i}.git', f'./ComfyUI/custom_nodes/node_{i}') for i in range(args.repos)]
+        case 'rerun':
+            return [row for other in ('http', 'zip', 'hf_file', 'hf_repo', 'git') for row in manifest_rows(other, args, base_url)]
+    return []
+
+
+def write_manifest(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for url, location in rows:
+            writer.writerow([url, location, 'TRUE'])
+
+
+def child_env(workdir, hub_url):
+    env = dict(os.environ)
+    git_root = Path(workdir, 'git').as_uri() + '/'
+    env.update({
+        'HF_ENDPOINT': hub_url,
+        'HF_HOME': os.path.join(workdir, 'hf_home'),
+        'HF_TOKEN': HF_TOKEN,
+        'HF_HUB_DISABLE_TELEMETRY': '1',
+        'HF_HUB_DISABLE_PROGRESS_BARS': '1',
+        'INSTALLMILL_CACHE_DIR': os.path.join(workdir, 'cache'),
+        'GIT_TERMINAL_PROMPT': '0',
+        'GIT_CONFIG_COUNT': '1',
+        'GIT_CONFIG_KEY_0': f'url.{git_root}.insteadOf',
+        'GIT_CONFIG_VALUE_0': 'https://github.com/',
+    })
+    return env
+
+
+def run_child(phase, workdir, workers, use_cache, models):
+    """Run one phase in this process and print a RESULT line with its measurements."""
+    install = os.path.join(workdir, 'install')
+    os.makedirs(install, exist_ok=True)
+    os.chdir(install)
+    log = open(os.path.join(workdir, f'{phase}.log'), 'w')
+    outcomes = {}
+    with contextlib.redirect_stdout(log):
+        import InstallMill
+        from install_lock import InstallLock, LOCKFILE_NAME
+        from artifact_cache import ArtifactCache
+        InstallMill.install_lock = InstallLock(os.path.join(install, LOCKFILE_NAME))
+        InstallMill.artifact_cache = ArtifactCache() if use_cache else None
+
+        start = time.perf_counter()
+        if phase == 'auth':
+            ok, _ = InstallMill.check_hf_token_validity(HF_TOKEN)
+            outcomes['token'] = 'ok' if ok else 'failed'
+            model_list = [{'model_name': f'bench/model_{i}', 'filename': 'README.md', 'token': HF_TOKEN} for i in range(models)]
+            for _, accessible, _ in InstallMill.check_models_access(model_list, None, 0):
+                key = 'ok' if accessible else 'failed'
+                outcomes[key] = outcomes.get(key, 0) + 1
+        else:
+            rows = InstallMill.run_manifest(InstallMill.read_manifest(os.path.join(workdir, f'{phase}.csv')), workdir, workers)
+            for row in rows:
+                outcomes[row['outcome']] = outcomes.get(row['outcome'], 0) + 1
+        seconds = time.perf_counter() - start
+    log.close()
+    print('RESULT ' + json.dumps({'seconds': seconds, 'peak_rss': peak_rss(), 'outcomes': outcomes}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--files', type=int, default=4, help='Plain HTTP downloads.')
+    parser.add_argument('--zips', type=int, default=2, help='Remote zip archives.')
+    parser.add_argument('--hf-files', type=int, default=4, help='HF_FILE rows, one fake model repo each.')
+    parser.add_argument('--hf-repo-files', type=int, default=4, help='Files in the HF_REPO row.')
+    parser.add_argument('--file-mb', type=float, default=32, help='Size of every synthetic file.')
+    parser.add_argument('--repos', type=int, default=4, help='GH_REPO rows.')
+    parser.add_argument('--commits', type=int, default=10, help='Commits per git repo.')
+    parser.add_argument('--blob-mb', type=float, default=1, help='Size of the binary file every commit rewrites.')
+    parser.add_argument('--workers', type=int, default=4, help='Manifest rows run concurrently.')
+    parser.add_argument('--cache', action='store_true', help='Use an artifact cache (empty at the start).')
+    parser.add_argument('--phases', default=','.join(PHASES), help='Comma separated phases to run, in order.')
+    parser.add_argument('--workdir', default=None, help='Scratch folder (default: a temporary folder, removed afterwards).')
+    parser.add_argument('--json', default=None, help='Also write the results to this file.')
+    parser.add_argument('--child', nargs=4, metavar=('PHASE', 'WORKDIR', 'WORKERS', 'CACHE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        phase, workdir, workers, use_cache = args.child
+        run_child(phase, workdir, int(workers), use_cache == '1', args.hf_files)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='installer-bench-')
+    servers = []
+    try:
+        print(f'Building fixtures in {workdir}')
+        hub, payload = build_fixtures(workdir, args)
+        server, base_url = serve_directory(os.path.join(workdir, 'www'), ranges=True)
+        servers += [server, hub]
+        env = child_env(workdir, hub.start())
+
+        results = []
+        print(f'{"Phase":<8} {"Rows":>5} {"Payload":>12} {"Time (s)":>9} {"MiB/s":>8} {"Peak RSS":>12}  Outcomes')
+        for phase in args.phases.split(','):
+            rows = manifest_rows(phase, args, base_url)
+            write_manifest(os.path.join(workdir, f'{phase}.csv'), rows)
+            proc = subprocess.run([sys.executable, __file__, '--hf-files', str(args.hf_files),
+                                   '--child', phase, workdir, str(args.workers), '1' if args.cache else '0'],
+                                  capture_output=True, text=True, env=env)
+            result = [line for line in proc.stdout.splitlines() if line.startswith('RESULT ')]
+            if proc.returncode != 0 or not result:
+                print(f'{phase:<8} failed (exit code {proc.returncode}), see {os.path.join(workdir, phase + ".log")}')
+                print(proc.stderr[-2000:])
+                continue
+            result = json.loads(result[-1][len('RESULT '):])
+            result.update(phase=phase, rows=len(rows) if phase != 'auth' else args.hf_files + 1, payload=payload.get(phase, 0))
+            result['mib_per_s'] = result['payload'] / 1024**2 / result['seconds'] if result['seconds'] else 0
+            results.append(result)
+            outcomes = ', '.join(f'{k} {v}' for k, v in sorted(result['outcomes'].items()))
+            print(f'{phase:<8} {result["rows"]:>5} {mib(result["payload"]):>12} {result["seconds"]:>9.2f} {result["mib_per_s"]:>8.1f} {mib(result["peak_rss"]):>12}  {outcomes}')
+
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'args': {k: v for k, v in vars(args).items() if k != 'child'}, 'results': results}, f, indent=1)
+    finally:
+        for server in servers:
+            server.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
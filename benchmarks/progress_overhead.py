@@ -0,0 +1,59 @@
+"""
+Per-chunk cost of progress reporting in the download loop.
+
+Times --chunks iterations of the stream_dl inner loop body (write + sha256 of a
+--chunk-kb chunk) with no reporting, with the old print('#') and with
+progress.Task.advance(), with and without an event sink and live display.
+
+Usage:
+    python benchmarks/progress_overhead.py --chunks 2000 --chunk-kb 1024
+"""
+import io, os, sys, time, hashlib, argparse, tempfile, contextlib
+
+from bench_utils import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, 'package', 'python_files'))
+import progress
+
+
+def loop(chunks, chunk, report):
+    sink = io.BytesIO()
+    h = hashlib.sha256()
+    start = time.perf_counter()
+    for _ in range(chunks):
+        sink.seek(0)
+        sink.write(chunk)
+        h.update(chunk)
+        report(len(chunk))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--chunks', type=int, default=2000)
+    parser.add_argument('--chunk-kb', type=int, default=1024)
+    args = parser.parse_args()
+
+    chunk = os.urandom(args.chunk_kb * 1024)
+    events = os.path.join(tempfile.mkdtemp(prefix='progress-bench-'), 'events.jsonl')
+    results = {}
+    results['none'] = loop(args.chunks, chunk, lambda n: None)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results["print('#')"] = loop(args.chunks, chunk, lambda n: print('#', end='', flush=True))
+    task = progress.task('bench', total=args.chunks * len(chunk))
+    results['advance'] = loop(args.chunks, chunk, task.advance)
+    task.done()
+    progress.configure(events, live=False)
+    task = progress.task('bench', total=args.chunks * len(chunk))
+    results['advance + events'] = loop(args.chunks, chunk, task.advance)
+    task.done()
+    progress.close()
+
+    base = results['none']
+    print(f'{"Reporting":<18} {"Time (s)":>9} {"Per chunk (us)":>15} {"Overhead":>9}')
+    for name, seconds in results.items():
+        print(f'{name:<18} {seconds:>9.3f} {seconds / args.chunks * 1e6:>15.1f} {(seconds - base) / base:>9.1%}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Peak memory of extracting a remote zip archive, old in-memory path vs. streamed to disk.
+
+Builds a synthetic archive of --size-gb, serves it from a local http.server and
+extracts it once per mode, each in its own process so peak RSS is not shared:
+
+    in-memory  requests.get(url).content wrapped in io.BytesIO (the previous get_and_extract code)
+    streamed   InstallMill.extract_remote_zip, archive streamed to a file first
+
+Usage:
+    python benchmarks/zip_extract_memory.py --size-gb 2
+"""
+import os, io, sys, time, shutil, zipfile, argparse, tempfile, subprocess
+
+from bench_utils import peak_rss, serve_directory, mib
+
+
+def make_archive(path, size_bytes, member_size=256*1024*1024):
+    """Write a zip of incompressible members totalling size_bytes without holding them in memory."""
+    block = 16*1024*1024
+    written = 0
+    index = 0
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as z:
+        while written < size_bytes:
+            member = min(member_size, size_bytes - written)
+            with z.open(f'member_{index:03d}.bin', 'w', force_zip64=True) as f:
+                left = member
+                while left:
+                    n = min(block, left)
+                    f.write(os.urandom(n))
+                    left -= n
+            written += member
+            index += 1
+
+
+def run_child(mode, url, dest):
+    start = time.perf_counter()
+    if mode == 'in-memory':
+        import requests
+        r = requests.get(url)
+        z = zipfile.ZipFile(io.BytesIO(r.content))
+        z.extractall(dest)
+    else:
+        import InstallMill
+        InstallMill.artifact_cache = None
+        InstallMill.extract_remote_zip(url, dest)
+    print(f'RESULT {peak_rss()} {time.perf_counter() - start}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size-gb', type=float, default=2.0, help='Size of the synthetic archive.')
+    parser.add_argument('--workdir', default=None, help='Scratch folder (default: a temporary folder).')
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'URL', 'DEST'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='zip-bench-')
+    os.makedirs(os.path.join(workdir, 'www'), exist_ok=True)
+    archive = os.path.join(workdir, 'www', 'synthetic.zip')
+    size = int(args.size_gb * 1024**3)
+    if not os.path.exists(archive) or os.path.getsize(archive) < size:
+        print(f'Building {mib(size)} synthetic archive in {archive}')
+        make_archive(archive, size)
+
+    server, base_url = serve_directory(os.path.join(workdir, 'www'))
+    try:
+        print(f'{"Mode":<10} {"Peak RSS":>14} {"Time (s)":>9}')
+        for mode in ('in-memory', 'streamed'):
+            dest = os.path.join(workdir, 'out-' + mode)
+            shutil.rmtree(dest, ignore_errors=True)
+            proc = subprocess.run([sys.executable, __file__, '--child', mode, base_url + '/synthetic.zip', dest],
+                                  capture_output=True, text=True)
+            result = [line for line in proc.stdout.splitlines() if line.startswith('RESULT ')]
+            if proc.returncode != 0 or not result:
+                print(f'{mode:<10} failed (exit code {proc.returncode})')
+                print(proc.stderr[-2000:])
+                continue
+            _, peak, seconds = result[-1].split()
+            print(f'{mode:<10} {mib(int(peak)):>14} {float(seconds):>9.1f}')
+            shutil.rmtree(dest, ignore_errors=True)
+    finally:
+        server.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
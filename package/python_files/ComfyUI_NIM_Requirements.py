@@ -1,8 +1,11 @@
+import os
 import sys
-import subprocess
-
-
-subprocess.call([sys.executable, '-m', 'pip',  'install',  '-r', './ComfyUI/custom_nodes/NIMnodes/requirements.txt'])
 
+# The embedded Python does not put the script folder on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from requirements_batch import install_custom_node_requirements
 
 
+# One resolver pass over the requirements of every cloned custom node (NIMnodes, ComfyUI-CUP, ...)
+if not install_custom_node_requirements('./ComfyUI/custom_nodes'):
+    sys.exit(1)
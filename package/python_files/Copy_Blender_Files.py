@@ -1,16 +1,22 @@
-import shutil
 import os
+import sys
+import argparse
+
+# The embedded Python does not put the script folder on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from file_sync import LINK_MODES, sync_tree, print_sync_report
+
+parser = argparse.ArgumentParser(description='Copy the blueprint Blender files to Documents/Blender, only the files that changed.')
+parser.add_argument('--checksum', action='store_true', help='Compare files of the same size by sha256 instead of modification time.')
+parser.add_argument('--link', choices=LINK_MODES, default='copy', help='Hardlink or reflink changed files where the filesystem supports it (default: copy).')
+parser.add_argument('--workers', type=int, default=4, help='Files copied concurrently.')
+args = parser.parse_args()
+
 documents_path = os.path.join(os.environ["USERPROFILE"], "Documents")
 
 src = "../package/Blender"
 dst = os.path.join(documents_path,"Blender")
 
-os.makedirs(dst, exist_ok=True)  # Ensure the destination exists
-
-for item in os.listdir(src):
-    s = os.path.join(src, item)
-    d = os.path.join(dst, item)
-    if os.path.isdir(s):
-        shutil.copytree(s, d, dirs_exist_ok=True)
-    else:
-        shutil.copy2(s, d)  # Preserve metadata
\ No newline at end of file
+# Copies are the default, a hardlinked .blend saved in place would also change the packaged one
+stats = sync_tree(src, dst, args.checksum, args.link, args.workers)
+print_sync_report(src, dst, stats)
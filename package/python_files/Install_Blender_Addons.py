@@ -1,6 +1,16 @@
 from git import Repo
-import os, shutil
+import os, sys, shutil
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# The embedded Python does not put the script folder on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from artifact_cache import default_cache_dir
+
+repo_url = 'https://github.com/AIGODLIKE/ComfyUI-BlenderAI-node.git'
+branch_name = 'MIT-1.5.7'
+# Fetched once per machine, every Blender version is cloned from it locally
+staging_path = Path(default_cache_dir(), 'git', 'ComfyUI-BlenderAI-node.git')
 
 def copy_file(src, dst):
     try:
@@ -15,6 +25,40 @@ def copy_file(src, dst):
     except OSError as e: print(f"An operating system error occurred: {e}")
     except Exception as e: print(f"An unexpected error occurred: {e}")
 
+def installed_at_ref(addon_path):
+    """True if addon_path is a clone whose HEAD is the pinned branch, checked without the network."""
+    try:
+        repo = Repo(addon_path)
+        return repo.head.commit.hexsha == repo.rev_parse(f'{branch_name}^{{commit}}').hexsha
+    except Exception:
+        return False
+
+def staged_repo():
+    """The local staging repo holding the pinned branch, fetched from GitHub only when it is missing."""
+    if staging_path.exists():
+        try:
+            repo = Repo(staging_path)
+            repo.rev_parse(f'{branch_name}^{{commit}}')
+            print(f'Using the staged add-on repo: {staging_path}')
+            return repo
+        except Exception:
+            shutil.rmtree(staging_path, ignore_errors=True)
+    # Only the pinned release is needed, skip the history
+    print(f'Fetching {repo_url} ({branch_name}) to {staging_path}')
+    return Repo.clone_from(repo_url, staging_path, branch=branch_name, depth=1, single_branch=True, bare=True)
+
+def install_addon(addon_path):
+    # A local clone copies the objects of the staging repo instead of downloading them again
+    repo = Repo.clone_from(str(staging_path), addon_path, branch=branch_name)
+    repo.remotes.origin.set_url(repo_url)
+    repo.close()
+    print(f'ComfyUI-Blender-AI addon installed to: {addon_path}')
+    #pref_new = os.path.normpath(os.path.join(current_directory,'../package/patch_files/preference.py'))
+    #pref_dest = os.path.normpath(os.path.join(addon_path,'preference.py'))
+
+    #print(f"\n--- Attempting to copy {pref_new} to destination_folder {pref_dest} / ---")
+    #copy_file(pref_new, pref_dest)
+
 # Get Blender config directory
 user_profile = os.environ.get('USERPROFILE')
 blender_path = Path(user_profile, 'AppData/Roaming/Blender Foundation/Blender')
@@ -52,24 +96,22 @@ if blender_path.exists():
         except ValueError:
             pass  # Ignore folders that aren't numeric
 
+    missing = []
     for ver in blender_versions:
         addon_path = Path(blender_path, ver, 'extensions/user_default/ComfyUI-BlenderAI-node')
-
-        repo_url = 'https://github.com/AIGODLIKE/ComfyUI-BlenderAI-node.git'
-        branch_name = 'MIT-1.5.7'
-
         if not addon_path.exists():
-            Repo.clone_from(repo_url, addon_path, branch=branch_name)
-            print(f'ComfyUI-Blender-AI addon installed to: {addon_path}')
-            #pref_new = os.path.normpath(os.path.join(current_directory,'../package/patch_files/preference.py'))
-            #pref_dest = os.path.normpath(os.path.join(addon_path,'preference.py'))
-
-            #print(f"\n--- Attempting to copy {pref_new} to destination_folder {pref_dest} / ---")
-            #copy_file(pref_new, pref_dest)
-	
-        else: 
+            missing.append(addon_path)
+        elif installed_at_ref(addon_path):
+            print(f'The add-on is already installed at {branch_name}: {addon_path}')
+        else:
             print(f'Found an existing addon installation at: {addon_path}.')
             print('Add-on will not be installed.')
+
+    if missing:
+        staged_repo().close()
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            for future in [pool.submit(install_addon, addon_path) for addon_path in missing]:
+                future.result()
 else:
     print(f'Blender directory not found: {blender_path}')
 
@@ -0,0 +1,253 @@
+import os, json, time, shutil, hashlib, tempfile, threading, platform
+from pathlib import Path
+
+# Default size cap for the shared cache, override with --cache-size-gb or INSTALLMILL_CACHE_MAX_GB
+DEFAULT_MAX_GB = 50
+
+
+def default_cache_dir():
+    """Machine-wide cache location shared by every install folder."""
+    if os.environ.get('INSTALLMILL_CACHE_DIR'):
+        return Path(os.environ['INSTALLMILL_CACHE_DIR'])
+    if platform.system() == "Windows" and os.environ.get('LOCALAPPDATA'):
+        return Path(os.environ['LOCALAPPDATA'], '3d-guided-genai-rtx', 'cache')
+    return Path.home() / '.cache' / '3d-guided-genai-rtx'
+
+
+def file_sha256(path, chunk_size=1024*1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def link_or_copy(src, dst, hardlink=False):
+    """
+    Place src at dst through a temporary file of its own in the target folder.
+
+    Args:
+        hardlink (bool): Link instead of copy when both are on the same volume.
+            Both names then share one file, an edit in place through either
+            changes the other.
+
+    Returns:
+        str: 'hardlink' or 'copy'.
+    """
+    dst = os.path.abspath(dst)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    # Unique per call, concurrent rows placing the same destination do not share it
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(dst) + '.', suffix='.cache.tmp', dir=os.path.dirname(dst))
+    os.close(fd)
+    # Only the name is kept, a copy gets the usual permissions instead of mkstemp's owner-only ones
+    os.remove(tmp)
+    try:
+        method = 'copy'
+        if hardlink:
+            try:
+                os.link(src, tmp)
+                method = 'hardlink'
+            except OSError:
+                pass
+        if method == 'copy':
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return method
+
+
+def validators_match(recorded, current):
+    """
+    True if the ETag/Last-Modified a URL was cached with are still the current ones.
+
+    The ETag decides when the server sends one, otherwise Last-Modified. A URL
+    recorded without either can never be shown to be unchanged.
+    """
+    if not recorded or not current:
+        return False
+    if current.get('etag'):
+        return current['etag'] == recorded.get('etag')
+    return bool(current.get('last_modified')) and current['last_modified'] == recorded.get('last_modified')
+
+
+class ArtifactCache:
+    """
+    Content-addressed store for downloaded manifest artifacts.
+
+    Blobs live under objects/<sha256[:2]>/<sha256> and are found either by the
+    URL they were downloaded from or by their sha256. index.json records the
+    URL mapping with the ETag/Last-Modified each URL was downloaded with, plus
+    the size and last use of every blob, and the least recently used blobs are
+    evicted once the cache grows past max_bytes.
+
+    A sha256 identifies its content, so digest hits are served as they are. A
+    URL's content can change upstream, so URL hits are only served for the
+    validators the server currently reports (see validators_match); the
+    cache itself never touches the network.
+
+    Blobs are copied in and out by default. With hardlinks=True they are
+    linked where the volume allows it, which saves the copy but lets an
+    installed file edited in place change the blob, so every digest hit is
+    then hashed again before it is served.
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_GB * 1024**3, hardlinks=False):
+        self.root = Path(root) if root else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hardlinks = hardlinks
+        self.objects = self.root / 'objects'
+        self.index_file = self.root / 'index.json'
+        self._lock = threading.Lock()
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('urls', {})
+        index.setdefault('blobs', {})
+        # Indexes written before validators were recorded map a URL straight to its digest
+        for url, entry in index['urls'].items():
+            if isinstance(entry, str):
+                index['urls'][url] = {'sha256': entry}
+        return index
+
+    def _save_index(self):
+        tmp = str(self.index_file) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f, indent=1)
+        os.replace(tmp, self.index_file)
+
+    def blob_path(self, sha256):
+        return self.objects / sha256[:2] / sha256
+
+    def lookup_digest(self, sha256):
+        """Return the cached blob for sha256, or None."""
+        if not sha256:
+            return None
+        sha256 = sha256.lower()
+        with self._lock:
+            path = self.blob_path(sha256)
+            blob = self._index['blobs'].get(sha256)
+            # A blob that vanished or changed (e.g. edited through a hardlink) is dropped
+            if (not path.is_file() or blob is None or path.stat().st_size != blob['size']
+                    or self.hardlinks and file_sha256(path) != sha256):
+                self._remove_blob(sha256)
+                self._save_index()
+                return None
+            blob['last_used'] = time.time()
+            self._save_index()
+            return path
+
+    def url_validators(self, url):
+        """ETag and Last-Modified url was cached with, empty when it is not cached."""
+        with self._lock:
+            entry = self._index['urls'].get(url, {})
+            return {key: entry[key] for key in ('etag', 'last_modified') if entry.get(key)}
+
+    def _url_digest(self, url, validators):
+        entry = self._index['urls'].get(url)
+        if entry is None or not validators_match(entry, validators):
+            return None
+        return entry['sha256']
+
+    def lookup_url(self, url, validators):
+        """Return the cached blob last downloaded from url if it was cached with these validators, or None."""
+        with self._lock:
+            sha256 = self._url_digest(url, validators)
+        return self.lookup_digest(sha256)
+
+    def contains(self, url, sha256=None, validators=None):
+        """True if fetch(url, ..., sha256, validators) would be served from the cache. Does not touch the index."""
+        with self._lock:
+            digest = (sha256 or '').lower() or self._url_digest(url, validators)
+            blob = self._index['blobs'].get(digest) if digest else None
+            return blob is not None and self.blob_path(digest).is_file()
+
+    def fetch(self, url, dest, sha256=None, validators=None):
+        """
+        Serve dest from the cache without touching the network.
+
+        A pinned sha256 is looked up by digest only. Otherwise the URL is
+        looked up, and only served when validators (the ETag/Last-Modified the
+        server reports now) match the ones it was cached with.
+
+        Returns:
+            Path: The cached blob dest was placed from, or None on a miss.
+        """
+        path = self.lookup_digest(sha256) if sha256 else self.lookup_url(url, validators)
+        if path is None:
+            return None
+        method = link_or_copy(path, dest, self.hardlinks)
+        print(f'Served {dest} from the artifact cache ({method})')
+        return path
+
+    def staging_path(self, url):
+        """Scratch location inside the cache for downloading url before add(..., move=True)."""
+        name = hashlib.sha256(url.encode()).hexdigest()[:16] + '-' + os.path.basename(url.split('?')[0])
+        return self.root / 'staging' / name
+
+    def add(self, url, file_path, sha256=None, move=False, validators=None):
+        """
+        Store file_path in the cache under its sha256 and remember it for url.
+
+        validators are the ETag/Last-Modified url had when it was downloaded,
+        later URL lookups have to present the same ones. With move=True the
+        file is moved into the cache instead of copied (or linked, see hardlinks).
+
+        Returns:
+            str: The sha256 of the stored file.
+        """
+        sha256 = (sha256 or file_sha256(file_path)).lower()
+        path = self.blob_path(sha256)
+        if path.is_file():
+            if move:
+                os.remove(file_path)
+        elif move:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(file_path, path)
+        else:
+            link_or_copy(file_path, path, self.hardlinks)
+        with self._lock:
+            self._index['blobs'][sha256] = {'size': path.stat().st_size, 'last_used': time.time()}
+            if url:
+                self._index['urls'][url] = {'sha256': sha256, **{key: value for key, value in (validators or {}).items() if value}}
+            self._evict(keep=sha256)
+            self._save_index()
+        return sha256
+
+    def discard(self, sha256):
+        """Remove a blob and every URL pointing at it."""
+        with self._lock:
+            self._remove_blob(sha256)
+            self._save_index()
+
+    def _remove_blob(self, sha256):
+        try:
+            os.remove(self.blob_path(sha256))
+        except FileNotFoundError:
+            pass
+        self._index['blobs'].pop(sha256, None)
+        for url in [u for u, entry in self._index['urls'].items() if entry['sha256'] == sha256]:
+            del self._index['urls'][url]
+
+    def _evict(self, keep=None):
+        blobs = self._index['blobs']
+        total = sum(blob['size'] for blob in blobs.values())
+        for sha256, blob in sorted(blobs.items(), key=lambda item: item[1].get('last_used', 0)):
+            if total <= self.max_bytes:
+                break
+            if sha256 == keep:
+                continue
+            try:
+                self._remove_blob(sha256)
+            except OSError as e:
+                print(f'Could not evict cached artifact {sha256}: {e}')
+                continue
+            total -= blob['size']
@@ -0,0 +1,203 @@
+import os, time, threading, importlib
+
+# Lower numbers go first. Defaults per manifest item type, override per row with priority=<n>
+PRIORITY_BLOCKING = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BULK = 10
+
+# Limit file polled for runtime changes, holds the cap in MiB/s (empty or 0 for no cap)
+LIMIT_FILE_NAME = 'installmill.bandwidth'
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every download, refilled at rate bytes per second.
+
+    consume() may take the bucket into debt for a chunk larger than the burst,
+    later callers then wait until it is paid back, so the average rate holds
+    for any chunk size. While a higher priority (lower number) caller is
+    waiting, lower priority callers wait as well. With rate None nothing is
+    limited and consume() returns without taking the lock.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self._cond = threading.Condition()
+        self._waiting = {}
+        self.rate = None
+        self.burst = burst
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """Change the rate (bytes per second, None or 0 for no limit) while downloads are running."""
+        with self._cond:
+            self._refill()
+            self.rate = rate or None
+            if self.rate:
+                self.tokens = min(self.tokens, self._burst())
+            self._cond.notify_all()
+
+    def _burst(self):
+        return self.burst or max(self.rate / 4, 64 * 1024)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self._burst(), self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def consume(self, n, priority=PRIORITY_NORMAL):
+        if self.rate is None:
+            return
+        with self._cond:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    self._refill()
+                    if self.rate is None:
+                        return
+                    ahead = any(p < priority and count for p, count in self._waiting.items())
+                    if self.tokens >= 0 and not ahead:
+                        self.tokens -= n
+                        return
+                    self._cond.wait(max(-self.tokens, 1024) / self.rate)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+
+_bucket = TokenBucket()
+_local = threading.local()
+
+
+def set_limit(mib_per_s):
+    """Cap all downloads at mib_per_s MiB/s, None or 0 removes the cap."""
+    _bucket.set_rate(int(mib_per_s * 1024**2) if mib_per_s else None)
+
+
+def limit():
+    """Current cap in MiB/s, or None."""
+    return _bucket.rate / 1024**2 if _bucket.rate else None
+
+
+def set_priority(priority):
+    """Priority of the downloads made by the current thread."""
+    _local.priority = priority
+
+
+def get_priority():
+    return getattr(_local, 'priority', PRIORITY_NORMAL)
+
+
+def consume(n):
+    _bucket.consume(n, get_priority())
+
+
+def inherit(fn):
+    """Wrap fn so it runs with the caller's priority on a worker thread."""
+    priority = get_priority()
+
+    def run(*args, **kwargs):
+        set_priority(priority)
+        return fn(*args, **kwargs)
+    return run
+
+
+def read_limit_file(path):
+    """Cap in MiB/s from a limit file, None when it is empty, 0 or missing."""
+    try:
+        with open(path, 'r') as f:
+            text = f.read().strip()
+        return float(text) if text else None
+    except (OSError, ValueError):
+        return None
+
+
+def watch_limit_file(path, interval=2.0):
+    """
+    Apply changes to the limit file while the install runs, from a daemon thread.
+
+    Returns:
+        threading.Event: Set it to stop watching.
+    """
+    stop = threading.Event()
+
+    def watch():
+        last = None
+        while not stop.wait(interval):
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == last:
+                continue
+            last = mtime
+            value = read_limit_file(path)
+            if value != limit():
+                set_limit(value)
+                print(f'Bandwidth limit changed to {f"{value:g} MiB/s" if value else "unlimited"}')
+
+    threading.Thread(target=watch, daemon=True).start()
+    return stop
+
+
+class _ThrottledStream:
+    """Response body wrapper that takes every chunk from the token bucket."""
+
+    def __init__(self, stream, priority):
+        self._stream = stream
+        self._priority = priority
+
+    def __iter__(self):
+        for chunk in self._stream:
+            _bucket.consume(len(chunk), self._priority)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+def throttle_hf_hub():
+    """
+    Route huggingface_hub downloads through the token bucket.
+
+    huggingface_hub reads file bodies with its own httpx client, so its
+    transport is wrapped to throttle response streams. Xet transfers bypass
+    httpx entirely and are switched off.
+
+    Returns:
+        bool: False if this huggingface_hub version could not be hooked.
+    """
+    try:
+        from huggingface_hub import set_client_factory, constants
+        from huggingface_hub.utils import _http
+    except ImportError:
+        return False
+    base_factory = getattr(_http, '_GLOBAL_CLIENT_FACTORY', None) or getattr(_http, 'default_client_factory', None)
+    if base_factory is None:
+        return False
+
+    def factory():
+        client = base_factory()
+        httpx = importlib.import_module(type(client).__module__.split('.')[0])
+        inner = client._transport
+
+        class ThrottledStream(_ThrottledStream, httpx.SyncByteStream):
+            pass
+
+        class ThrottledTransport(httpx.BaseTransport):
+            def handle_request(self, request):
+                response = inner.handle_request(request)
+                response.stream = ThrottledStream(response.stream, get_priority())
+                return response
+
+            def close(self):
+                inner.close()
+
+        client._transport = ThrottledTransport()
+        return client
+
+    constants.HF_HUB_DISABLE_XET = True
+    set_client_factory(factory)
+    return True
@@ -0,0 +1,60 @@
+import platform, subprocess
+
+# WSL distribution the NIM prerequisite installer sets up with podman
+WSL_DISTRO = 'NVIDIA-Workbench'
+
+
+class PodmanRunner:
+    """
+    Runs podman and the container start script, directly or through a command prefix.
+
+    Everything that launches or controls NIM containers goes through a
+    runner, so a fake one with the same methods can stand in for podman.
+    """
+
+    def __init__(self, prefix=()):
+        self.prefix = list(prefix)
+
+    def host_path(self, path):
+        """path as seen by the shell the runner starts."""
+        return path.as_posix()
+
+    def gpu_device(self, uuid):
+        """CDI device name passed to podman --device for one GPU."""
+        return f'nvidia.com/gpu={uuid}'
+
+    def launch(self, bash_command):
+        """Start bash_command in the background, its output readable line by line from stdout."""
+        return subprocess.Popen(self.prefix + ['/bin/bash', '-c', bash_command], stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, text=True, bufsize=1)
+
+    def podman(self, *args, timeout=30):
+        return subprocess.run(self.prefix + ['podman', *args], capture_output=True, text=True, timeout=timeout)
+
+    def stop(self, name, timeout=30):
+        return self.podman('stop', name, timeout=timeout)
+
+    def running(self, name):
+        """True if a container called name exists (podman run --rm removes stopped ones)."""
+        result = self.podman('ps', '-a', '--filter', f'name={name}', '--format', '{{.Names}}', timeout=10)
+        return name in result.stdout.split()
+
+
+class WslPodmanRunner(PodmanRunner):
+    """Runs podman inside the WSL distribution on Windows."""
+
+    def __init__(self, distro=WSL_DISTRO):
+        super().__init__(['wsl', '-d', distro])
+        self.distro = distro
+
+    def gpu_device(self, uuid):
+        # The WSL CDI spec only has nvidia.com/gpu=all, the GPU is picked with CUDA_VISIBLE_DEVICES instead
+        return 'nvidia.com/gpu=all'
+
+    def host_path(self, path):
+        # C:\dir\file is /mnt/c/dir/file inside WSL
+        return f"/mnt/{path.drive[0].lower()}{path.as_posix()[2:]}"
+
+
+def default_runner():
+    return WslPodmanRunner() if platform.system() == "Windows" else PodmanRunner()
@@ -0,0 +1,269 @@
+"""
+Batched, pipelined client for the local FLUX NIM.
+
+Queues prompt + depth map requests, keeps --in-flight of them at the NIM at
+once so the GPU always has the next one waiting, retries transient failures
+and writes every image as soon as it comes back. Several --url values spread
+the requests over per-GPU containers (run_ngc_podman_flux.py --gpus each).
+With --daemon, every request also counts as use at the nim_daemon.py that
+keeps the container warm, so it is not stopped as idle mid-run.
+
+Jobs come from a JSON lines file, one {"prompt", "depth", "seed", "steps",
+"cfg_scale", "output"} object per line (only prompt and depth are needed), or
+from a folder of depth maps rendered by a camera sweep with one --prompt.
+
+Usage:
+    python flux_client.py --depth-dir renders/depth --prompt "a foggy harbour at dawn" --out renders/flux
+    python flux_client.py --jobs sweep.jsonl --out renders/flux --in-flight 3 --url http://localhost:8000 --url http://localhost:8001
+    python flux_client.py --depth-dir renders/depth --prompt "a foggy harbour at dawn" --out renders/flux --daemon http://127.0.0.1:8765
+"""
+import os, sys, json, time, base64, random, argparse, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# The embedded Python does not put the script folder on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import requests
+import transport
+from nim_readiness import DEFAULT_URL
+
+INFER_PATH = '/v1/infer'
+DEFAULT_STEPS = 30
+DEFAULT_CFG_SCALE = 3.5
+# Answers worth another try: rate limited, model still loading, container restarting
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Seconds a touch of the NIM daemon may take, it must never hold up a generation
+TOUCH_TIMEOUT = 2
+DEPTH_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class FluxError(Exception):
+    pass
+
+
+def depth_image_uri(path):
+    """The depth map as the data URI the NIM takes in its image field."""
+    mime = 'image/png' if path.lower().endswith('.png') else 'image/jpeg'
+    with open(path, 'rb') as f:
+        return f'data:{mime};base64,{base64.b64encode(f.read()).decode()}'
+
+
+def jobs_from_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def jobs_from_depth_dir(depth_dir, prompt, seed=0, steps=DEFAULT_STEPS, cfg_scale=DEFAULT_CFG_SCALE):
+    """One job per depth map in depth_dir, in name order, the same seed for every frame of a sweep."""
+    names = sorted(n for n in os.listdir(depth_dir) if n.lower().endswith(DEPTH_EXTENSIONS))
+    return [{'prompt': prompt, 'depth': os.path.join(depth_dir, n), 'seed': seed, 'steps': steps, 'cfg_scale': cfg_scale}
+            for n in names]
+
+
+class FluxClient:
+    """
+    Sends jobs to one or more FLUX NIM endpoints with a bounded number in flight.
+
+    Args:
+        urls (list): NIM roots, every job goes to the one with the fewest requests in flight.
+        in_flight (int): Requests in flight over all endpoints.
+        retries (int): Extra attempts per job after a connection error, timeout or RETRY_STATUS answer.
+        backoff (float): Seconds before the first retry, doubled for every further one (Retry-After wins).
+        connect_timeout (float): Seconds to connect.
+        read_timeout (float): Seconds to wait for an image.
+        daemons (list): nim_daemon.py API roots touched before every request, one per url or one for all of them.
+    """
+
+    def __init__(self, urls=(DEFAULT_URL,), in_flight=2, retries=3, backoff=2.0, connect_timeout=5, read_timeout=600, daemons=()):
+        self.urls = [url.rstrip('/') for url in urls]
+        daemons = [daemon.rstrip('/') for daemon in daemons]
+        if daemons and len(daemons) not in (1, len(self.urls)):
+            raise ValueError(f'{len(daemons)} daemons for {len(self.urls)} urls, give one for all or one per url')
+        self.daemons = dict(zip(self.urls, daemons * len(self.urls) if len(daemons) == 1 else daemons))
+        self._unreachable = set()
+        self.in_flight = max(1, in_flight)
+        self.retries = retries
+        self.backoff = backoff
+        # Retries are done per job below, the pool only keeps the connections alive
+        self.transport = transport.Transport(connect_timeout, read_timeout, retries=0, pool_size=self.in_flight)
+        self._busy = {url: 0 for url in self.urls}
+        self._lock = threading.Lock()
+
+    def _acquire_url(self):
+        with self._lock:
+            url = min(self.urls, key=lambda u: self._busy[u])
+            self._busy[url] += 1
+            return url
+
+    def _release_url(self, url):
+        with self._lock:
+            self._busy[url] -= 1
+
+    def touch(self, url):
+        """Count a request to url as use at its daemon. A daemon that cannot be reached is reported once and left alone."""
+        daemon = self.daemons.get(url)
+        if daemon is None or daemon in self._unreachable:
+            return
+        try:
+            self.transport.post(daemon + '/touch', timeout=(TOUCH_TIMEOUT, TOUCH_TIMEOUT))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            with self._lock:
+                if daemon in self._unreachable:
+                    return
+                self._unreachable.add(daemon)
+            print(f'NIM daemon {daemon} is not reachable ({type(e).__name__}), the container may be stopped as idle')
+
+    def payload(self, job):
+        body = {'prompt': job['prompt'], 'mode': 'depth', 'image': depth_image_uri(job['depth']),
+                'seed': job.get('seed', 0), 'steps': job.get('steps', DEFAULT_STEPS), 'cfg_scale': job.get('cfg_scale', DEFAULT_CFG_SCALE)}
+        for key in ('width', 'height'):
+            if key in job:
+                body[key] = job[key]
+        return body
+
+    def generate(self, job, output):
+        """
+        Run one job and write its image to output.
+
+        Returns:
+            dict: output, url, attempts, latency (seconds of the successful request) and total seconds.
+        """
+        body = self.payload(job)
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            url = self._acquire_url()
+            error = None
+            try:
+                self.touch(url)
+                sent = time.perf_counter()
+                response = self.transport.post(url + INFER_PATH, json=body, headers={'Accept': 'application/json'})
+                if response.status_code == 200:
+                    latency = time.perf_counter() - sent
+                    write_image(response.json(), output)
+                    return {'output': output, 'url': url, 'attempts': attempt + 1, 'latency': latency,
+                            'seconds': time.perf_counter() - start}
+                error = f'HTTP {response.status_code}: {response.text[:200]}'
+                if response.status_code not in RETRY_STATUS:
+                    raise FluxError(error)
+                retry_after = response.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f'{type(e).__name__}: {e}'
+                retry_after = None
+            finally:
+                self._release_url(url)
+            if attempt == self.retries:
+                raise FluxError(f'{error} (after {attempt + 1} attempts)')
+            pause = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2**attempt
+            time.sleep(pause * random.uniform(0.8, 1.2))
+
+    def run(self, jobs, out_dir, on_result=None):
+        """
+        Run every job, at most in_flight at a time, writing each image as it finishes.
+
+        Jobs without an output are written to out_dir as <index>_<depth name>.png.
+
+        Returns:
+            dict: results (one per job, in job order, with error set for failed ones), images, failed, seconds and images_per_minute.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        jobs = list(jobs)
+        results = [None] * len(jobs)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.in_flight) as pool:
+            pending = {}
+            queue = iter(enumerate(jobs))
+            while True:
+                # Keep in_flight requests submitted, the next depth map is read while the GPU works
+                for index, job in queue:
+                    output = job.get('output') or os.path.join(out_dir, f'{index:05d}_{os.path.splitext(os.path.basename(job["depth"]))[0]}.png')
+                    pending[pool.submit(self.generate, job, output)] = index
+                    if len(pending) >= self.in_flight:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'output': None, 'error': str(e)}
+                    result['index'] = index
+                    results[index] = result
+                    if on_result:
+                        on_result(result)
+        seconds = time.perf_counter() - start
+        images = sum(1 for r in results if not r.get('error'))
+        return {'results': results, 'images': images, 'failed': len(results) - images, 'seconds': seconds,
+                'images_per_minute': images / seconds * 60 if seconds else 0.0}
+
+
+def write_image(response_json, output):
+    """Decode the first artifact of an infer response to output, through a temporary file renamed into place."""
+    artifacts = response_json.get('artifacts') or []
+    if not artifacts or not artifacts[0].get('base64'):
+        raise FluxError(f'No image in the response: {str(response_json)[:200]}')
+    if artifacts[0].get('finishReason', 'SUCCESS') != 'SUCCESS':
+        raise FluxError(f'Generation finished with {artifacts[0]["finishReason"]}')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp = output + '.part'
+    with open(tmp, 'wb') as f:
+        f.write(base64.b64decode(artifacts[0]['base64']))
+    os.replace(tmp, output)
+
+
+def print_report(summary):
+    latencies = sorted(r['latency'] for r in summary['results'] if not r.get('error'))
+    print(f"{summary['images']} images in {summary['seconds']:.1f} s, {summary['images_per_minute']:.1f} images/minute, {summary['failed']} failed")
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"Latency per request: min {latencies[0]:.1f} s, median {p50:.1f} s, p95 {p95:.1f} s, max {latencies[-1]:.1f} s")
+    for r in summary['results']:
+        if r.get('error'):
+            print(f"\tJob {r['index']} failed: {r['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate many images with the local FLUX NIM, several requests in flight.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--jobs', help='JSON lines file, one job per line.')
+    source.add_argument('--depth-dir', help='Folder of depth maps, one job per image.')
+    parser.add_argument('--prompt', help='Prompt for every --depth-dir job.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS)
+    parser.add_argument('--cfg-scale', type=float, default=DEFAULT_CFG_SCALE)
+    parser.add_argument('--out', required=True, help='Folder the images are written to.')
+    parser.add_argument('--url', action='append', help=f'FLUX NIM root, repeat for per-GPU containers (default: {DEFAULT_URL}).')
+    parser.add_argument('--in-flight', type=int, default=2, help='Requests in flight over all endpoints.')
+    parser.add_argument('--retries', type=int, default=3, help='Extra attempts per job after a transient failure.')
+    parser.add_argument('--read-timeout', type=float, default=600, help='Seconds to wait for one image.')
+    parser.add_argument('--daemon', action='append', default=[], help='nim_daemon.py API root to touch on every request, once for all --url values or once per --url.')
+    parser.add_argument('--json', default=None, help='Also write the per-request results to this file.')
+    args = parser.parse_args()
+    if args.depth_dir and not args.prompt:
+        parser.error('--depth-dir needs --prompt')
+
+    jobs = jobs_from_file(args.jobs) if args.jobs else jobs_from_depth_dir(args.depth_dir, args.prompt, args.seed, args.steps, args.cfg_scale)
+    try:
+        client = FluxClient(args.url or [DEFAULT_URL], args.in_flight, args.retries, read_timeout=args.read_timeout, daemons=args.daemon)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f'Generating {len(jobs)} images with {client.in_flight} in flight on {", ".join(client.urls)}')
+
+    def report(result):
+        if result.get('error'):
+            print(f"Job {result['index']} failed: {result['error']}")
+        else:
+            print(f"Job {result['index']}: {result['output']} ({result['latency']:.1f} s, {result['attempts']} attempt{'s' if result['attempts'] > 1 else ''})")
+
+    summary = client.run(jobs, args.out, report)
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=1)
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
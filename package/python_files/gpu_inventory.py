@@ -0,0 +1,143 @@
+import subprocess
+
+# Container and host port of the single FLUX NIM the workflow expects, per-GPU containers count up from them
+BASE_NAME = 'FLUX_DEPTH'
+BASE_PORT = 8000
+
+# NVML architecture numbers (nvmlDeviceGetArchitecture) and CUDA compute capabilities (nvidia-smi compute_cap)
+NVML_ARCHITECTURES = {2: 'Kepler', 3: 'Maxwell', 4: 'Pascal', 5: 'Volta', 6: 'Turing', 7: 'Ampere', 8: 'Ada', 9: 'Hopper', 10: 'Blackwell'}
+NVML_ARCHITECTURE_NUMBERS = {name: number for number, name in NVML_ARCHITECTURES.items()}
+# What NVML reports for an architecture it does not know (NVML_DEVICE_ARCH_UNKNOWN)
+NVML_ARCH_UNKNOWN = 0xffffffff
+COMPUTE_CAPABILITIES = {'3': 'Kepler', '5': 'Maxwell', '6': 'Pascal', '7.0': 'Volta', '7.2': 'Volta', '7.5': 'Turing',
+                        '8.0': 'Ampere', '8.6': 'Ampere', '8.7': 'Ampere', '8.9': 'Ada', '9': 'Hopper', '10': 'Blackwell', '12': 'Blackwell'}
+
+SMI_FIELDS = ['index', 'uuid', 'name', 'pci.device_id', 'memory.total', 'memory.free', 'compute_cap']
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def architecture_from_compute_cap(compute_cap):
+    major = compute_cap.split('.')[0]
+    return COMPUTE_CAPABILITIES.get(compute_cap) or COMPUTE_CAPABILITIES.get(major, 'Unknown')
+
+
+def inventory_nvml(nvml=None):
+    """
+    One dict per GPU from NVML.
+
+    Every entry has index, uuid, name, brand, architecture (the NVML number),
+    architecture_name, pci_device_id, memory_total and memory_free (MiB).
+
+    Args:
+        nvml: The pynvml module, or a stand-in with the same functions.
+    """
+    if nvml is None:
+        import pynvml as nvml
+    nvml.nvmlInit()
+    try:
+        devices = []
+        for i in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(i)
+            architecture = nvml.nvmlDeviceGetArchitecture(handle)
+            memory = nvml.nvmlDeviceGetMemoryInfo(handle)
+            devices.append({
+                'index': i,
+                'uuid': _text(nvml.nvmlDeviceGetUUID(handle)),
+                'name': _text(nvml.nvmlDeviceGetName(handle)),
+                'brand': nvml.nvmlDeviceGetBrand(handle),
+                'architecture': architecture,
+                'architecture_name': NVML_ARCHITECTURES.get(architecture, 'Unknown'),
+                'pci_device_id': f"0x{format(nvml.nvmlDeviceGetPciInfo(handle).pciDeviceId, 'X')}",
+                'memory_total': memory.total // 1024**2,
+                'memory_free': memory.free // 1024**2,
+            })
+        return devices
+    finally:
+        nvml.nvmlShutdown()
+
+
+def parse_smi_csv(output, fields=SMI_FIELDS):
+    """
+    One dict per GPU from nvidia-smi --query-gpu=<fields> --format=csv,noheader,nounits output.
+
+    architecture is the NVML number of the compute capability's architecture,
+    NVML_ARCH_UNKNOWN without one, so both inventories give the same types.
+    """
+    devices = []
+    for line in output.splitlines():
+        values = [value.strip() for value in line.split(',')]
+        if len(values) != len(fields) or not values[1]:
+            continue
+        row = dict(zip(fields, values))
+        compute_cap = row.get('compute_cap', '')
+        architecture_name = architecture_from_compute_cap(compute_cap) if compute_cap else 'Unknown'
+        devices.append({
+            'index': int(row['index']),
+            'uuid': row['uuid'],
+            'name': row['name'],
+            'brand': 'Unknown',
+            'architecture': NVML_ARCHITECTURE_NUMBERS.get(architecture_name, NVML_ARCH_UNKNOWN),
+            'architecture_name': architecture_name,
+            'pci_device_id': row['pci.device_id'],
+            'memory_total': int(float(row['memory.total'])) if row['memory.total'].replace('.', '').isdigit() else None,
+            'memory_free': int(float(row['memory.free'])) if row['memory.free'].replace('.', '').isdigit() else None,
+        })
+    return devices
+
+
+def inventory_smi(check_output=subprocess.check_output):
+    """One dict per GPU from nvidia-smi, for when NVML is not available. Same keys as inventory_nvml."""
+    try:
+        fields = SMI_FIELDS
+        output = check_output(['nvidia-smi', f'--query-gpu={",".join(fields)}', '--format=csv,noheader,nounits'], text=True, timeout=30)
+    except subprocess.CalledProcessError:
+        # Drivers before compute_cap was queryable reject the whole query
+        fields = SMI_FIELDS[:-1]
+        output = check_output(['nvidia-smi', f'--query-gpu={",".join(fields)}', '--format=csv,noheader,nounits'], text=True, timeout=30)
+    return parse_smi_csv(output, fields)
+
+
+def select_gpus(devices, spec='each', min_free_mib=0):
+    """
+    GPUs to place containers on.
+
+    Args:
+        devices (list): From inventory_nvml or inventory_smi.
+        spec (str): 'each' for every GPU, or comma separated indexes and UUIDs.
+        min_free_mib (int): Leave out GPUs with less free VRAM.
+    """
+    if spec == 'each':
+        chosen = list(devices)
+    else:
+        wanted = [item.strip() for item in spec.split(',') if item.strip()]
+        chosen = [d for d in devices if str(d['index']) in wanted or d['uuid'] in wanted]
+        missing = set(wanted) - {str(d['index']) for d in chosen} - {d['uuid'] for d in chosen}
+        if missing:
+            raise ValueError(f'No GPU {", ".join(sorted(missing))}, found: {", ".join(str(d["index"]) for d in devices)}')
+    return [d for d in chosen if not min_free_mib or d['memory_free'] is None or d['memory_free'] >= min_free_mib]
+
+
+def placements(gpus=None, base_name=BASE_NAME, base_port=BASE_PORT):
+    """
+    Container name, host port and GPU for every container to launch.
+
+    Without gpus there is one container on every GPU, named and published
+    like before. Otherwise each GPU gets its own container, <base_name>_GPU<index>
+    on base_port, base_port + 1, ...
+
+    Returns:
+        list: One dict per container with name, port, url and gpu (None for every GPU).
+    """
+    if not gpus:
+        return [{'name': base_name, 'port': base_port, 'url': f'http://localhost:{base_port}', 'gpu': None}]
+    return [{'name': f'{base_name}_GPU{gpu["index"]}', 'port': base_port + i, 'url': f'http://localhost:{base_port + i}', 'gpu': gpu}
+            for i, gpu in enumerate(gpus)]
+
+
+def describe(device):
+    free = f'{device["memory_free"] / 1024:.1f}' if device['memory_free'] is not None else '?'
+    total = f'{device["memory_total"] / 1024:.1f}' if device['memory_total'] is not None else '?'
+    return f'GPU {device["index"]}: {device["name"]} ({device["architecture_name"]}), {free}/{total} GiB free, {device["uuid"]}'
@@ -0,0 +1,48 @@
+import os, json, time, threading
+
+LOCKFILE_NAME = 'installmill.lock.json'
+
+
+class InstallLock:
+    """
+    Record of what every manifest row installed on the last successful run.
+
+    Entries are keyed by the manifest url and location and hold whatever is
+    needed to tell later whether the row changed: ETag/Last-Modified of a
+    download, the HF revision, the git commit, a fingerprint of a local script
+    and the digest and size of the output. The file is rewritten atomically
+    after every recorded row, so an interrupted run keeps what it finished.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+        self._data.setdefault('version', 1)
+        self._data.setdefault('rows', {})
+
+    @staticmethod
+    def key(url, location):
+        return f'{url}|{location}'
+
+    def get(self, url, location):
+        with self._lock:
+            return dict(self._data['rows'].get(self.key(url, location), {}))
+
+    def record(self, url, location, entry):
+        """Replace the entry for a row and save the lockfile."""
+        entry = {k: v for k, v in entry.items() if v is not None}
+        entry['installed_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with self._lock:
+            self._data['rows'][self.key(url, location)] = entry
+            self._save()
+
+    def _save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._data, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
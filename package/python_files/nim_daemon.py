@@ -0,0 +1,323 @@
+"""
+Keeps the FLUX NIM container warm while it is in use.
+
+The daemon starts the container on request, tracks the last time a client
+asked for it and stops it once it has been idle for longer than the idle TTL
+to give back VRAM and RAM. Clients call the local API before generating
+instead of paying the cold start every session:
+
+    POST /start[?wait=1&timeout=<s>]   start (or keep) the container, counts as use
+    POST /touch                        count as use without starting
+    POST /stop                         stop the container now
+    GET  /status                       state, idle time and time to ready
+
+Usage:
+    python nim_daemon.py serve --idle-ttl-minutes 30
+    python nim_daemon.py start --wait
+    python nim_daemon.py status
+    python nim_daemon.py serve --gpu 1 --port 8766
+"""
+import os, sys, json, time, argparse, threading, urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The embedded Python does not put the script folder on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import requests
+from nim_readiness import DEFAULT_URL, LogReader, wait_until_ready
+from container_runtime import default_runner
+
+DEFAULT_PORT = 8765
+DEFAULT_IDLE_TTL = 30 * 60
+REAP_INTERVAL = 15
+
+
+class NimManager:
+    """
+    Lifecycle of one NIM container: stopped, starting, ready or failed.
+
+    Args:
+        runner: Container runner (see container_runtime), a fake one in tests.
+        command_factory: Returns the bash command that starts the container, called on every start.
+        name (str): Container name.
+        base_url (str): Root of the container's API, polled for readiness.
+        idle_ttl (float): Seconds without use after which a ready container is stopped (0 keeps it running).
+        ready_timeout (float): Seconds a start may take.
+        log_path (str): File the container output is appended to.
+        clock: Monotonic clock, replaceable in tests.
+    """
+
+    def __init__(self, runner, command_factory, name='FLUX_DEPTH', base_url=DEFAULT_URL, idle_ttl=DEFAULT_IDLE_TTL,
+                 ready_timeout=3600, log_path=None, clock=time.monotonic):
+        self.runner = runner
+        self.command_factory = command_factory
+        self.name = name
+        self.base_url = base_url
+        self.idle_ttl = idle_ttl
+        self.ready_timeout = ready_timeout
+        self.log_path = log_path
+        self.clock = clock
+        self.state = 'stopped'
+        self.error = None
+        self.ready_seconds = None
+        self.last_request = None
+        self.process = None
+        self.reader = None
+        self._log_file = None
+        # Bumped by every start and stop, a start that was overtaken drops its result
+        self._generation = 0
+        self._cond = threading.Condition()
+        # Held while a container is launched or stopped, so a stop never runs between the two halves of a launch
+        self._lifecycle = threading.Lock()
+
+    def touch(self):
+        with self._cond:
+            self.last_request = self.clock()
+
+    def start(self, wait=False, timeout=None):
+        """
+        Start the container unless it is starting or ready, and count it as used.
+
+        Args:
+            wait (bool): Block until it is ready or failed.
+            timeout (float): Upper bound of the wait.
+
+        Returns:
+            dict: The status afterwards.
+        """
+        with self._cond:
+            self.last_request = self.clock()
+            if self.state not in ('starting', 'ready'):
+                self._generation += 1
+                self.state = 'starting'
+                self.error = None
+                self.ready_seconds = None
+                threading.Thread(target=self._launch, args=(self._generation,), daemon=True).start()
+            if wait:
+                self._cond.wait_for(lambda: self.state != 'starting', timeout)
+        return self.status()
+
+    def _launch(self, generation):
+        try:
+            with self._lifecycle:
+                # A stop that came in before the launch got here wins, nothing is started
+                with self._cond:
+                    if generation != self._generation:
+                        return
+                # A container left running by an earlier daemon is adopted instead of started again
+                if self.runner.running(self.name):
+                    print(f'{self.name} is already running, waiting for it to be ready')
+                    process = reader = None
+                else:
+                    process = self.runner.launch(self.command_factory())
+                    self._log_file = log_file = open(self.log_path, 'a', buffering=1) if self.log_path else None
+                    callbacks = [lambda line: log_file.write(line + '\n')] if log_file else []
+                    reader = LogReader(process.stdout, callbacks).start()
+                with self._cond:
+                    self.process, self.reader = process, reader
+            # A stop from here on finds the process and stops it, the wait below then ends early
+            result = wait_until_ready(self.base_url, self.ready_timeout, process, reader)
+        except Exception as e:
+            result = None
+            error = f'{type(e).__name__}: {e}'
+        with self._cond:
+            if generation != self._generation:
+                return
+            if result is not None and result.ready:
+                self.state = 'ready'
+                self.ready_seconds = result.seconds
+                print(f'{self.name} ready after {result.seconds:.1f} s')
+            else:
+                self.state = 'failed'
+                self.error = result.reason if result is not None else error
+                print(f'{self.name} did not start: {self.error}')
+            self._cond.notify_all()
+            failed = self.state == 'failed'
+        if failed:
+            with self._lifecycle:
+                # Unless a new start took over in the meantime
+                if generation == self._generation:
+                    self._stop_container()
+
+    def stop(self, reason='requested'):
+        with self._cond:
+            was = self.state
+            self._generation += 1
+            self.state = 'stopped'
+            self._cond.notify_all()
+        if was != 'stopped':
+            print(f'Stopping {self.name} ({reason})')
+        # Waits for a launch in progress, so the container it starts is stopped too
+        with self._lifecycle:
+            self._stop_container()
+        return self.status()
+
+    def _stop_container(self):
+        self.runner.stop(self.name)
+        process = self.process
+        if process is not None:
+            try:
+                process.wait(timeout=30)
+            except Exception:
+                process.kill()
+        self.process = None
+        if self.reader is not None:
+            self.reader.join(5)
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def idle_seconds(self):
+        with self._cond:
+            return None if self.last_request is None else self.clock() - self.last_request
+
+    def reap(self):
+        """Stop the container if it is ready and idle past the TTL. Returns True if it was stopped."""
+        idle = self.idle_seconds()
+        if self.idle_ttl and self.state == 'ready' and idle is not None and idle > self.idle_ttl:
+            self.stop(f'idle for {idle / 60:.1f} minutes')
+            return True
+        return False
+
+    def run_reaper(self, interval=REAP_INTERVAL):
+        """Call reap() every interval seconds from a daemon thread. Returns the Event that stops it."""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.reap()
+                except Exception as e:
+                    print(f'Idle check failed: {e}')
+
+        threading.Thread(target=run, daemon=True).start()
+        return stop
+
+    def status(self):
+        idle = self.idle_seconds()
+        with self._cond:
+            return {'name': self.name, 'state': self.state, 'url': self.base_url, 'error': self.error,
+                    'ready_seconds': None if self.ready_seconds is None else round(self.ready_seconds, 1),
+                    'idle_seconds': None if idle is None else round(idle, 1), 'idle_ttl': self.idle_ttl,
+                    'log_tail': self.reader.tail(5) if self.reader and self.state != 'ready' else []}
+
+
+def make_server(manager, host='127.0.0.1', port=DEFAULT_PORT):
+    """HTTP server exposing the manager's start, touch, stop and status. Call serve_forever() on it."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, payload):
+            code = {'ready': 200, 'starting': 202, 'stopped': 200, 'failed': 500}.get(payload.get('state'), 200)
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urllib.parse.urlsplit(self.path).path == '/status':
+                self._reply(manager.status())
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            parts = urllib.parse.urlsplit(self.path)
+            query = urllib.parse.parse_qs(parts.query)
+            match parts.path:
+                case '/start':
+                    timeout = float(query['timeout'][0]) if 'timeout' in query else None
+                    self._reply(manager.start(query.get('wait', ['0'])[0] == '1', timeout))
+                case '/touch':
+                    manager.touch()
+                    self._reply(manager.status())
+                case '/stop':
+                    self._reply(manager.stop())
+                case _:
+                    self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def flux_command_factory(runner, placement=None):
+    """Command factory for the FLUX_DEPTH container (or the placed one), fetching the NGC key and HF token on every start."""
+    import run_ngc_podman_flux
+
+    def command():
+        hftoken = os.environ.get('HF_TOKEN')
+        if not hftoken:
+            raise RuntimeError('HF_TOKEN environment variable is not set')
+        return run_ngc_podman_flux.container_command(run_ngc_podman_flux.get_ngc_key(), hftoken, runner, placement)
+    return command
+
+
+def gpu_placement(gpu):
+    """Placement of the container for one GPU, named and numbered like run_ngc_podman_flux.py --gpus each."""
+    import run_ngc_podman_flux
+    import gpu_inventory
+    devices = run_ngc_podman_flux.get_gpu_inventory()
+    chosen = gpu_inventory.select_gpus(devices, gpu)
+    if len(chosen) != 1:
+        raise ValueError(f'--gpu takes one GPU index or UUID, not {gpu}')
+    return next(p for p in gpu_inventory.placements(devices) if p['gpu']['uuid'] == chosen[0]['uuid'])
+
+
+def serve(args):
+    runner = default_runner()
+    log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shell_scripts', 'logs', 'flux_container.log')
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    if args.gpu is not None:
+        placement = gpu_placement(args.gpu)
+        manager = NimManager(runner, flux_command_factory(runner, placement), name=placement['name'], base_url=placement['url'],
+                             idle_ttl=args.idle_ttl_minutes * 60, ready_timeout=args.ready_timeout,
+                             log_path=log_path.replace('.log', f'_{placement["name"]}.log'))
+    else:
+        manager = NimManager(runner, flux_command_factory(runner), idle_ttl=args.idle_ttl_minutes * 60,
+                             ready_timeout=args.ready_timeout, log_path=log_path)
+    server = make_server(manager, port=args.port)
+    stop_reaper = manager.run_reaper()
+    print(f'NIM daemon for {manager.name} ({manager.base_url}) listening on http://127.0.0.1:{args.port} (idle TTL {args.idle_ttl_minutes:g} minutes)')
+    if args.start:
+        manager.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_reaper.set()
+        server.server_close()
+        if manager.state != 'stopped':
+            manager.stop('daemon shutting down')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the FLUX NIM container warm while it is in use.')
+    parser.add_argument('command', choices=['serve', 'start', 'touch', 'stop', 'status'])
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port of the local API.')
+    parser.add_argument('--idle-ttl-minutes', type=float, default=DEFAULT_IDLE_TTL / 60, help='Stop the container after this many minutes without use (0 never stops it).')
+    parser.add_argument('--ready-timeout', type=float, default=3600, help='Seconds a container start may take.')
+    parser.add_argument('--start', action='store_true', help='serve: start the container right away.')
+    parser.add_argument('--gpu', default=None, help='serve: run the container on this GPU (index or UUID) with its own name and port, one daemon (and --port) per GPU.')
+    parser.add_argument('--wait', action='store_true', help='start: return once the container is ready.')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args)
+        return
+    url = f'http://127.0.0.1:{args.port}/{args.command}'
+    try:
+        if args.command == 'status':
+            response = requests.get(url, timeout=10)
+        else:
+            response = requests.post(url, params={'wait': '1'} if args.wait else None, timeout=None if args.wait else 30)
+    except requests.ConnectionError:
+        print(f'The NIM daemon is not running on port {args.port}, start it with: python nim_daemon.py serve')
+        sys.exit(1)
+    print(json.dumps(response.json(), indent=1))
+    sys.exit(0 if response.status_code < 300 else 1)
+
+
+if __name__ == "__main__":
+    main()
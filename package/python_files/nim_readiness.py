@@ -0,0 +1,136 @@
+import time, threading, collections
+import requests
+
+import transport
+
+# NIM containers serve their API and health checks on port 8000
+DEFAULT_URL = 'http://localhost:8000'
+LIVE_PATH = '/v1/health/live'
+READY_PATH = '/v1/health/ready'
+# Log line printed once the endpoints are up, it only makes the next poll happen sooner
+SERVING_MARKER = 'Serving endpoints:'
+
+
+class LogReader:
+    """
+    Consumes the output of a container process on a background thread.
+
+    Every line goes to the callbacks (log file, console) and into a bounded
+    buffer holding the last max_lines, so a chatty container never blocks on
+    a full pipe and a silent one never blocks the caller.
+    """
+
+    def __init__(self, stream, callbacks=(), max_lines=200, marker=SERVING_MARKER):
+        self.stream = stream
+        self.callbacks = list(callbacks)
+        self.lines = collections.deque(maxlen=max_lines)
+        self.marker = marker
+        # Set when the marker shows up, and when the stream ends
+        self.wake = threading.Event()
+        self.eof = threading.Event()
+        self.marker_seen = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for line in self.stream:
+                line = line.rstrip('\r\n')
+                if not line:
+                    continue
+                with self._lock:
+                    self.lines.append(line)
+                for callback in self.callbacks:
+                    callback(line)
+                if self.marker and self.marker in line:
+                    self.marker_seen = True
+                    self.wake.set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.eof.set()
+            self.wake.set()
+
+    def tail(self, n=20):
+        with self._lock:
+            return list(self.lines)[-n:]
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+
+class ReadyResult:
+    """Outcome of wait_until_ready: ready, seconds waited, seconds until live and why it stopped waiting."""
+
+    def __init__(self, ready, seconds, reason, live_seconds=None):
+        self.ready = ready
+        self.seconds = seconds
+        self.reason = reason
+        self.live_seconds = live_seconds
+
+    def __repr__(self):
+        return f'ReadyResult(ready={self.ready}, seconds={self.seconds:.1f}, reason={self.reason!r})'
+
+
+def probe(client, url, timeout):
+    """True if url answers 200, False if it answers anything else or not at all."""
+    try:
+        return client.get(url, timeout=timeout).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def wait_until_ready(base_url=DEFAULT_URL, timeout=3600, process=None, reader=None, poll_interval=2.0,
+                     request_timeout=5.0, client=None, clock=time.monotonic):
+    """
+    Poll the NIM health endpoints until the service is ready or the deadline passes.
+
+    The live endpoint is polled until the server answers, then the ready
+    endpoint until the model is loaded. No wait and no request runs past the
+    deadline. Waiting stops early when the process exits or its output ends.
+
+    Args:
+        base_url (str): Root of the NIM API.
+        timeout (float): Seconds until the deadline.
+        process: The container process, anything with poll().
+        reader (LogReader): Log reader of the process, its marker triggers an early poll.
+        poll_interval (float): Seconds between polls.
+        request_timeout (float): Upper bound of one health request.
+        client (transport.Transport): Client used for the polls, one without retries by default so
+            a poll never outlasts request_timeout.
+        clock: Monotonic clock, replaceable in tests.
+
+    Returns:
+        ReadyResult: ready, seconds until ready (or until it gave up) and the reason.
+    """
+    client = client or transport.Transport(retries=0, pool_size=1)
+    start = clock()
+    deadline = start + timeout
+    live_seconds = None
+    while True:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return ReadyResult(False, clock() - start, f'not ready within {timeout:g} seconds', live_seconds)
+        if process is not None and process.poll() is not None:
+            return ReadyResult(False, clock() - start, f'container process exited with code {process.returncode}', live_seconds)
+        if reader is not None and reader.eof.is_set() and process is None:
+            return ReadyResult(False, clock() - start, 'container output ended', live_seconds)
+
+        path = READY_PATH if live_seconds is not None else LIVE_PATH
+        if probe(client, base_url + path, min(request_timeout, remaining)):
+            if live_seconds is None:
+                live_seconds = clock() - start
+                continue
+            return ReadyResult(True, clock() - start, 'ready', live_seconds)
+
+        pause = min(poll_interval, deadline - clock())
+        if pause > 0:
+            if reader is not None and not reader.eof.is_set():
+                reader.wake.wait(pause)
+                reader.wake.clear()
+            else:
+                time.sleep(pause)
@@ -0,0 +1,156 @@
+import io, os, json, mmap, time, struct, hashlib
+
+# Header: magic, format version, offset and length of the JSON index at the end of the file
+MAGIC = b'IMBUNDLE'
+VERSION = 1
+HEADER = struct.Struct('<8sIQQ')
+CHUNK = 16 * 1024 * 1024
+
+
+def row_key(url, location):
+    return f'{url}|{location}'
+
+
+class BundleWriter:
+    """
+    Writes an install bundle: a header, the member data back to back and a JSON index.
+
+    The index maps every manifest row to its kind and members, each member
+    recorded with its offset, size and sha256, so a reader can find any
+    member without scanning the file. The bundle is written to a temporary
+    name and renamed into place by close().
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.tmp = self.path + '.tmp'
+        self._f = open(self.tmp, 'wb')
+        self._f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        self.rows = {}
+        # Members already written per source file, so rows sharing files store them once
+        self._written = {}
+
+    def add_file(self, src, name=None):
+        """
+        Append the file src as a member, or reuse it when the same unchanged file was added before.
+
+        Returns:
+            dict: The member: path (name), offset, size and sha256.
+        """
+        stat = os.stat(src)
+        source = (os.path.realpath(src), stat.st_size, stat.st_mtime_ns)
+        if source in self._written:
+            return dict(self._written[source], path=name if name is not None else os.path.basename(src))
+        offset = self._f.tell()
+        h = hashlib.sha256()
+        with open(src, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK), b''):
+                self._f.write(chunk)
+                h.update(chunk)
+        member = {'path': name if name is not None else os.path.basename(src), 'offset': offset,
+                  'size': self._f.tell() - offset, 'sha256': h.hexdigest()}
+        self._written[source] = member
+        return member
+
+    def add_row(self, url, location, entry):
+        """Record a manifest row with its kind and members, adding a digest of its content."""
+        members = entry.get('members', [])
+        entry['digest'] = hashlib.sha256((entry['kind'] + ''.join(m['sha256'] for m in members)).encode()).hexdigest()
+        self.rows[row_key(url, location)] = entry
+
+    def close(self, manifest):
+        """Write the index, with the manifest rows to install in order, and put the bundle in place."""
+        index = json.dumps({'version': VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                            'manifest': manifest, 'rows': self.rows}).encode()
+        index_offset = self._f.tell()
+        self._f.write(index)
+        self._f.seek(0)
+        self._f.write(HEADER.pack(MAGIC, VERSION, index_offset, len(index)))
+        self._f.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        self._f.close()
+        os.remove(self.tmp)
+
+
+class MemberReader(io.RawIOBase):
+    """Seekable read-only file object over one member of a memory-mapped bundle."""
+
+    def __init__(self, view, offset, size):
+        self._view = view
+        self._start = offset
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._size}[whence]
+        self._pos = max(0, base + pos)
+        return self._pos
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), self._size - self._pos))
+        start = self._start + self._pos
+        buffer[:n] = self._view[start:start + n]
+        self._pos += n
+        return n
+
+
+class Bundle:
+    """
+    Read-only access to an install bundle through a memory map.
+
+    Only the header and the index are read when the bundle is opened; members
+    are copied straight from the mapping when a row is installed.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._f = open(self.path, 'rb')
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_offset, index_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or index_offset == 0:
+            self.close()
+            raise ValueError(f'{self.path} is not an install bundle (or was not finished)')
+        self.index = json.loads(self._mm[index_offset:index_offset + index_length])
+
+    def manifest(self):
+        """The manifest rows (url, location, overwrite, options) the bundle was exported from."""
+        return self.index['manifest']
+
+    def row(self, url, location):
+        return self.index['rows'].get(row_key(url, location))
+
+    def open_member(self, member):
+        return io.BufferedReader(MemberReader(self._mm, member['offset'], member['size']), CHUNK)
+
+    def extract(self, member, dest):
+        """Write a member to dest, verifying its sha256, through a temporary file renamed into place."""
+        if os.path.dirname(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + '.bundle.tmp'
+        h = hashlib.sha256()
+        with open(tmp, 'wb') as f:
+            end = member['offset'] + member['size']
+            for start in range(member['offset'], end, CHUNK):
+                chunk = self._mm[start:min(start + CHUNK, end)]
+                f.write(chunk)
+                h.update(chunk)
+        if h.hexdigest() != member['sha256']:
+            os.remove(tmp)
+            raise ValueError(f'Bundle member {member["path"]} is corrupt (sha256 mismatch)')
+        os.replace(tmp, dest)
+        return member['size']
+
+    def close(self):
+        self._mm.close()
+        self._f.close()
@@ -0,0 +1,443 @@
+import os, sys, json, time, socket, threading, platform, contextlib, urllib.parse
+
+# Seconds between progress events of one task, and between redraws of the live display
+EVENT_INTERVAL = 1.0
+REDRAW_INTERVAL = 0.25
+
+
+class EventSink:
+    """
+    Writes events as JSON lines to a file or to a tcp://host:port socket.
+
+    A socket that goes away disables the sink with one warning, the install
+    carries on.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._lock = threading.Lock()
+        if target.startswith('tcp://'):
+            parts = urllib.parse.urlsplit(target)
+            self._sock = socket.create_connection((parts.hostname, parts.port), timeout=5)
+            self._file = None
+        else:
+            if os.path.dirname(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            self._sock = None
+            self._file = open(target, 'a', buffering=1, encoding='utf-8')
+
+    def write(self, event):
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._lock:
+            try:
+                if self._sock:
+                    self._sock.sendall(line.encode())
+                elif self._file:
+                    self._file.write(line)
+            except OSError as e:
+                print(f'Event sink {self.target} failed ({e}), no more events are sent to it')
+                self.close()
+
+    def close(self):
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class Task:
+    """
+    Byte progress of one transfer.
+
+    advance() only adds to a counter under a lock and checks the clock, a
+    progress event is emitted at most every EVENT_INTERVAL seconds, so calling
+    it per chunk costs about as much as the print('#') it replaces.
+
+    Used as a context manager the task is finished on the way out, with the
+    exception as its error if one is raised.
+    """
+
+    def __init__(self, reporter, name, total=None, row=None, **fields):
+        self.reporter = reporter
+        self.name = name
+        self.row = row
+        self.fields = fields
+        self.total = total
+        self.bytes = 0
+        # Bytes received over all attempts, unlike bytes it is not rewound by reset()
+        self.received = 0
+        self.started = time.monotonic()
+        self._base = 0
+        self._next_event = self.started + EVENT_INTERVAL
+        self._lock = threading.Lock()
+
+    def reset(self, done=0, total=None):
+        """Start over at done bytes, e.g. after a retry or when resuming a partial file."""
+        with self._lock:
+            self.bytes = self._base = done
+            self.total = total
+            self.started = time.monotonic()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    def advance(self, n):
+        with self._lock:
+            self.bytes += n
+            self.received += n
+            now = time.monotonic()
+            if now < self._next_event:
+                return
+            self._next_event = now + EVENT_INTERVAL
+        self.reporter.emit('progress', row=self.row, name=self.name, **self.snapshot())
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return (self.bytes - self._base) / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        rate = self.rate()
+        eta = (self.total - self.bytes) / rate if self.total and rate else None
+        return {'bytes': self.bytes, 'total': self.total, 'rate': round(rate), 'eta': None if eta is None else round(eta, 1)}
+
+    def done(self, error=None):
+        self.reporter.finish(self, error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.done(error=None if exc is None else str(exc) or exc_type.__name__)
+
+
+class ProgressReporter:
+    """Fans progress of rows and transfers out to the event sink and the live display."""
+
+    def __init__(self):
+        self.sink = None
+        self.display = None
+        self._tasks = []
+        self._row_bytes = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def configure(self, events=None, live=None):
+        """
+        Args:
+            events (str): JSON lines target, a file path or tcp://host:port.
+            live (bool): Draw the live display, defaults to whether stdout is a terminal.
+        """
+        if events:
+            try:
+                self.sink = EventSink(events)
+            except OSError as e:
+                print(f'Could not open event sink {events}: {e}')
+        if live is None:
+            live = sys.stdout.isatty()
+        if live and self.display is None:
+            self.display = LiveDisplay(self)
+            self.display.start()
+
+    def close(self):
+        if self.display:
+            self.display.stop()
+            self.display = None
+        if self.sink:
+            self.sink.close()
+            self.sink = None
+
+    # The row a thread is working on, so events carry it without passing it around
+    def set_row(self, row):
+        self._local.row = row
+
+    def current_row(self):
+        return getattr(self._local, 'row', None)
+
+    def emit(self, event, row=None, **fields):
+        if self.sink is None:
+            return
+        payload = {'ts': round(time.time(), 3), 'event': event}
+        row = row if row is not None else self.current_row()
+        if row is not None:
+            payload['row'] = row
+        payload.update(fields)
+        self.sink.write(payload)
+
+    def task(self, name, total=None, **fields):
+        task = Task(self, name, total, self.current_row(), **fields)
+        with self._lock:
+            self._tasks.append(task)
+        self.emit('transfer_start', row=task.row, name=name, total=total, **fields)
+        return task
+
+    def finish(self, task, error=None):
+        with self._lock:
+            if task not in self._tasks:
+                return
+            self._tasks.remove(task)
+            if task.row is not None and not error:
+                self._row_bytes[task.row] = self._row_bytes.get(task.row, 0) + task.received
+        seconds = time.monotonic() - task.started
+        self.emit('transfer_end', row=task.row, name=task.name, bytes=task.bytes, received=task.received, seconds=round(seconds, 3),
+                  rate=round(task.rate()), error=error)
+
+    def active(self):
+        with self._lock:
+            return list(self._tasks)
+
+    @contextlib.contextmanager
+    def console(self):
+        """Hide the live display while a subprocess (winget, pip, cm-cli) writes to the console or prompts."""
+        display = self.display
+        if display:
+            display.suspend()
+        try:
+            yield
+        finally:
+            if display:
+                display.resume()
+
+    def row_bytes(self, row):
+        """Bytes received by the finished transfers of a row."""
+        with self._lock:
+            return self._row_bytes.get(row, 0)
+
+
+class _ConsoleProxy:
+    """Stands in for sys.stdout and sys.stderr while the live display is drawn, clearing the display before other output."""
+
+    def __init__(self, display, stream):
+        self._display = display
+        self._stream = stream
+
+    def write(self, text):
+        with self._display.lock:
+            self._display.clear()
+            return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class LiveDisplay:
+    """
+    Compact multi-row view of the running transfers at the bottom of the console.
+
+    One line per transfer with progress, size, rate and ETA, redrawn every
+    REDRAW_INTERVAL seconds by a background thread. Regular output keeps
+    scrolling above it. Between suspend() and resume() nothing is drawn, for
+    subprocesses that write to the console themselves.
+    """
+
+    def __init__(self, reporter, stream=None):
+        self.reporter = reporter
+        self.stream = stream or sys.stdout
+        self.err_stream = sys.stderr
+        self.lock = threading.RLock()
+        self._lines = 0
+        self._suspended = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if platform.system() == "Windows":
+            _enable_vt_mode()
+        sys.stdout = _ConsoleProxy(self, self.stream)
+        sys.stderr = _ConsoleProxy(self, self.err_stream)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        with self.lock:
+            self.clear()
+        sys.stdout = self.stream
+        sys.stderr = self.err_stream
+
+    def suspend(self):
+        with self.lock:
+            self._suspended += 1
+            self.clear()
+            self.stream.flush()
+
+    def resume(self):
+        with self.lock:
+            self._suspended -= 1
+
+    def clear(self):
+        if self._lines:
+            self.stream.write(f'\x1b[{self._lines}F\x1b[J')
+            self._lines = 0
+
+    def _run(self):
+        while not self._stop.wait(REDRAW_INTERVAL):
+            tasks = self.reporter.active()
+            with self.lock:
+                if self._suspended:
+                    continue
+                self.clear()
+                width = os.get_terminal_size(self.stream.fileno()).columns - 1 if self.stream.isatty() else 100
+                for task in tasks:
+                    self.stream.write(format_task(task, width) + '\n')
+                self._lines = len(tasks)
+                self.stream.flush()
+
+
+def format_task(task, width=100):
+    snap = task.snapshot()
+    mib = snap['bytes'] / 1024**2
+    rate = f'{snap["rate"] / 1024**2:6.1f} MiB/s'
+    if snap['total']:
+        fraction = min(1.0, snap['bytes'] / snap['total'])
+        bar = '#' * int(fraction * 20)
+        eta = '--:--' if snap['eta'] is None else time.strftime('%M:%S', time.gmtime(snap['eta']))
+        stats = f'[{bar:<20}] {fraction:4.0%} {mib:8.1f}/{snap["total"] / 1024**2:.1f} MiB {rate} ETA {eta}'
+    else:
+        stats = f'{mib:8.1f} MiB {rate}'
+    name = os.path.basename(task.name)
+    room = max(10, width - len(stats) - 2)
+    if len(name) > room:
+        name = name[:room - 3] + '...'
+    return f'{name:<{room}}  {stats}'[:width]
+
+
+def tqdm_class(task):
+    """
+    A tqdm stand-in feeding task, for the tqdm_class argument of hf_hub_download and snapshot_download.
+
+    hf_hub_download draws one byte bar per file, snapshot_download a transfer
+    and a reconstruction bar that both count every byte plus a bar of files.
+    The task follows the byte bar that is furthest along, other bars only keep
+    their count.
+
+    Returns:
+        type: The bar class, or None when nothing shows the task (no live
+        display and no event sink), huggingface_hub then draws its own bars.
+    """
+    reporter = task.reporter
+    if reporter.display is None and reporter.sink is None:
+        return None
+    bars = []
+    lock = threading.Lock()
+
+    def sync():
+        with lock:
+            byte_bars = [bar for bar in bars if bar.unit == 'B']
+            n = max((bar.n for bar in byte_bars), default=0)
+            # The transfer bar pads its total as it goes, the smallest one is the real size
+            total = min((bar.total for bar in byte_bars if bar.total), default=None)
+            if total and total != task.total:
+                task.set_total(total)
+            if n > task.bytes:
+                task.advance(n - task.bytes)
+
+    class TaskBar:
+        def __init__(self, iterable=None, desc=None, total=None, initial=0, unit='it', **kwargs):
+            self.iterable = iterable
+            self.desc = desc
+            self.unit = unit
+            self.n = initial or 0
+            self._total = total
+            self.format_dict = {'rate': None}
+            with lock:
+                bars.append(self)
+            sync()
+
+        @property
+        def total(self):
+            return self._total
+
+        @total.setter
+        def total(self, total):
+            self._total = total
+            sync()
+
+        def update(self, n=1):
+            self.n += n or 0
+            sync()
+
+        def reset(self, total=None):
+            self.n = 0
+            self.total = total
+
+        def __iter__(self):
+            for item in self.iterable:
+                yield item
+                self.update(1)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc, traceback):
+            self.close()
+
+        def close(self):
+            pass
+
+        def refresh(self, *args, **kwargs):
+            pass
+
+        def clear(self, *args, **kwargs):
+            pass
+
+        def set_description(self, desc=None, refresh=True):
+            self.desc = desc
+
+        set_description_str = set_description
+
+        def set_postfix_str(self, s='', refresh=True):
+            pass
+
+        def set_postfix(self, *args, **kwargs):
+            pass
+
+    return TaskBar
+
+
+def _enable_vt_mode():
+    """Let the Windows console interpret the ANSI cursor movement the display uses."""
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.GetStdHandle(-11)
+    mode = ctypes.c_uint32()
+    if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+        kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+
+
+_default = ProgressReporter()
+
+
+def configure(events=None, live=None):
+    _default.configure(events, live)
+
+
+def close():
+    _default.close()
+
+
+def set_row(row):
+    _default.set_row(row)
+
+
+def emit(event, **fields):
+    _default.emit(event, **fields)
+
+
+def task(name, total=None, **fields):
+    return _default.task(name, total, **fields)
+
+
+def console():
+    return _default.console()
+
+
+def row_bytes(row):
+    return _default.row_bytes(row)
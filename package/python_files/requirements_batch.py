@@ -0,0 +1,220 @@
+import os, re, sys, json, tempfile, subprocess
+from importlib import metadata
+from pathlib import Path
+
+try:
+    from packaging.requirements import Requirement, InvalidRequirement
+    from packaging.utils import canonicalize_name
+except ImportError:
+    # ComfyUI's embedded Python always has pip, which vendors packaging
+    from pip._vendor.packaging.requirements import Requirement, InvalidRequirement
+    from pip._vendor.packaging.utils import canonicalize_name
+
+from artifact_cache import default_cache_dir
+
+# Nested requirement files in every spelling pip takes: -r x, -rx, --requirement x, --requirement=x
+NESTED_RE = re.compile(r'^(?:-r\s*|--requirement(?:\s*=\s*|\s+))(\S.*)$')
+# Options whose value is a path, resolved by pip against its working directory
+PATH_OPTION_RE = re.compile(r'^(-e|--editable|-c|--constraint|-f|--find-links)(?:\s*=\s*|\s*)(\S.*)$')
+URL_PREFIXES = ('git+', 'hg+', 'svn+', 'bzr+')
+ARCHIVE_SUFFIXES = ('.whl', '.zip', '.tar.gz', '.tgz')
+# Passthrough lines that install something, every other option only steers the resolver
+INSTALL_OPTIONS = ('-e', '--editable')
+# Installable passthrough lines of the last successful pip run, kept in the custom nodes folder
+STAMP_FILE = '.installmill_requirements.json'
+
+
+def installed_version(name):
+    """Version of an installed distribution, looked up in-process, or None if it is not installed."""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def is_installed(name):
+    return installed_version(name) is not None
+
+
+def _is_url(value):
+    return '://' in value or value.startswith(URL_PREFIXES)
+
+
+def absolute_paths(line, base):
+    """
+    line with a relative path in it made absolute against base.
+
+    Custom nodes write their requirements for pip started in their own folder
+    (-e ., ./vendor/pkg, -c constraints.txt). The merged file is installed from
+    elsewhere, so those paths are resolved against the folder of the file they
+    came from. URLs, absolute paths and option-only lines are returned as they are.
+    """
+    match = PATH_OPTION_RE.match(line)
+    option, value = match.groups() if match else (None, line)
+    # Extras stay after the path: ./pkg[gpu]
+    path, extras = re.match(r'^([^\[]*)(.*)$', value).groups()
+    if _is_url(path) or os.path.isabs(path):
+        return line
+    if option is None:
+        if line.startswith('-') or not (path.startswith('.') or '/' in path or '\\' in path or path.endswith(ARCHIVE_SUFFIXES)):
+            return line
+    path = os.path.normpath(os.path.join(base, path))
+    value = path + extras
+    return f'{option} {value}' if option else value
+
+
+def read_requirements(path):
+    """
+    Parse a requirements file.
+
+    Returns:
+        tuple: (requirements, passthrough) where requirements is a list of
+        packaging Requirement objects and passthrough lists the lines pip has
+        to see as-is (options, -e, URLs and paths), relative paths made
+        absolute. Nested -r files are read in place.
+    """
+    requirements, passthrough = [], []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split(' #', 1)[0].strip()
+            if not line or line.startswith('#'):
+                continue
+            nested = NESTED_RE.match(line)
+            if nested:
+                nested_reqs, nested_pass = read_requirements(Path(base, nested.group(1).strip()))
+                requirements += nested_reqs
+                passthrough += nested_pass
+                continue
+            try:
+                requirements.append(Requirement(line))
+            except InvalidRequirement:
+                passthrough.append(absolute_paths(line, base))
+    return requirements, passthrough
+
+
+def collect_requirements(custom_nodes_dir):
+    """
+    Read requirements.txt of every custom node below custom_nodes_dir.
+
+    Returns:
+        tuple: (by_name, passthrough) where by_name maps a canonical
+        distribution name to a list of (node, Requirement) and passthrough is a
+        list of (node, line).
+    """
+    by_name, passthrough = {}, []
+    for node in sorted(os.listdir(custom_nodes_dir)):
+        req_file = Path(custom_nodes_dir, node, 'requirements.txt')
+        if not req_file.is_file():
+            continue
+        requirements, lines = read_requirements(req_file)
+        for req in requirements:
+            if req.marker is not None and not req.marker.evaluate():
+                continue
+            by_name.setdefault(canonicalize_name(req.name), []).append((node, req))
+        passthrough += [(node, line) for line in lines]
+    return by_name, passthrough
+
+
+def find_conflicts(by_name):
+    """
+    Find packages that custom nodes pin to incompatible versions.
+
+    Two requirements conflict when one pins an exact version (==) the other's
+    specifier rejects. Open ranges that never overlap are left to pip's
+    resolver.
+
+    Returns:
+        list: Human readable conflict descriptions.
+    """
+    conflicts = []
+    for name, reqs in by_name.items():
+        for node, req in reqs:
+            for spec in req.specifier:
+                if spec.operator not in ('==', '==='):
+                    continue
+                for other_node, other in reqs:
+                    if other is not req and not other.specifier.contains(spec.version, prereleases=True):
+                        conflicts.append(f'{name}: {node} requires {req.specifier}, {other_node} requires {other.specifier}')
+    return sorted(set(conflicts))
+
+
+def unsatisfied(by_name):
+    """Requirements whose installed version does not satisfy every custom node's specifier."""
+    missing = []
+    for name, reqs in by_name.items():
+        version = installed_version(name)
+        if version is None or not all(req.specifier.contains(version, prereleases=True) for _, req in reqs):
+            missing.append(name)
+    return missing
+
+
+def installs_something(line):
+    """True for passthrough lines that name something to install, False for resolver options."""
+    return not line.startswith('-') or line.split(None, 1)[0].split('=', 1)[0] in INSTALL_OPTIONS
+
+
+def read_stamp(custom_nodes_dir):
+    try:
+        with open(Path(custom_nodes_dir, STAMP_FILE), 'r', encoding='utf-8') as f:
+            return set(json.load(f).get('installed', []))
+    except (OSError, ValueError, AttributeError):
+        return set()
+
+
+def write_stamp(custom_nodes_dir, lines):
+    try:
+        with open(Path(custom_nodes_dir, STAMP_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'installed': sorted(lines)}, f, indent=1)
+    except OSError as e:
+        print(f'Could not record the installed requirements: {e}')
+
+
+def pip_install(args, cache_dir=None):
+    """Run one pip install in this interpreter with a persistent cache shared across install folders."""
+    cache_dir = cache_dir or default_cache_dir() / 'pip'
+    return subprocess.call([sys.executable, '-m', 'pip', 'install', '--cache-dir', str(cache_dir), *args])
+
+
+def install_custom_node_requirements(custom_nodes_dir, cache_dir=None):
+    """
+    Install the requirements of all custom nodes with a single pip resolver pass.
+
+    Conflicting pins are reported and nothing is installed. Requirements that
+    are already satisfied are checked in-process and pip is not started at all
+    when every one of them is and the lines pip has to install itself (-e,
+    URLs, paths) were all installed by an earlier successful run, as recorded
+    in STAMP_FILE. The merged requirements file is a temporary file of this run.
+
+    Returns:
+        bool: True if everything is installed.
+    """
+    by_name, passthrough = collect_requirements(custom_nodes_dir)
+    conflicts = find_conflicts(by_name)
+    if conflicts:
+        print('Conflicting custom node requirements, nothing was installed:')
+        for conflict in conflicts:
+            print(f'  {conflict}')
+        return False
+
+    missing = unsatisfied(by_name)
+    lines = list(dict.fromkeys(line for _, line in passthrough))
+    installable = {line for line in lines if installs_something(line)}
+    if not missing and installable <= read_stamp(custom_nodes_dir):
+        print(f'All {len(by_name)} custom node requirements are already satisfied.')
+        return True
+
+    for name in missing:
+        lines += sorted({str(req) for _, req in by_name[name]})
+    fd, merged = tempfile.mkstemp(prefix='custom_nodes_requirements_', suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        print(f'Installing {len(missing)} of {len(by_name)} custom node requirements'
+              f'{f" and {len(installable)} local or URL requirements" if installable else ""} in one pass')
+        ok = pip_install(['-r', merged], cache_dir and Path(cache_dir, 'pip')) == 0
+    finally:
+        os.remove(merged)
+    if ok:
+        write_stamp(custom_nodes_dir, installable)
+    return ok
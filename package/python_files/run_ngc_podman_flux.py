@@ -3,9 +3,11 @@ import os
 from pathlib import Path
 import logging
 import sys
-import re
 import traceback
 import time
+import json
+import base64
+import argparse
 
 # Setup logging with explicit console and file handlers
 logger = logging.getLogger(__name__)
@@ -19,87 +21,89 @@ file_handler.setLevel(logging.DEBUG)
 file_handler.setFormatter(formatter)
 logger.handlers = [console_handler, file_handler]
 
+# The embedded Python does not put the script folder on sys.path, the shared helpers live there
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
 try:
     import pynvml
     import requests
+    import transport
+    from nim_readiness import LogReader, wait_until_ready
+    from container_runtime import default_runner
+    from artifact_cache import default_cache_dir
+    import gpu_inventory
 except ImportError as e:
     logger.error(f"Missing dependency: {e}")
     print(f"Error: Missing dependency: {e}")
     print("Please install required packages: pip install pynvml requests")
     sys.exit(1)
 
+# The last issued NGC token and its expiry, so warm launches skip GPU probing and the token service
+NGC_CACHE_FILE = default_cache_dir() / "ngc_token.json"
+# Tokens are renewed this long before they expire, the container still has to log in and pull with it
+TOKEN_EXPIRY_MARGIN = 10 * 60
+# Lifetime assumed when the token service gives none
+DEFAULT_TOKEN_TTL = 30 * 60
+
+_device_info = None
+
 # Functions from ngc.py
+def fingerprint(device):
+    """The device fields the NGC token service takes, with a PDI derived from the UUID."""
+    fakePdi = int(hash(device['uuid']) % 2**64)
+    return {
+        'uuid': device['uuid'],
+        'pdi': f"0x{format(fakePdi, 'X')}",
+        'name': device['name'],
+        'brand': device['brand'],
+        'architecture': device['architecture'],
+        'pci_device_id': device['pci_device_id'],
+    }
+
 def get_device_info_nvml():
     logger.debug("Attempting to get device info via NVML")
     try:
-        pynvml.nvmlInit()
-        deviceCount = pynvml.nvmlDeviceGetCount()
-        deviceInfo = []
-        for i in range(deviceCount):
-            handle = pynvml.nvmlDeviceGetHandleByIndex(i)
-            uuid = pynvml.nvmlDeviceGetUUID(handle)
-            name = pynvml.nvmlDeviceGetName(handle)
-            brand = pynvml.nvmlDeviceGetBrand(handle)
-            architecture = pynvml.nvmlDeviceGetArchitecture(handle)
-            pciDeviceId = pynvml.nvmlDeviceGetPciInfo(handle).pciDeviceId
-            pciDeviceId_64bit = format(pciDeviceId, 'X')
-            fakePdi = int(hash(uuid) % 2**64)
-            pdi_64bit = format(fakePdi, 'X')
-            deviceInfo.append({
-                'uuid': uuid,
-                'pdi': f"0x{pdi_64bit}",
-                'name': name,
-                'brand': brand,
-                'architecture': architecture,
-                'pci_device_id': f"0x{pciDeviceId_64bit}",
-            })
-        pynvml.nvmlShutdown()
+        deviceInfo = [fingerprint(device) for device in gpu_inventory.inventory_nvml(pynvml)]
         logger.debug(f"NVML device info: {deviceInfo}")
         return deviceInfo
     except pynvml.NVMLError as e:
         logger.warning(f"NVML Error: {e}")
-        pynvml.nvmlShutdown()
         return []
     except Exception as e:
         logger.error(f"Unexpected error in get_device_info_nvml: {e}")
         return []
 
 def get_device_info_smi():
+    """Fallback for when NVML is not available: one entry per GPU from the compact nvidia-smi --query-gpu CSV."""
     logger.debug("Attempting to get device info via nvidia-smi")
     try:
-        output = subprocess.check_output(['nvidia-smi', '-q'], text=True)
-        deviceInfo = []
-        uuid_pattern = re.compile(r"GPU UUID\s*:\s*(.+)")
-        pdi_pattern = re.compile(r"PDI\s*:\s*(.+)")
-        name_pattern = re.compile(r"Product Name\s*:\s*(.+)")
-        brand_pattern = re.compile(r"Product Brand\s*:\s*(.+)")
-        arch_pattern = re.compile(r"Product Architecture\s*:\s*(.+)")
-        pci_pattern = re.compile(r"Device Id\s*:\s*(.+)")
-
-        matches = {
-            "uuid": uuid_pattern.search(output),
-            "pdi": pdi_pattern.search(output),
-            "name": name_pattern.search(output),
-            "brand": brand_pattern.search(output),
-            "architecture": arch_pattern.search(output),
-            "pci_device_id": pci_pattern.search(output),
-        }
-
-        if not matches["pdi"] and matches["uuid"]:
-            fakePdi = int(hash(matches["uuid"].group(1).strip()) % 2**64)
-            pdi_64bit = format(fakePdi, 'X')
-            matches["pdi"] = re.match(r"(.+)", f"0x{pdi_64bit}")
-
-        deviceInfo.append({k: (m.group(1).strip() if m else "Unknown") for k, m in matches.items()})
+        deviceInfo = [fingerprint(device) for device in gpu_inventory.inventory_smi()]
         logger.debug(f"SMI device info: {deviceInfo}")
         return deviceInfo
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
         logger.warning(f"nvidia-smi error: {e}")
         return []
     except Exception as e:
         logger.error(f"Unexpected error in get_device_info_smi: {e}")
         return []
 
+def get_gpu_inventory():
+    """Every GPU with free VRAM, architecture and UUID, from NVML or else nvidia-smi."""
+    try:
+        return gpu_inventory.inventory_nvml(pynvml)
+    except pynvml.NVMLError as e:
+        logger.warning(f"NVML Error: {e}, using nvidia-smi")
+        return gpu_inventory.inventory_smi()
+
+def get_device_info():
+    """Device fingerprint from NVML, or from nvidia-smi when NVML fails. Probed once per process."""
+    global _device_info
+    if _device_info is None:
+        start = time.monotonic()
+        _device_info = get_device_info_nvml() or get_device_info_smi()
+        logger.debug(f"Probed GPU device info in {time.monotonic() - start:.2f} s")
+    return _device_info
+
 def get_ngc_key_from_device_info(deviceInfo):
     logger.debug("Attempting to fetch NGC API key")
     ngcKeyServiceUrl = 'https://nts.ngc.nvidia.com/v1/token'
@@ -110,10 +114,12 @@ def get_ngc_key_from_device_info(deviceInfo):
         "device": deviceInfo[0] if deviceInfo else {}
     }
     try:
-        response = requests.post(ngcKeyServiceUrl, headers={'Accept': 'application/json'}, json=payload)
+        response = transport.post(ngcKeyServiceUrl, headers={'Accept': 'application/json'}, json=payload)
         response.raise_for_status()
         keyData = response.json()
         logger.debug("Successfully fetched NGC API key")
+        if keyData.get('access_token'):
+            save_cached_token(keyData['access_token'], token_expiry(keyData))
         return keyData.get('access_token')
     except requests.RequestException as e:
         logger.error(f"Error fetching API key: {e}")
@@ -122,64 +128,147 @@ def get_ngc_key_from_device_info(deviceInfo):
         logger.error(f"Unexpected error in get_ngc_key_from_device_info: {e}")
         return None
 
+def token_expiry(keyData):
+    """Epoch seconds the token expires at: expires_in from the service, the exp claim of a JWT, or DEFAULT_TOKEN_TTL."""
+    if keyData.get('expires_in'):
+        return time.time() + float(keyData['expires_in'])
+    token = keyData.get('access_token', '')
+    if token.count('.') == 2:
+        try:
+            claims = token.split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(claims + '=' * (-len(claims) % 4)))
+            if 'exp' in claims:
+                return float(claims['exp'])
+        except (ValueError, TypeError):
+            pass
+    return time.time() + DEFAULT_TOKEN_TTL
+
+def load_cached_token():
+    """The cached token while it has more than TOKEN_EXPIRY_MARGIN left, otherwise None."""
+    try:
+        with open(NGC_CACHE_FILE, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('expires_at', 0) - TOKEN_EXPIRY_MARGIN > time.time() and cached.get('access_token'):
+        return cached
+    return None
+
+def save_cached_token(access_token, expires_at):
+    try:
+        NGC_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = str(NGC_CACHE_FILE) + '.tmp'
+        # The token is a credential, keep it readable by the user only
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump({'access_token': access_token, 'expires_at': expires_at}, f)
+        os.replace(tmp, NGC_CACHE_FILE)
+    except OSError as e:
+        logger.warning(f"Could not cache the NGC API key: {e}")
+
 def get_ngc_key():
     logger.debug("Starting get_ngc_key")
-    deviceInfoNvml = get_device_info_nvml()
-    deviceInfoSmi = get_device_info_smi()
-    if not deviceInfoNvml and not deviceInfoSmi:
+    cached = load_cached_token()
+    if cached:
+        logger.info(f"Using the cached NGC API key, valid for {(cached['expires_at'] - time.time()) / 60:.0f} more minutes")
+        return cached['access_token']
+    deviceInfo = get_device_info()
+    if not deviceInfo:
         logger.error("No device info available from NVML or nvidia-smi")
         raise Exception("No GPU device info available")
-    key = get_ngc_key_from_device_info(deviceInfoNvml)
+    key = get_ngc_key_from_device_info(deviceInfo)
     if key:
         return key
     logger.error("Failed to get NGC API key")
     raise Exception("Error getting NGC API key. Please follow the instructions in the README to set up your NGC API key.")
 
-def stop_container():
-    """Attempt to stop the FLUX_DEPTH container and verify it's stopped."""
-    logger.debug("Attempting to stop FLUX_DEPTH container")
+def stop_container(runner=None, name="FLUX_DEPTH"):
+    """Attempt to stop the FLUX_DEPTH container (or the one called name) and verify it's stopped."""
+    logger.debug(f"Attempting to stop {name} container")
+    runner = runner or default_runner()
     try:
         # Stop the container
-        stop_process = subprocess.run(
-            ["wsl", "-d", "NVIDIA-Workbench", "podman", "stop", "FLUX_DEPTH"],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        stop_process = runner.stop(name)
         if stop_process.returncode == 0:
-            logger.info("Successfully stopped FLUX_DEPTH container.")
-            print("Successfully stopped FLUX_DEPTH container.")
+            logger.info(f"Successfully stopped {name} container.")
+            print(f"Successfully stopped {name} container.")
         else:
             logger.warning(f"Stop command returned non-zero exit code: {stop_process.stderr}")
             print(f"Warning: Stop command returned non-zero exit code: {stop_process.stderr}")
 
         # Verify the container is stopped
-        check_process = subprocess.run(
-            ["wsl", "-d", "NVIDIA-Workbench", "podman", "ps", "-a", "--filter", "name=FLUX_DEPTH"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if "FLUX_DEPTH" not in check_process.stdout:
-            logger.debug("Verified: FLUX_DEPTH container is not running.")
+        if not runner.running(name):
+            logger.debug(f"Verified: {name} container is not running.")
         else:
-            logger.warning("FLUX_DEPTH container may still be running.")
-            print("Warning: FLUX_DEPTH container may still be running.")
+            logger.warning(f"{name} container may still be running.")
+            print(f"Warning: {name} container may still be running.")
     except subprocess.TimeoutExpired:
-        logger.error("Timeout while stopping FLUX_DEPTH container.")
-        print("Error: Timeout while stopping FLUX_DEPTH container.")
+        logger.error(f"Timeout while stopping {name} container.")
+        print(f"Error: Timeout while stopping {name} container.")
         raise
     except subprocess.CalledProcessError as e:
-        logger.error(f"Error stopping FLUX_DEPTH container: {e.stderr}")
-        print(f"Error stopping FLUX_DEPTH container: {e.stderr}")
+        logger.error(f"Error stopping {name} container: {e.stderr}")
+        print(f"Error stopping {name} container: {e.stderr}")
         raise
     except Exception as e:
-        logger.error(f"Unexpected error stopping FLUX_DEPTH container: {e}")
-        print(f"Error: Unexpected error stopping FLUX_DEPTH container: {e}")
+        logger.error(f"Unexpected error stopping {name} container: {e}")
+        print(f"Error: Unexpected error stopping {name} container: {e}")
         raise
 
+def container_command(ngc_api_key, hftoken, runner, placement=None):
+    """
+    The bash command that starts the FLUX_DEPTH container through start_flux_container.sh.
+
+    With a placement (see gpu_inventory.placements) the container gets its
+    name, host port and GPU. Exits if the script is missing.
+    """
+    # Resolve shell script path
+    script_dir = Path(__file__).resolve().parent.parent / "shell_scripts"
+    script_name = "start_flux_container.sh"
+    windows_script_path = script_dir / script_name
+    logger.debug(f"Checking for shell script: {windows_script_path}")
+    if not windows_script_path.exists():
+        logger.error(f"Shell script not found: {windows_script_path}")
+        print(f"Error: Shell script '{windows_script_path}' does not exist.")
+        sys.exit(1)
+
+    # Convert the Windows path to the path the runner's shell sees
+    wsl_script_path = runner.host_path(windows_script_path)
+    logger.info(f"Resolved WSL script path: {wsl_script_path}")
+
+    # Prepare environment and command with hftoken as positional argument
+    placement_env = ""
+    if placement:
+        placement_env = f"export NIM_CONTAINER_NAME='{placement['name']}' NIM_HOST_PORT='{placement['port']}' && "
+        if placement['gpu']:
+            gpu = placement['gpu']
+            placement_env += f"export NIM_GPU_DEVICE='{runner.gpu_device(gpu['uuid'])}' NIM_GPU_UUID='{gpu['uuid']}' && "
+    return f"{placement_env}export NGC_API_KEY='{ngc_api_key}' && '{wsl_script_path}' '{hftoken}'"
+
+def gpu_placements(args):
+    """Containers to start for --gpus: one on every GPU for 'all', otherwise one per selected GPU."""
+    if args.gpus == 'all':
+        return gpu_inventory.placements()
+    devices = get_gpu_inventory()
+    for device in devices:
+        logger.info(gpu_inventory.describe(device))
+    gpus = gpu_inventory.select_gpus(devices, args.gpus, int(args.min_free_gb * 1024))
+    if not gpus:
+        raise Exception(f"No GPU matches --gpus {args.gpus} with {args.min_free_gb:g} GiB free")
+    return gpu_inventory.placements(gpus)
+
 def main():
+    parser = argparse.ArgumentParser(description='Start the FLUX NIM once so its model is downloaded, then stop it.')
+    parser.add_argument('--gpus', default='all', help="'all' for one container on every GPU, 'each' for one container per GPU, or comma separated GPU indexes/UUIDs.")
+    parser.add_argument('--min-free-gb', type=float, default=0, help='Leave out GPUs with less free VRAM (with --gpus each or a list).')
+    parser.add_argument('--list-gpus', action='store_true', help='Print the GPU inventory and exit.')
+    args = parser.parse_args()
+    if args.list_gpus:
+        for device in get_gpu_inventory():
+            print(gpu_inventory.describe(device))
+        return
+
     logger.debug("Starting run_ngc_podman_flux.py")
+    launch_start = time.monotonic()
     # Use current directory as target_dir
     target_dir = Path(__file__).resolve().parent
     logger.debug(f"Using target_dir (CWD): {target_dir}")
@@ -189,7 +278,7 @@ def main():
         logger.debug("Retrieving NGC API key")
         try:
             ngc_api_key = get_ngc_key()
-            logger.info("Successfully retrieved NGC API Key.")
+            logger.info(f"Successfully retrieved NGC API Key in {time.monotonic() - launch_start:.2f} s.")
         except Exception as e:
             logger.error(f"Failed to retrieve NGC API key: {e}")
             print(f"Error: Failed to retrieve NGC API key: {e}")
@@ -203,24 +292,9 @@ def main():
             sys.exit(1)
         logger.debug(f"Retrieved HF_TOKEN: {hftoken}")
 
-        # Resolve shell script path
-        script_dir = target_dir.parent /  "shell_scripts"
-        script_name = "start_flux_container.sh"
-        windows_script_path = script_dir / script_name
-        logger.debug(f"Checking for shell script: {windows_script_path}")
-        if not windows_script_path.exists():
-            logger.error(f"Shell script not found: {windows_script_path}")
-            print(f"Error: Shell script '{windows_script_path}' does not exist.")
-            sys.exit(1)
-
-        # Convert Windows path to WSL path
-        drive_letter = windows_script_path.drive[0].lower()
-        wsl_script_path = f"/mnt/{drive_letter}{windows_script_path.as_posix()[2:]}"
-        logger.info(f"Resolved WSL script path: {wsl_script_path}")
-
-        # Prepare environment and command with hftoken as positional argument
-        bash_command = f"export NGC_API_KEY='{ngc_api_key}' && '{wsl_script_path}' '{hftoken}'"
-        logger.debug(f"Prepared bash command: {bash_command}")
+        runner = default_runner()
+        placements = gpu_placements(args)
+        script_dir = target_dir.parent / "shell_scripts"
 
         # Open log file for writing
         log_file_path = script_dir / "logs" / "flux_container.log"
@@ -231,68 +305,83 @@ def main():
             with open(log_file_path, "w") as log_file:
                 logger.info(f"Logging Podman output to {log_file_path}")
                 print(f"Running Podman command via WSL (logging to {log_file_path})...")
+                launched = []
 
-                # Launch process with Popen to stream output
-                logger.debug("Starting WSL subprocess")
-                process = subprocess.Popen(
-                    ["wsl", "-d", "NVIDIA-Workbench", "/bin/bash", "-c", bash_command],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1,
-                    universal_newlines=True
-                )
-
-                # Stream output and monitor for "Application startup complete" with timeout
-                startup_complete = False
-                start_time = time.time()
-                timeout_seconds = 3600  # 60 minutes timeout
-                while True:
-                    try:
-                        line = process.stdout.readline().strip()
-                        if not line and process.poll() is not None:
-                            logger.debug("Process ended unexpectedly.")
-                            break
-                        if line:
-                            logger.debug(f"Podman output: {line}")
-                            print(line)
-                            log_file.write(line + "\n")
-                            log_file.flush()
-
-                            # Check for startup complete
-                            if "Serving endpoints:" in line:
-                                logger.info("Detected 'Application startup complete'. Stopping container...")
-                                print("Detected 'Application startup complete'. Stopping container...")
-                                startup_complete = True
-                                stop_container()
-                                break
-
-                        # Check for timeout
-                        if time.time() - start_time > timeout_seconds:
-                            logger.error(f"Timeout: 'Application startup complete' not detected within {timeout_seconds//60} minutes.")
-                            print(f"Error: Timeout: 'Application startup complete' not detected within {timeout_seconds//60} minutes.")
-                            stop_container()
-                            sys.exit(1)
+                def launch(placement):
+                    # Launch process with Popen to stream output
+                    logger.debug(f"Starting WSL subprocess for {placement['name']} on port {placement['port']}")
+                    process = runner.launch(container_command(ngc_api_key, hftoken, runner, placement))
+                    logger.info(f"Container {placement['name']} launched {time.monotonic() - launch_start:.2f} s after start.")
 
-                    except KeyboardInterrupt:
-                        logger.warning("Received KeyboardInterrupt. Stopping container...")
-                        print("Received KeyboardInterrupt. Stopping container...")
-                        stop_container()
-                        sys.exit(1)
+                    # The log is read on its own thread while the health endpoints are polled, so the deadline holds even for a silent container
+                    prefix = f"[{placement['name']}] " if len(placements) > 1 else ""
+                    first_output = None
+                    def echo(line):
+                        nonlocal first_output
+                        if first_output is None:
+                            first_output = time.monotonic()
+                            logger.info(f"First {placement['name']} output {first_output - launch_start:.2f} s after start.")
+                        logger.debug(f"Podman output: {prefix}{line}")
+                        print(prefix + line)
+                        log_file.write(prefix + line + "\n")
+                        log_file.flush()
+                    launched.append((placement, process, LogReader(process.stdout, [echo]).start()))
 
-                # Wait for the process to complete
-                process.wait()
-                logger.debug(f"Subprocess completed with return code: {process.returncode}")
+                def stop_all():
+                    for placement, _, _ in launched:
+                        stop_container(runner, placement['name'])
 
-                if not startup_complete:
-                    logger.error("Podman command did not output 'Application startup complete'.")
-                    print("Error: Podman command did not output 'Application startup complete'.")
-                    stop_container()
+                timeout_seconds = 3600  # 60 minutes timeout
+                deadline = time.monotonic() + timeout_seconds
+                try:
+                    # The containers share the NIM model cache, so the first one downloads the model before the others start
+                    launch(placements[0])
+                    results = []
+                    for index in range(len(placements)):
+                        placement, process, reader = launched[index]
+                        result = wait_until_ready(placement['url'], max(0, deadline - time.monotonic()), process, reader)
+                        results.append(result)
+                        if not result.ready:
+                            logger.error(f"FLUX NIM {placement['name']} did not become ready: {result.reason}")
+                            print(f"Error: FLUX NIM {placement['name']} did not become ready: {result.reason}")
+                            for line in reader.tail():
+                                print(f"\t{line}")
+                            stop_all()
+                            sys.exit(1)
+                        live = f", live after {result.live_seconds:.1f} s" if result.live_seconds is not None else ""
+                        logger.info(f"FLUX NIM {placement['name']} ready on port {placement['port']} after {result.seconds:.1f} s{live}.")
+                        print(f"FLUX NIM {placement['name']} ready on port {placement['port']} after {result.seconds:.1f} s{live}.")
+                        if index == 0:
+                            for other in placements[1:]:
+                                launch(other)
+                except KeyboardInterrupt:
+                    logger.warning("Received KeyboardInterrupt. Stopping container...")
+                    print("Received KeyboardInterrupt. Stopping container...")
+                    stop_all()
                     sys.exit(1)
+                except Exception:
+                    stop_all()
+                    raise
+
+                print("Stopping container...")
+                stop_all()
+
+                # Wait for the processes to complete
+                returncodes = []
+                for placement, process, reader in launched:
+                    try:
+                        process.wait(timeout=60)
+                    except subprocess.TimeoutExpired:
+                        logger.warning(f"Podman process for {placement['name']} did not exit after the container was stopped.")
+                        process.kill()
+                        process.wait()
+                    reader.join(5)
+                    logger.debug(f"Subprocess for {placement['name']} completed with return code: {process.returncode}")
+                    returncodes.append(process.returncode)
 
-                if process.returncode != 0:
-                    logger.warning(f"Podman command returned non-zero exit code {process.returncode}, but startup completed successfully.")
-                    print(f"Warning: Podman command returned non-zero exit code {process.returncode}, but startup completed successfully.")
+                if any(returncodes):
+                    logger.warning(f"Podman command returned non-zero exit codes {returncodes}, but startup completed successfully.")
+                    print(f"Warning: Podman command returned non-zero exit codes {returncodes}, but startup completed successfully.")
                     # Exit with 0 to allow host script to proceed
                     sys.exit(0)
 
@@ -302,7 +391,7 @@ def main():
         except FileNotFoundError as e:
             logger.error(f"Failed to create log file {log_file_path}: {e}")
             print(f"Error: Failed to create log file {log_file_path}: {e}")
-            stop_container()
+            stop_container(runner)
             sys.exit(1)
 
     except subprocess.CalledProcessError as e:
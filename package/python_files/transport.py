@@ -0,0 +1,161 @@
+import os, time, threading, collections, urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import bandwidth
+
+# Defaults, override with configure() or the INSTALLMILL_* environment variables
+CONNECT_TIMEOUT = float(os.environ.get('INSTALLMILL_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.environ.get('INSTALLMILL_READ_TIMEOUT', 60))
+RETRIES = int(os.environ.get('INSTALLMILL_HTTP_RETRIES', 3))
+POOL_SIZE = 16
+# Requests kept for recent_requests() and the slowest requests in print_stats()
+REQUEST_LOG_SIZE = 1000
+
+
+class Transport:
+    """
+    Pooled keep-alive HTTP sessions, one per host, with a shared timeout and retry policy.
+
+    Connection setup failures and 429/502/503/504 answers to idempotent requests
+    are retried with backoff by urllib3. Per-host request counts, latency (time
+    to response headers) and body bytes read are collected for stats(), and the
+    same per request for recent_requests(). Body chunks are taken from the
+    shared bandwidth limiter as they are read, whether the caller streams or not.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES, pool_size=POOL_SIZE):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._stats = {}
+        self._log = collections.deque(maxlen=REQUEST_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                retry = Retry(total=self.retries, connect=self.retries, read=0, backoff_factor=0.5,
+                              status_forcelist=(429, 502, 503, 504), respect_retry_after_header=True,
+                              raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        # requests reads a non-streamed body before returning, past any wrapper, so the body is always
+        # streamed here and read below through the counting iter_content when the caller did not ask to stream
+        stream = kwargs.pop('stream', False)
+        host = urllib.parse.urlsplit(url).netloc
+        start = time.perf_counter()
+        response = self.session_for(url).request(method, url, stream=True, **kwargs)
+        entry = {'method': method, 'url': url, 'status': response.status_code,
+                 'latency': time.perf_counter() - start, 'bytes': 0}
+        self._record(host, entry['latency'], 0, request=True, entry=entry)
+
+        # .content and .json() go through iter_content, so every way of reading the body is counted and throttled
+        iter_content = response.iter_content
+        def counting_iter_content(*args, **kw):
+            for chunk in iter_content(*args, **kw):
+                bandwidth.consume(len(chunk))
+                self._record(host, 0, len(chunk), entry=entry)
+                yield chunk
+        response.iter_content = counting_iter_content
+        if not stream:
+            response.content
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, host, latency, nbytes, request=False, entry=None):
+        with self._lock:
+            stats = self._stats.setdefault(host, {'requests': 0, 'bytes': 0, 'latency_total': 0.0, 'latency_max': 0.0})
+            stats['bytes'] += nbytes
+            if entry is not None:
+                entry['bytes'] += nbytes
+            if request:
+                stats['requests'] += 1
+                stats['latency_total'] += latency
+                stats['latency_max'] = max(stats['latency_max'], latency)
+                if entry is not None:
+                    self._log.append(entry)
+
+    def stats(self):
+        """Per-host counters: requests, bytes, latency_total and latency_max (seconds)."""
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._stats.items()}
+
+    def recent_requests(self):
+        """The last REQUEST_LOG_SIZE requests, oldest first: method, url, status, latency (seconds) and bytes read so far."""
+        with self._lock:
+            return [dict(entry) for entry in self._log]
+
+    def print_stats(self):
+        stats = self.stats()
+        if not stats:
+            return
+        print(f'{"Host":<40} {"Requests":>8} {"MiB":>10} {"Avg ms":>8} {"Max ms":>8}')
+        for host, s in sorted(stats.items()):
+            avg = s['latency_total'] / s['requests'] * 1000 if s['requests'] else 0
+            print(f'{host:<40} {s["requests"]:>8} {s["bytes"] / 1024**2:>10.1f} {avg:>8.0f} {s["latency_max"] * 1000:>8.0f}')
+        slowest = sorted(self.recent_requests(), key=lambda entry: entry['latency'], reverse=True)[:5]
+        print('Slowest requests:')
+        for entry in slowest:
+            print(f'{entry["latency"] * 1000:>8.0f} ms {entry["status"]} {entry["method"]} {entry["url"]} ({entry["bytes"] / 1024**2:.1f} MiB)')
+
+
+_default = Transport()
+
+
+def configure(connect_timeout=None, read_timeout=None, retries=None):
+    """Change the shared timeouts and retries; sessions created afterwards use the new retry count."""
+    if connect_timeout is not None:
+        _default.connect_timeout = connect_timeout
+    if read_timeout is not None:
+        _default.read_timeout = read_timeout
+    if retries is not None:
+        _default.retries = retries
+
+
+def request(method, url, **kwargs):
+    return _default.request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return _default.get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    return _default.head(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return _default.post(url, **kwargs)
+
+
+def stats():
+    return _default.stats()
+
+
+def recent_requests():
+    return _default.recent_requests()
+
+
+def print_stats():
+    _default.print_stats()
@@ -25,13 +25,23 @@ echo "$NGC_API_KEY" | podman login nvcr.io -u '$oauthtoken' --password-stdin
 # Export env vars
 export LOCAL_NIM_CACHE=~/.cache/nim
 
+# Container placement, set per GPU by run_ngc_podman_flux.py --gpus (defaults: one container on every GPU)
+container_name="${NIM_CONTAINER_NAME:-FLUX_DEPTH}"
+host_port="${NIM_HOST_PORT:-8000}"
+gpu_device="${NIM_GPU_DEVICE:-nvidia.com/gpu=all}"
+gpu_env=()
+if [ -n "$NIM_GPU_UUID" ]; then
+  gpu_env=(-e "CUDA_VISIBLE_DEVICES=$NIM_GPU_UUID")
+fi
+
 # Setup cache dir
 mkdir -p "$LOCAL_NIM_CACHE"
 chmod 777 "$LOCAL_NIM_CACHE" # Added quotes for robustness
 
 # Run container
-podman run --name FLUX_DEPTH -it --rm \
-    --device nvidia.com/gpu=all \
+podman run --name "$container_name" -it --rm \
+    --device "$gpu_device" \
+    "${gpu_env[@]}" \
     --shm-size=16GB \
     -e NGC_API_KEY=$NGC_API_KEY \
     -v "$LOCAL_NIM_CACHE:/opt/nim/.cache" \
@@ -40,5 +50,5 @@ podman run --name FLUX_DEPTH -it --rm \
     -e NIM_MODEL_VARIANT=depth \
     -e HF_TOKEN=$hftoken \
     -u $(id -u) \
-    -p 8000:8000 \
+    -p "$host_port":8000 \
     nvcr.io/nim/black-forest-labs/flux.1-dev:1.0.0
\ No newline at end of file
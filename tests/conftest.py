@@ -0,0 +1,7 @@
+import os, sys
+
+# Same layout the installer and the benchmarks use: the repo root, the helper modules and the benchmark stand-ins
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+for path in (REPO_ROOT, os.path.join(REPO_ROOT, 'package', 'python_files'), os.path.join(REPO_ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
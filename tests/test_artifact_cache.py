@@ -0,0 +1,61 @@
+import os
+import threading
+
+from artifact_cache import ArtifactCache, file_sha256, link_or_copy
+
+URL = 'https://example.com/model.bin'
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_copies_by_default(tmp_path):
+    cache = ArtifactCache(tmp_path / 'cache')
+    write(tmp_path / 'model.bin', b'original')
+    digest = cache.add(URL, str(tmp_path / 'model.bin'))
+    dest = tmp_path / 'install' / 'model.bin'
+    assert cache.fetch(URL, str(dest), digest) is not None
+
+    # An installed file edited in place leaves the cached blob alone
+    write(dest, b'edited!!')
+    assert file_sha256(cache.blob_path(digest)) == digest
+    assert not os.path.samefile(dest, cache.blob_path(digest))
+
+
+def test_hardlinked_blob_edited_in_place_is_not_served(tmp_path):
+    cache = ArtifactCache(tmp_path / 'cache', hardlinks=True)
+    write(tmp_path / 'model.bin', b'original')
+    digest = cache.add(URL, str(tmp_path / 'model.bin'))
+    dest = tmp_path / 'install' / 'model.bin'
+    cache.fetch(URL, str(dest), digest)
+    assert os.path.samefile(dest, cache.blob_path(digest))
+
+    # Same size, different bytes: only the hash catches it
+    with open(dest, 'r+b') as f:
+        f.write(b'ORIGINAL')
+    assert cache.fetch(URL, str(tmp_path / 'other' / 'model.bin'), digest) is None
+    assert not cache.contains(URL, digest)
+
+
+def test_concurrent_placements_of_one_destination(tmp_path):
+    src = tmp_path / 'src.bin'
+    write(src, os.urandom(1024 * 1024))
+    dest = tmp_path / 'install' / 'model.bin'
+    errors = []
+
+    def place():
+        try:
+            for _ in range(20):
+                link_or_copy(str(src), str(dest))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=place) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert file_sha256(dest) == file_sha256(src)
+    assert os.listdir(dest.parent) == ['model.bin']
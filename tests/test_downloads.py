@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import email.utils
+
+import pytest
+
+import InstallMill
+from bench_utils import serve_directory
+
+
+@pytest.fixture
+def served(tmp_path):
+    root = tmp_path / 'remote'
+    root.mkdir()
+    server, base_url = serve_directory(str(root), ranges=True)
+    yield root, base_url
+    server.shutdown()
+
+
+def write(path, data, mtime=None):
+    with open(path, 'wb') as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def leave_part(file_name, url, data, last_modified):
+    write(file_name + '.part', data)
+    with open(file_name + '.part.json', 'w') as f:
+        json.dump({'url': url, 'etag': None, 'last_modified': last_modified, 'length': len(data)}, f)
+
+
+def test_complete_part_of_the_same_file_is_taken(served, tmp_path):
+    root, base_url = served
+    data = os.urandom(64 * 1024)
+    write(root / 'model.bin', data, mtime=1_700_000_000)
+    dest = str(tmp_path / 'install' / 'model.bin')
+    os.makedirs(os.path.dirname(dest))
+    leave_part(dest, base_url + '/model.bin', data, email.utils.formatdate(1_700_000_000, usegmt=True))
+
+    assert InstallMill.stream_dl(base_url + '/model.bin', dest, retries=1, backoff=0) == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(dest + '.part') and not os.path.exists(dest + '.part.json')
+
+
+def test_complete_part_of_a_replaced_file_is_discarded(served, tmp_path):
+    root, base_url = served
+    old = os.urandom(64 * 1024)
+    new = os.urandom(16 * 1024)
+    # The remote file was replaced by a shorter one, the resume request gets a 416
+    write(root / 'model.bin', new, mtime=1_700_000_100)
+    dest = str(tmp_path / 'install' / 'model.bin')
+    os.makedirs(os.path.dirname(dest))
+    leave_part(dest, base_url + '/model.bin', old, email.utils.formatdate(1_700_000_000, usegmt=True))
+
+    InstallMill.stream_dl(base_url + '/model.bin', dest, retries=1, backoff=0)
+    with open(dest, 'rb') as f:
+        assert f.read() == new
+
+
+def test_part_longer_than_the_remote_file_restarts(served, tmp_path):
+    root, base_url = served
+    new = os.urandom(16 * 1024)
+    write(root / 'model.bin', new)
+    dest = str(tmp_path / 'install' / 'model.bin')
+    os.makedirs(os.path.dirname(dest))
+    # Interrupted .part of an older, longer file without a usable length
+    write(dest + '.part', os.urandom(32 * 1024))
+    with open(dest + '.part.json', 'w') as f:
+        json.dump({'url': base_url + '/model.bin', 'length': 64 * 1024}, f)
+
+    InstallMill.stream_dl(base_url + '/model.bin', dest, retries=1, backoff=0)
+    with open(dest, 'rb') as f:
+        assert f.read() == new
+
+
+def segment_files(dest):
+    return [dest + suffix for suffix in ('.seg.part', '.seg.part.json', '.part', '.part.json')]
+
+
+def served_bytes(since):
+    return sum(entry['bytes'] for entry in InstallMill.transport.recent_requests()[since:])
+
+
+def test_segments_are_reassembled(served, tmp_path, monkeypatch):
+    root, base_url = served
+    data = os.urandom(256 * 1024 + 123)
+    write(root / 'model.bin', data)
+    monkeypatch.setattr(InstallMill, 'stream_dl', lambda *args: pytest.fail('fell back to a single stream'))
+    dest = str(tmp_path / 'install' / 'model.bin')
+
+    digest = InstallMill.segmented_dl(base_url + '/model.bin', dest, max_segments=4, min_segment_size=32 * 1024,
+                                      retries=0, backoff=0, sha256=hashlib.sha256(data).hexdigest())
+    assert digest == hashlib.sha256(data).hexdigest()
+    with open(dest, 'rb') as f:
+        assert f.read() == data
+    assert not any(os.path.exists(path) for path in segment_files(dest))
+
+
+def test_resume_from_the_sidecar(served, tmp_path):
+    root, base_url = served
+    data = os.urandom(256 * 1024)
+    mtime = 1_700_000_000
+    write(root / 'model.bin', data, mtime=mtime)
+    url = base_url + '/model.bin'
+    dest = str(tmp_path / 'install' / 'model.bin')
+    os.makedirs(os.path.dirname(dest))
+
+    # An earlier run finished the first two of four segments and half of the third
+    part_file, meta_file = dest + '.seg.part', dest + '.seg.part.json'
+    state = InstallMill._SegmentState.create(meta_file, url, len(data), email.utils.formatdate(mtime, usegmt=True), 4)
+    with open(part_file, 'wb') as f:
+        f.truncate(len(data))
+        f.write(data[:160 * 1024])
+    state.advance(0, 64 * 1024)
+    state.advance(1, 64 * 1024)
+    state.advance(2, 32 * 1024)
+    state.save()
+
+    since = len(InstallMill.transport.recent_requests())
+    InstallMill.segmented_dl(url, dest, max_segments=4, min_segment_size=32 * 1024, retries=0, backoff=0)
+    with open(dest, 'rb') as f:
+        assert f.read() == data
+    # Only the 96 KiB that were missing (the range probe's byte is never read)
+    assert served_bytes(since) == 96 * 1024
+    assert not any(os.path.exists(path) for path in segment_files(dest))
+
+
+def test_falls_back_to_a_single_stream_without_ranges(tmp_path, monkeypatch):
+    root = tmp_path / 'remote'
+    root.mkdir()
+    data = os.urandom(256 * 1024)
+    write(root / 'model.bin', data)
+    server, base_url = serve_directory(str(root), ranges=False)
+    streamed = []
+    stream_dl = InstallMill.stream_dl
+    monkeypatch.setattr(InstallMill, 'stream_dl', lambda *args: streamed.append(args[0]) or stream_dl(*args))
+    dest = str(tmp_path / 'install' / 'model.bin')
+    try:
+        digest = InstallMill.segmented_dl(base_url + '/model.bin', dest, max_segments=4, min_segment_size=32 * 1024,
+                                          retries=0, backoff=0)
+    finally:
+        server.shutdown()
+    assert streamed == [base_url + '/model.bin']
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert not any(os.path.exists(path) for path in segment_files(dest))
+
+
+def test_pinned_sha_mismatch_leaves_nothing_behind(served, tmp_path):
+    root, base_url = served
+    write(root / 'model.bin', os.urandom(256 * 1024))
+    dest = str(tmp_path / 'install' / 'model.bin')
+
+    with pytest.raises(ValueError):
+        InstallMill.segmented_dl(base_url + '/model.bin', dest, max_segments=4, min_segment_size=32 * 1024,
+                                 retries=0, backoff=0, sha256='0' * 64)
+    assert not os.path.exists(dest)
+    assert not any(os.path.exists(path) for path in segment_files(dest))
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import base64
+import threading
+import http.server
+
+import pytest
+
+import flux_client
+from bench_utils import write_random
+
+IMAGE = base64.b64encode(b'png bytes').decode()
+
+
+class StandIn:
+    """
+    Stand-in FLUX NIM. Answers come from fail (status codes for the first
+    requests) and every generation sleeps delays[prompt] seconds.
+    """
+
+    def __init__(self, fail=(), delays=None):
+        self.fail = list(fail)
+        self.delays = delays or {}
+        self.requests = []
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stand_in.lock:
+                    stand_in.requests.append(body['prompt'])
+                    status = stand_in.fail.pop(0) if stand_in.fail else 200
+                    stand_in.active += 1
+                    stand_in.max_active = max(stand_in.max_active, stand_in.active)
+                time.sleep(stand_in.delays.get(body['prompt'], 0))
+                with stand_in.lock:
+                    stand_in.active -= 1
+                payload = {'artifacts': [{'base64': IMAGE, 'finishReason': 'SUCCESS', 'seed': body['seed']}]} if status == 200 else {'detail': 'busy'}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if status == 503:
+                    self.send_header('Retry-After', '0')
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def depth(tmp_path):
+    path = str(tmp_path / 'depth.png')
+    write_random(path, 128)
+    return path
+
+
+def test_transient_answers_are_retried(depth, tmp_path):
+    stand_in = StandIn(fail=[503, 503])
+    try:
+        client = flux_client.FluxClient([stand_in.url], retries=3, backoff=0)
+        result = client.generate({'prompt': 'a', 'depth': depth}, str(tmp_path / 'a.png'))
+    finally:
+        stand_in.shutdown()
+    assert result['attempts'] == 3
+    assert stand_in.requests == ['a', 'a', 'a']
+    with open(tmp_path / 'a.png', 'rb') as f:
+        assert f.read() == b'png bytes'
+
+
+def test_client_errors_are_not_retried(depth, tmp_path):
+    stand_in = StandIn(fail=[400])
+    try:
+        client = flux_client.FluxClient([stand_in.url], retries=3, backoff=0)
+        with pytest.raises(flux_client.FluxError, match='HTTP 400'):
+            client.generate({'prompt': 'a', 'depth': depth}, str(tmp_path / 'a.png'))
+    finally:
+        stand_in.shutdown()
+    assert stand_in.requests == ['a']
+
+
+def test_retries_run_out(depth, tmp_path):
+    stand_in = StandIn(fail=[503] * 5)
+    try:
+        client = flux_client.FluxClient([stand_in.url], retries=2, backoff=0)
+        with pytest.raises(flux_client.FluxError, match=r'HTTP 503.*\(after 3 attempts\)'):
+            client.generate({'prompt': 'a', 'depth': depth}, str(tmp_path / 'a.png'))
+    finally:
+        stand_in.shutdown()
+    assert len(stand_in.requests) == 3
+
+
+def test_results_keep_job_order_with_in_flight_bound(depth, tmp_path):
+    prompts = ['slow', 'medium', 'fast', 'instant']
+    stand_in = StandIn(delays={'slow': 0.6, 'medium': 0.3, 'fast': 0.1})
+    finished = []
+    try:
+        client = flux_client.FluxClient([stand_in.url], in_flight=3, retries=0)
+        summary = client.run([{'prompt': p, 'depth': depth} for p in prompts], str(tmp_path / 'out'),
+                             lambda result: finished.append(result['index']))
+    finally:
+        stand_in.shutdown()
+    assert [r['index'] for r in summary['results']] == [0, 1, 2, 3]
+    assert [os.path.basename(r['output']) for r in summary['results']] == [f'{i:05d}_depth.png' for i in range(4)]
+    # Reported as they finish, the slow first job last
+    assert finished[-1] == 0 and sorted(finished) == [0, 1, 2, 3]
+    assert stand_in.max_active == 3
+    assert summary['images'] == 4 and summary['failed'] == 0
+
+
+def test_failed_jobs_keep_their_slot(depth, tmp_path):
+    stand_in = StandIn(fail=[400])
+    try:
+        client = flux_client.FluxClient([stand_in.url], in_flight=1, retries=0)
+        summary = client.run([{'prompt': p, 'depth': depth} for p in 'abc'], str(tmp_path / 'out'))
+    finally:
+        stand_in.shutdown()
+    assert [bool(r.get('error')) for r in summary['results']] == [True, False, False]
+    assert summary['failed'] == 1 and summary['images'] == 2
+
+
+def test_requests_spread_over_endpoints(depth, tmp_path):
+    stand_ins = [StandIn(delays={p: 0.2 for p in 'abcd'}) for _ in range(2)]
+    try:
+        client = flux_client.FluxClient([s.url for s in stand_ins], in_flight=2, retries=0)
+        summary = client.run([{'prompt': p, 'depth': depth} for p in 'abcd'], str(tmp_path / 'out'))
+    finally:
+        for stand_in in stand_ins:
+            stand_in.shutdown()
+    assert summary['images'] == 4
+    assert [len(s.requests) for s in stand_ins] == [2, 2]
+
+
+def test_daemons_must_match_the_urls():
+    with pytest.raises(ValueError):
+        flux_client.FluxClient(['http://a', 'http://b', 'http://c'], daemons=['http://d1', 'http://d2'])
+    client = flux_client.FluxClient(['http://a', 'http://b'], daemons=['http://d/'])
+    assert client.daemons == {'http://a': 'http://d', 'http://b': 'http://d'}
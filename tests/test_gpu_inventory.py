@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+import gpu_inventory
+
+SMI_OUTPUT = '''0, GPU-aaaa, NVIDIA GeForce RTX 4090, 0x268410DE, 24564, 23000, 8.9
+1, GPU-bbbb, NVIDIA RTX A6000, 0x223010DE, 49140, [N/A], 8.6
+2, GPU-cccc, Some Future GPU, 0x000010DE, 8192, 8000, 42.0
+'''
+
+
+def test_parse_smi_csv_types():
+    devices = gpu_inventory.parse_smi_csv(SMI_OUTPUT)
+    assert [d['index'] for d in devices] == [0, 1, 2]
+    assert [d['architecture'] for d in devices] == [8, 7, gpu_inventory.NVML_ARCH_UNKNOWN]
+    assert [d['architecture_name'] for d in devices] == ['Ada', 'Ampere', 'Unknown']
+    assert all(isinstance(d['architecture'], int) for d in devices)
+    assert devices[0]['memory_total'] == 24564 and devices[0]['memory_free'] == 23000
+    assert devices[1]['memory_free'] is None
+    assert devices[0]['pci_device_id'] == '0x268410DE'
+
+
+def test_parse_smi_csv_without_compute_cap():
+    output = '0, GPU-aaaa, NVIDIA GeForce RTX 3090, 0x220410DE, 24576, 24000\n\n, , , , ,\n'
+    devices = gpu_inventory.parse_smi_csv(output, gpu_inventory.SMI_FIELDS[:-1])
+    assert len(devices) == 1
+    assert devices[0]['architecture'] == gpu_inventory.NVML_ARCH_UNKNOWN
+    assert devices[0]['architecture_name'] == 'Unknown'
+
+
+class FakeNvml:
+    def __init__(self, gpus):
+        self.gpus = gpus
+
+    def nvmlInit(self):
+        pass
+
+    def nvmlShutdown(self):
+        pass
+
+    def nvmlDeviceGetCount(self):
+        return len(self.gpus)
+
+    def nvmlDeviceGetHandleByIndex(self, i):
+        return self.gpus[i]
+
+    def nvmlDeviceGetArchitecture(self, gpu):
+        return gpu['architecture']
+
+    def nvmlDeviceGetMemoryInfo(self, gpu):
+        return SimpleNamespace(total=gpu['total'] * 1024**2, free=gpu['free'] * 1024**2)
+
+    def nvmlDeviceGetUUID(self, gpu):
+        return gpu['uuid'].encode()
+
+    def nvmlDeviceGetName(self, gpu):
+        return gpu['name']
+
+    def nvmlDeviceGetBrand(self, gpu):
+        return 2
+
+    def nvmlDeviceGetPciInfo(self, gpu):
+        return SimpleNamespace(pciDeviceId=0x268410DE)
+
+
+def test_nvml_and_smi_agree():
+    nvml = FakeNvml([{'architecture': 8, 'total': 24564, 'free': 23000, 'uuid': 'GPU-aaaa', 'name': 'NVIDIA GeForce RTX 4090'}])
+    from_nvml = gpu_inventory.inventory_nvml(nvml)[0]
+    from_smi = gpu_inventory.parse_smi_csv(SMI_OUTPUT)[0]
+    for key in ('index', 'uuid', 'name', 'architecture', 'architecture_name', 'pci_device_id', 'memory_total', 'memory_free'):
+        assert from_nvml[key] == from_smi[key], key
+
+
+@pytest.mark.parametrize('spec, expected', [('each', [0, 1, 2]), ('1', [1]), ('GPU-cccc,0', [0, 2])])
+def test_select_gpus(spec, expected):
+    devices = gpu_inventory.parse_smi_csv(SMI_OUTPUT)
+    assert [d['index'] for d in gpu_inventory.select_gpus(devices, spec)] == expected
+
+
+def test_select_gpus_rejects_unknown_and_filters_by_free_vram():
+    devices = gpu_inventory.parse_smi_csv(SMI_OUTPUT)
+    with pytest.raises(ValueError):
+        gpu_inventory.select_gpus(devices, '7')
+    # Unknown free VRAM is kept
+    assert [d['index'] for d in gpu_inventory.select_gpus(devices, 'each', min_free_mib=10000)] == [0, 1]
+
+
+def test_placements_count_up_from_the_base_port():
+    devices = gpu_inventory.parse_smi_csv(SMI_OUTPUT)
+    assert [(p['name'], p['port']) for p in gpu_inventory.placements(devices[:2])] == [('FLUX_DEPTH_GPU0', 8000), ('FLUX_DEPTH_GPU1', 8001)]
+    assert gpu_inventory.placements()[0]['gpu'] is None
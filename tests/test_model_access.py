@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+import InstallMill
+from fake_hub import FakeHub
+
+TOKEN = 'hf_test'
+
+
+@pytest.fixture
+def hub(tmp_path):
+    hub = FakeHub(str(tmp_path / 'hub'), token=TOKEN, gated=['owner/gated'])
+    hub.add_repo('owner/open', {'.gitattributes': 16})
+    hub.add_repo('owner/gated', {'.gitattributes': 16})
+    hub.start()
+    yield hub
+    hub.shutdown()
+
+
+def models(*names):
+    return [{'model_name': name, 'filename': '.gitattributes', 'token': TOKEN} for name in names]
+
+
+def test_access_is_reported_per_model_in_order(hub):
+    results = InstallMill.check_models_access(models('owner/gated', 'owner/open', 'owner/missing'), endpoint=hub.base_url)
+    assert [(model['model_name'], ok) for model, ok, _ in results] == [
+        ('owner/gated', False), ('owner/open', True), ('owner/missing', False)]
+    assert results[0][2] == 'User does not have access to the gated model'
+    assert results[2][2] == 'The model repository does not exist'
+
+
+def test_granted_access_is_cached_without_the_token(hub, tmp_path):
+    cache_file = str(tmp_path / 'cache' / 'hf_access.json')
+    InstallMill.check_models_access(models('owner/open', 'owner/gated'), cache_file, endpoint=hub.base_url)
+    with open(cache_file) as f:
+        cached = json.load(f)
+    assert TOKEN not in json.dumps(cached)
+    assert [list(entry) for entry in cached.values()] == [['owner/open']]
+
+    # Served from the cache with the hub gone, the denial is checked again
+    hub.shutdown()
+    hub.server.server_close()
+    results = InstallMill.check_models_access(models('owner/open', 'owner/gated'), cache_file, endpoint=hub.base_url)
+    assert results[0][1:] == (True, 'User has access to the model (cached)')
+    assert results[1][1] is False
+
+
+def test_no_cache_file_writes_nothing(hub, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    results = InstallMill.check_models_access(models('owner/open'), None, endpoint=hub.base_url)
+    assert results[0][1] is True
+    assert not cache_dir.exists()
+
+
+def test_token_validity(hub):
+    assert InstallMill.check_hf_token_validity(TOKEN, hub.base_url)[0] is True
+    assert InstallMill.check_hf_token_validity('hf_wrong', hub.base_url) == (False, 'Invalid token')
@@ -0,0 +1,175 @@
+import io
+import threading
+
+import pytest
+
+import nim_daemon
+import flux_client
+from nim_readiness import ReadyResult
+from flux_client_pipeline import serve_stand_in
+from bench_utils import write_random
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProcess:
+    def __init__(self):
+        self.stdout = io.StringIO('')
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def kill(self):
+        self.returncode = -9
+
+
+class FakeRunner:
+    """Records launches and stops, a launch can be held until release is set."""
+
+    def __init__(self, hold=False):
+        self.events = []
+        self.launching = threading.Event()
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+
+    def running(self, name):
+        return False
+
+    def launch(self, command):
+        self.launching.set()
+        self.release.wait(5)
+        self.events.append('launch')
+        return FakeProcess()
+
+    def stop(self, name):
+        self.events.append('stop')
+
+
+@pytest.fixture
+def ready(monkeypatch):
+    monkeypatch.setattr(nim_daemon, 'wait_until_ready', lambda *args: ReadyResult(True, 1.5, 'ready'))
+
+
+def manager(runner, clock, idle_ttl=600):
+    return nim_daemon.NimManager(runner, lambda: 'podman run', idle_ttl=idle_ttl, clock=clock)
+
+
+def test_idle_container_is_stopped_after_the_ttl(ready):
+    clock, runner = FakeClock(), FakeRunner()
+    nim = manager(runner, clock)
+    assert nim.start(wait=True, timeout=5)['state'] == 'ready'
+
+    clock.now += 599
+    assert not nim.reap()
+    nim.touch()
+    clock.now += 599
+    assert not nim.reap()
+    clock.now += 2
+    assert nim.reap()
+    assert nim.state == 'stopped'
+    assert runner.events == ['launch', 'stop']
+
+
+def test_ttl_zero_keeps_it_running(ready):
+    clock, runner = FakeClock(), FakeRunner()
+    nim = manager(runner, clock, idle_ttl=0)
+    nim.start(wait=True, timeout=5)
+    clock.now += 10**6
+    assert not nim.reap()
+    assert nim.state == 'ready'
+
+
+def test_stop_during_launch_stops_the_launched_container(ready):
+    clock, runner = FakeClock(), FakeRunner(hold=True)
+    nim = manager(runner, clock)
+    assert nim.start()['state'] == 'starting'
+    assert runner.launching.wait(5)
+
+    stopped = threading.Thread(target=nim.stop)
+    stopped.start()
+    # stop() waits for the launch instead of stopping a container that is not there yet
+    stopped.join(0.2)
+    assert stopped.is_alive()
+    runner.release.set()
+    stopped.join(5)
+    assert runner.events == ['launch', 'stop']
+    assert nim.state == 'stopped'
+    assert nim.process is None
+
+
+def test_stop_before_launch_starts_nothing(ready):
+    clock, runner = FakeClock(), FakeRunner()
+    nim = manager(runner, clock)
+    launched = threading.Event()
+    launch = nim._launch
+
+    def tracked_launch(generation):
+        launch(generation)
+        launched.set()
+    nim._launch = tracked_launch
+
+    # The launch thread queues behind a stop that is already under way
+    with nim._lifecycle:
+        nim.start()
+        stopped = threading.Thread(target=nim.stop)
+        stopped.start()
+        while nim.state != 'stopped':
+            stopped.join(0.01)
+    stopped.join(5)
+    assert launched.wait(5)
+    assert runner.events == ['stop']
+    assert nim.state == 'stopped'
+
+
+def test_flux_client_touches_the_daemon_on_every_request(ready, tmp_path):
+    clock, runner = FakeClock(), FakeRunner()
+    nim = manager(runner, clock)
+    nim.start(wait=True, timeout=5)
+    server = nim_daemon.make_server(nim, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stand_in, url = serve_stand_in(0, 0, 64)
+    touches = []
+    original = nim.touch
+
+    def touch():
+        touches.append(clock.now)
+        original()
+    nim.touch = touch
+    try:
+        depth = str(tmp_path / 'depth.png')
+        write_random(depth, 64)
+        client = flux_client.FluxClient([url], retries=0, daemons=[f'http://127.0.0.1:{server.server_port}'])
+        for i in range(3):
+            clock.now += 500
+            client.generate({'prompt': 'test', 'depth': depth}, str(tmp_path / f'{i}.png'))
+            # 500 s between requests never reaches the 600 s TTL
+            assert not nim.reap()
+    finally:
+        server.shutdown()
+        stand_in.shutdown()
+    assert len(touches) == 3
+    assert nim.state == 'ready'
+
+
+def test_unreachable_daemon_is_reported_once(capsys, tmp_path):
+    stand_in, url = serve_stand_in(0, 0, 64)
+    try:
+        depth = str(tmp_path / 'depth.png')
+        write_random(depth, 64)
+        client = flux_client.FluxClient([url], retries=0, daemons=['http://127.0.0.1:9'])
+        for i in range(2):
+            assert client.generate({'prompt': 'test', 'depth': depth}, str(tmp_path / f'{i}.png'))['attempts'] == 1
+    finally:
+        stand_in.shutdown()
+    assert capsys.readouterr().out.count('is not reachable') == 1
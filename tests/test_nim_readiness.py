@@ -0,0 +1,114 @@
+import io
+import http.server
+import threading
+
+import pytest
+import requests
+
+import nim_readiness
+from nim_readiness import LIVE_PATH, READY_PATH, LogReader, wait_until_ready
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeClient:
+    """Answers every poll from a script of status codes per path, each poll takes step seconds of the clock."""
+
+    def __init__(self, clock, answers, step=1.0):
+        self.clock = clock
+        self.answers = {path: list(codes) for path, codes in answers.items()}
+        self.step = step
+        self.calls = []
+
+    def get(self, url, timeout=None):
+        path = url[url.index('/v1/'):]
+        self.calls.append((path, timeout))
+        self.clock.now += self.step
+        codes = self.answers[path]
+        code = codes.pop(0) if len(codes) > 1 else codes[0]
+        if code is None:
+            raise requests.ConnectionError('refused')
+        response = requests.Response()
+        response.status_code = code
+        return response
+
+
+class Process:
+    def __init__(self, returncode=None):
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(nim_readiness.time, 'sleep', lambda seconds: None)
+
+
+def test_live_then_ready(no_sleep):
+    clock = FakeClock()
+    client = FakeClient(clock, {LIVE_PATH: [None, None, 200], READY_PATH: [503, 503, 200]})
+    result = wait_until_ready('http://nim', timeout=60, client=client, clock=clock)
+    assert result.ready and result.reason == 'ready'
+    assert result.live_seconds == 3
+    assert result.seconds == 6
+    assert [path for path, _ in client.calls] == [LIVE_PATH] * 3 + [READY_PATH] * 3
+
+
+def test_gives_up_at_the_deadline_without_a_longer_request(no_sleep):
+    clock = FakeClock()
+    client = FakeClient(clock, {LIVE_PATH: [200], READY_PATH: [503]}, step=2.0)
+    result = wait_until_ready('http://nim', timeout=7, client=client, clock=clock, request_timeout=5)
+    assert not result.ready
+    assert result.reason == 'not ready within 7 seconds'
+    assert result.live_seconds == 2
+    # The last poll only gets what is left of the deadline
+    assert client.calls[-1][1] == 1
+
+
+def test_stops_when_the_container_exits(no_sleep):
+    clock = FakeClock()
+    client = FakeClient(clock, {LIVE_PATH: [None]})
+    result = wait_until_ready('http://nim', timeout=60, process=Process(125), client=client, clock=clock)
+    assert not result.ready
+    assert result.reason == 'container process exited with code 125'
+    assert client.calls == []
+
+
+def test_marker_and_end_of_output():
+    reader = LogReader(io.StringIO('pulling\nServing endpoints: 0.0.0.0:8000\n\nbye\n')).start()
+    reader.join(5)
+    assert reader.marker_seen and reader.eof.is_set()
+    assert reader.tail(2) == ['Serving endpoints: 0.0.0.0:8000', 'bye']
+    result = wait_until_ready('http://127.0.0.1:9', timeout=5, reader=reader, request_timeout=0.5)
+    assert result.reason == 'container output ended'
+
+
+def test_default_client_polls_a_real_server():
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(200 if self.path == LIVE_PATH or len(hits) > 2 else 503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        result = wait_until_ready(f'http://127.0.0.1:{server.server_port}', timeout=10, poll_interval=0.05)
+    finally:
+        server.shutdown()
+    assert result.ready
+    assert hits == [LIVE_PATH, READY_PATH, READY_PATH]
@@ -0,0 +1,89 @@
+import io
+
+import pytest
+import requests
+from huggingface_hub import hf_hub_download, snapshot_download
+
+import progress
+import InstallMill
+from bench_utils import serve_directory
+from fake_hub import FakeHub
+
+
+class Sink:
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def reporter(monkeypatch):
+    reporter = progress.ProgressReporter()
+    reporter.sink = Sink()
+    monkeypatch.setattr(progress, '_default', reporter)
+    return reporter
+
+
+@pytest.fixture
+def hub(tmp_path):
+    hub = FakeHub(str(tmp_path / 'hub'))
+    hub.add_repo('owner/repo', {'a.bin': 300 * 1024, 'b.bin': 200 * 1024, 'sub/c.bin': 100 * 1024})
+    hub.start()
+    yield hub
+    hub.shutdown()
+
+
+def test_task_is_finished_when_the_block_raises(reporter):
+    with pytest.raises(OSError):
+        with progress.task('file.bin') as task:
+            task.advance(10)
+            raise OSError('disk full')
+    assert reporter.active() == []
+    assert reporter.sink.events[-1]['event'] == 'transfer_end'
+    assert reporter.sink.events[-1]['error'] == 'disk full'
+
+
+def test_stream_dl_finishes_its_task_on_a_client_error(reporter, tmp_path):
+    server, base_url = serve_directory(str(tmp_path))
+    try:
+        with pytest.raises(requests.exceptions.HTTPError):
+            InstallMill.stream_dl(base_url + '/missing.bin', str(tmp_path / 'out' / 'missing.bin'), retries=0)
+    finally:
+        server.shutdown()
+    assert reporter.active() == []
+
+
+def test_hf_file_download_feeds_the_task(reporter, hub, tmp_path):
+    with progress.task('a.bin') as task:
+        hf_hub_download('owner/repo', 'a.bin', endpoint=hub.base_url, cache_dir=str(tmp_path / 'cache'),
+                        tqdm_class=progress.tqdm_class(task))
+        assert (task.bytes, task.total) == (300 * 1024, 300 * 1024)
+
+
+def test_hf_snapshot_counts_every_byte_once(reporter, hub, tmp_path):
+    with progress.task('repo') as task:
+        snapshot_download('owner/repo', endpoint=hub.base_url, cache_dir=str(tmp_path / 'cache'),
+                          tqdm_class=progress.tqdm_class(task))
+        assert (task.bytes, task.total) == (600 * 1024, 600 * 1024)
+
+
+def test_hf_draws_its_own_bars_when_nothing_shows_the_task():
+    reporter = progress.ProgressReporter()
+    with reporter.task('repo') as task:
+        assert progress.tqdm_class(task) is None
+
+
+def test_console_hides_the_live_display(reporter):
+    stream = io.StringIO()
+    display = progress.LiveDisplay(reporter, stream)
+    reporter.display = display
+    display._lines = 2
+    with reporter.console():
+        assert display._suspended == 1
+        assert stream.getvalue() == '\x1b[2F\x1b[J'
+    assert display._suspended == 0
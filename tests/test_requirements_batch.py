@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import requirements_batch
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+@pytest.mark.parametrize('spelling', ['-r extra.txt', '-rextra.txt', '--requirement extra.txt', '--requirement=extra.txt'])
+def test_nested_files_in_every_spelling(tmp_path, spelling):
+    write(str(tmp_path / 'extra.txt'), 'numpy>=1.0\n')
+    write(str(tmp_path / 'requirements.txt'), f'{spelling}\nrequests\n')
+    requirements, passthrough = requirements_batch.read_requirements(tmp_path / 'requirements.txt')
+    assert [req.name for req in requirements] == ['numpy', 'requests']
+    assert passthrough == []
+
+
+def test_relative_paths_are_made_absolute(tmp_path):
+    node = str(tmp_path / 'node')
+    write(os.path.join(node, 'requirements.txt'),
+          '-e .\n./vendor/pkg[gpu]\n-c constraints.txt\n--extra-index-url https://example.com/simple\n'
+          'git+https://example.com/repo.git\n')
+    _, passthrough = requirements_batch.read_requirements(os.path.join(node, 'requirements.txt'))
+    assert passthrough == [f'-e {node}', os.path.join(node, 'vendor', 'pkg') + '[gpu]',
+                           f'-c {os.path.join(node, "constraints.txt")}',
+                           '--extra-index-url https://example.com/simple', 'git+https://example.com/repo.git']
+
+
+@pytest.fixture
+def pip_runs(monkeypatch):
+    runs = []
+
+    def pip_install(args, cache_dir=None):
+        with open(args[1], encoding='utf-8') as f:
+            runs.append(f.read().split('\n')[:-1])
+        return 0
+    monkeypatch.setattr(requirements_batch, 'pip_install', pip_install)
+    # Every named requirement counts as installed
+    monkeypatch.setattr(requirements_batch, 'installed_version', lambda name: '1.0')
+    return runs
+
+
+def test_pip_runs_once_for_unchanged_passthrough_lines(tmp_path, pip_runs):
+    nodes = tmp_path / 'custom_nodes'
+    write(str(nodes / 'a' / 'requirements.txt'), 'requests\n-e .\n--extra-index-url https://example.com/simple\n')
+    assert requirements_batch.install_custom_node_requirements(str(nodes), str(tmp_path / 'cache'))
+    assert pip_runs == [[f'-e {nodes / "a"}', '--extra-index-url https://example.com/simple']]
+    assert requirements_batch.install_custom_node_requirements(str(nodes), str(tmp_path / 'cache'))
+    assert len(pip_runs) == 1
+
+    # A new installable line runs pip again, the merged file is never left behind
+    write(str(nodes / 'b' / 'requirements.txt'), './pkg\n')
+    assert requirements_batch.install_custom_node_requirements(str(nodes), str(tmp_path / 'cache'))
+    assert len(pip_runs) == 2
+    assert not (tmp_path / 'cache').exists()
+
+
+def test_option_lines_alone_do_not_run_pip(tmp_path, pip_runs):
+    nodes = tmp_path / 'custom_nodes'
+    write(str(nodes / 'a' / 'requirements.txt'), 'requests\n--extra-index-url https://example.com/simple\n')
+    assert requirements_batch.install_custom_node_requirements(str(nodes))
+    assert pip_runs == []
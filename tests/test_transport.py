@@ -0,0 +1,50 @@
+import pytest
+
+import bandwidth
+import transport
+from bench_utils import serve_directory, write_random
+
+SIZE = 256 * 1024
+
+
+@pytest.fixture
+def server(tmp_path):
+    write_random(str(tmp_path / 'blob.bin'), SIZE)
+    server, base_url = serve_directory(str(tmp_path))
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def consumed(monkeypatch):
+    taken = []
+    monkeypatch.setattr(bandwidth, 'consume', taken.append)
+    return taken
+
+
+def test_non_streamed_body_is_counted_and_throttled(server, consumed):
+    client = transport.Transport(retries=0)
+    response = client.get(server + '/blob.bin')
+    assert len(response.content) == SIZE
+    assert sum(consumed) == SIZE
+    assert list(client.stats().values())[0]['bytes'] == SIZE
+
+
+def test_streamed_body_is_counted_as_read(server, consumed):
+    client = transport.Transport(retries=0)
+    with client.get(server + '/blob.bin', stream=True) as response:
+        assert sum(consumed) == 0
+        assert sum(len(chunk) for chunk in response.iter_content(64 * 1024)) == SIZE
+    assert sum(consumed) == SIZE
+
+
+def test_recent_requests_have_their_own_latency_and_bytes(server, consumed):
+    client = transport.Transport(retries=0)
+    client.get(server + '/blob.bin')
+    client.head(server + '/blob.bin')
+    client.get(server + '/missing.bin')
+    log = client.recent_requests()
+    assert [(entry['method'], entry['status']) for entry in log] == [('GET', 200), ('HEAD', 200), ('GET', 404)]
+    assert log[0]['bytes'] == SIZE and log[1]['bytes'] == 0
+    assert all(entry['latency'] > 0 for entry in log)
+    assert log[0]['url'].endswith('/blob.bin')